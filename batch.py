@@ -0,0 +1,162 @@
+"""
+批量编译
+-------
+功能:
+    在进程池上并行地对大量 C-- 源码文件进行词法分析和语法分析,
+    每个源码文件的单词符号序列和语法分析序列分别写入 [文件名]_lexical.txt 和 [文件名]_grammar.txt.
+
+    词法分析和语法分析都是 CPU 密集的纯 Python 代码, 受全局解释器锁的限制, 多线程无法提高吞吐量,
+    因此以进程为并行单位: 每个工作进程启动时加载一次 DFA 和分析表, 之后顺序处理分配给它的文件.
+
+接口:
+    compile_files: 批量编译源码文件, 按输入顺序返回每个文件的编译结果 CompileResult
+
+命令行:
+    python3 batch.py [-j 进程数] [-m 分析方法] [-o 输出目录] [-e 错误数上限] 源码文件...
+"""
+
+import os
+import io
+import sys
+import argparse
+import contextlib
+import clexer
+import cparser
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from clexer import scanner
+from clexer.trace import TraceWriter
+from cparser import ll_table, lr_table, ll_parser
+
+
+# 单个文件的编译结果:
+#   source: 源码文件路径
+#   lexical / grammar: 单词符号序列 / 语法分析序列的输出文件路径
+#   error: 发现词法错误、语法错误或编译中止时的错误信息, 没有错误时为 None
+#   messages: 编译过程中打印的错误信息
+CompileResult = namedtuple('CompileResult', ['source', 'lexical', 'grammar', 'error', 'messages'])
+
+
+def _load(method: str):
+    """加载词法分析用的 DFA 和指定方法的分析表, 在每个进程中只需加载一次"""
+    clexer.get_lexer()
+    if method == 'll1':
+        ll_table.get_compiled_table()
+    else:
+        lr_table.get_compiled_table(method)
+
+
+def _output_paths(source: str, output_dir: str):
+    """输出文件的路径, 未指定输出目录时与源码文件位于同一目录"""
+    stem = os.path.splitext(os.path.basename(source))[0]
+    directory = output_dir if output_dir is not None else os.path.dirname(source)
+    return (os.path.join(directory, '%s_lexical.txt' % stem),
+            os.path.join(directory, '%s_grammar.txt' % stem))
+
+
+def _traced(tokens, writer: TraceWriter):
+    """逐个生成单词符号记录, 同时把它们作为单词符号序列写出"""
+    write, check = writer.write, writer.check
+    for token in tokens:
+        write(scanner._trace_record(token))
+        check()
+        yield token
+
+
+def _compile_one(job):
+    """
+    在工作进程中编译一个源码文件, 异常被捕获并记录在编译结果中, 不会中断整个批次.
+    单词符号记录直接交给语法分析器, 单词符号序列只是在扫描的同时写出的输出, 语法分析器不再读取它;
+    语法分析提前中止时仍扫描完剩余的源代码, 以输出完整的单词符号序列并发现所有词法错误
+    """
+    source, lexical, grammar, method, max_errors = job
+    messages = io.StringIO()
+    problems = []
+    if not os.path.isfile(source):
+        return CompileResult(source, lexical, grammar, "打开文件 %s 失败" % source, '')
+    with contextlib.redirect_stdout(messages):
+        lex_errors, parse_errors = [], []
+        try:
+            with TraceWriter(lexical, scanner._trace_format, 'text', scanner._trace_magic) as writer:
+                tokens = _traced(clexer.tokenize(source, errors=lex_errors), writer)
+                try:
+                    if max_errors is not None:
+                        cparser.ll_parse(tokens, grammar, errors=parse_errors, max_errors=max_errors)
+                    elif method == 'll1':
+                        cparser.ll_parse(tokens, grammar)
+                    else:
+                        cparser.lr_parse(tokens, grammar, method)
+                finally:
+                    deque(tokens, maxlen=0)
+        except Exception as e:
+            problems.append("%s: %s" % (type(e).__name__, e))
+
+        for lex_error in lex_errors:
+            print(scanner._describe(lex_error))
+        for parse_error in parse_errors:
+            print(ll_parser._describe(parse_error))
+        if lex_errors:
+            problems.insert(0, "发现 %d 个词法错误" % len(lex_errors))
+        if parse_errors:
+            problems.append("发现 %d 个语法错误%s" % (len(parse_errors),
+                                                  ", 达到上限, 分析中止" if len(parse_errors) >= max_errors else ''))
+    error = '; '.join(problems) if problems else None
+    return CompileResult(source, lexical, grammar, error, messages.getvalue())
+
+
+def compile_files(sources: list, output_dir: str = None, method: str = 'll1',
+                  workers: int = None, chunksize: int = 1, max_errors: int = None) -> list:
+    """
+    批量编译源码文件:
+        sources 为源码文件路径的列表, 输出文件写入 output_dir (未指定时写入源码文件所在的目录),
+        method 为语法分析方法, 可以是 'll1'、'lr0'、'lalr1' 或 'lr1',
+        workers 为工作进程数 (默认为 CPU 核数), 为 0 时在当前进程中顺序编译,
+        chunksize 为每次分配给工作进程的文件数, 文件很多且都很小时适当增大可以减少进程间通信,
+        max_errors 不为 None 时 LL(1) 分析从语法错误中恢复, 每个文件一遍报告至多 max_errors 个语法错误,
+        返回与 sources 顺序一致的 CompileResult 列表
+    """
+    if method != 'll1':
+        lr_table._check_method(method)
+        if max_errors is not None:
+            raise ValueError("只有 LL(1) 分析法支持出错恢复, 当前分析法为 %s" % method)
+    sources = [os.fspath(source) for source in sources]
+    jobs = []
+    outputs = set()
+    for source in sources:
+        lexical, grammar = _output_paths(source, output_dir)
+        if lexical in outputs:
+            raise ValueError("输出文件 %s 重名, 请为同名的源码文件指定不同的输出目录" % lexical)
+        outputs.add(lexical)
+        jobs.append((source, lexical, grammar, method, max_errors))
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # 先在主进程中加载一次, 确保 DFA 和分析表已经写入缓存, 工作进程只需从缓存中读取
+    _load(method)
+    if workers == 0:
+        return [_compile_one(job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_load, initargs=(method,)) as executor:
+        return list(executor.map(_compile_one, jobs, chunksize=chunksize))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="批量编译 C-- 源码文件")
+    arg_parser.add_argument('sources', nargs='+', help="源码文件")
+    arg_parser.add_argument('-j', '--workers', type=int, default=None, help="工作进程数, 默认为 CPU 核数")
+    arg_parser.add_argument('-m', '--method', default='ll1', help="语法分析方法: ll1, lr0, lalr1 或 lr1")
+    arg_parser.add_argument('-o', '--output-dir', default=None, help="输出目录, 默认为源码文件所在的目录")
+    arg_parser.add_argument('-e', '--max-errors', type=int, default=None,
+                            help="从语法错误中恢复, 每个文件至多报告的错误数, 只支持 ll1")
+    args = arg_parser.parse_args()
+
+    failed = 0
+    for result in compile_files(args.sources, args.output_dir, args.method, args.workers,
+                                max_errors=args.max_errors):
+        sys.stdout.write(result.messages)
+        if result.error is not None:
+            failed += 1
+            print("[Failed]%s: %s" % (result.source, result.error))
+        else:
+            print("[OK]%s" % result.source)
+    sys.exit(1 if failed else 0)
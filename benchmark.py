@@ -0,0 +1,298 @@
+"""
+性能基准测试
+----------
+功能:
+    根据 cparser/grammar.txt 中的文法生成指定规模的 C-- 程序,
+    分别测量词法分析器生成 (nfa2dfa / minimize_dfa)、分析表构造 (LL(1) 和各 LR 分析法)、
+    词法分析 (clexer.scan) 以及 LL 和 LR 语法分析驱动的耗时, 结果写成 JSON 文件,
+    不同提交的结果可以用 compare 方法比较, 发现性能退化.
+
+    测量用的程序默认由 generate.py 沿文法产生式随机推导生成, 覆盖文法中的所有产生式;
+    program 为 'template' 时改用 generate_program 按固定的模板生成 (深层嵌套的语句块、长表达式和大量声明),
+    depth 和 expression_length 只对模板有效. 比较的两次结果的生成方式不同时, 命令行给出提示.
+
+    每一项都重复测量 repeat 次, 报告每次的耗时以及最小值和中位数, 比较时使用中位数.
+    分析表构造和自动机生成测量的是生成函数本身, 不经过分析表缓存和 DFA 缓存.
+
+接口:
+    generate_program: 生成指定单词符号数的 C-- 程序
+    run_benchmarks: 运行所有测量项, 返回可以写成 JSON 的结果字典
+    compare: 比较两次测量的结果, 返回各测量项的耗时比
+
+命令行:
+    python3 benchmark.py [-n 单词符号数] [-r 重复次数] [-p 程序生成方式] [-o 结果文件] [-c 基准结果文件]
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+import clexer
+import cparser
+import generate
+from clexer import generator
+from clexer._type import _rules
+from cparser import ll_table, lr_table, util
+from cparser.grammar import get_productions
+
+
+# 结果文件格式的版本, 结果的结构改变时需要递增
+_RESULT_VERSION = 1
+
+# 测量用的程序的生成方式: 'grammar' 沿文法产生式随机推导生成 (默认), 'template' 按固定的模板生成
+_programs = ('grammar', 'template')
+
+
+def _operators() -> list:
+    """从文法中提取二元运算符, 即形如「xExpAtom -> op xExp xExpAtom」的产生式右部的第一个符号"""
+    operators = []
+    for left, right in get_productions():
+        if left.endswith('ExpAtom') and len(right) == 3 and right[2] == left and right[0] not in operators:
+            operators.append(right[0])
+    return operators
+
+
+class _ProgramWriter:
+    """逐行生成 C-- 程序, 同时统计生成的单词符号数"""
+    def __init__(self, seed: int, depth: int, expression_length: int):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.expression_length = expression_length
+        self.operators = _operators()
+        self.lines = []
+        self.ntokens = 0
+        self.nnames = 0
+
+    def emit(self, indent: int, tokens: list):
+        self.lines.append('    ' * indent + ' '.join(tokens))
+        self.ntokens += len(tokens)
+
+    def name(self) -> str:
+        self.nnames += 1
+        return 'v%d' % self.nnames
+
+    def operand(self) -> list:
+        """操作数: 整数、标识符或函数调用"""
+        choice = self.random.random()
+        if choice < 0.4:
+            return [str(self.random.randint(0, 1000))]
+        if choice < 0.9:
+            return ['v%d' % self.random.randint(1, max(self.nnames, 1))]
+        return ['f%d' % self.random.randint(0, 9), '(', 'v1', ',', str(self.random.randint(0, 9)), ')']
+
+    def expression(self) -> list:
+        """由 1 到 expression_length 个操作数和二元运算符组成的表达式"""
+        tokens = self.operand()
+        for _ in range(self.random.randint(1, self.expression_length) - 1):
+            tokens.append(self.random.choice(self.operators))
+            tokens += self.operand()
+        return tokens
+
+    def declaration(self, indent: int):
+        """变量声明或常量声明, 一次声明多个标识符"""
+        if self.random.random() < 0.3:
+            tokens = ['const', 'int', self.name(), '='] + self.expression()
+            for _ in range(self.random.randint(0, 3)):
+                tokens += [',', self.name(), '='] + self.expression()
+        else:
+            tokens = ['int', self.name()]
+            for _ in range(self.random.randint(0, 5)):
+                tokens.append(',')
+                tokens.append(self.name())
+                if self.random.random() < 0.5:
+                    tokens += ['='] + self.expression()
+        self.emit(indent, tokens + [';'])
+
+    def block(self, indent: int, level: int):
+        """语句块, 嵌套深度未达到 depth 时总是包含一个嵌套的语句块"""
+        self.emit(indent, ['{'])
+        nested = self.random.randint(0, 4) if level < self.depth else -1
+        for idx in range(self.random.randint(nested + 1, 6)):
+            if idx == nested:
+                self.block(indent + 1, level + 1)
+                continue
+            choice = self.random.random()
+            if choice < 0.3:
+                self.declaration(indent + 1)
+            elif choice < 0.85:
+                self.emit(indent + 1, ['v%d' % self.random.randint(1, self.nnames), '='] + self.expression() + [';'])
+            elif choice < 0.9:
+                self.emit(indent + 1, [';'])
+            else:
+                self.emit(indent + 1, ['return'] + self.expression() + [';'])
+        self.emit(indent, ['}'])
+
+    def function(self, idx: int):
+        params = []
+        for _ in range(self.random.randint(0, 4)):
+            params += [',', 'int', self.name()]
+        self.emit(0, ['void', 'f%d' % idx, '('] + params[1:] + [')'])
+        self.block(0, 1)
+
+
+def generate_program(ntokens: int, depth: int = 16, expression_length: int = 32, seed: int = 0) -> str:
+    """
+    生成至少含有 ntokens 个单词符号的 C-- 程序:
+        交替生成若干全局声明和一个函数定义, 每个函数体含有嵌套深度为 depth 的语句块,
+        每个表达式至多含有 expression_length 个操作数, 相同的参数总是生成相同的程序
+    """
+    writer = _ProgramWriter(seed, depth, expression_length)
+    idx = 0
+    while writer.ntokens < ntokens:
+        for _ in range(writer.random.randint(1, 8)):
+            writer.declaration(0)
+        writer.function(idx)
+        idx += 1
+    return '\n'.join(writer.lines) + '\n'
+
+
+def _measure(func, repeat: int, setup=None) -> dict:
+    """重复调用 func 并计时, setup 不为 None 时每次调用前先调用 setup (不计时), 其返回值作为 func 的参数"""
+    times = []
+    for _ in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+    return {'times': times, 'min': min(times), 'median': statistics.median(times)}
+
+
+def _count_lines(path: str) -> int:
+    with open(path, 'r') as f:
+        return sum(1 for _ in f)
+
+
+def run_benchmarks(ntokens: int = 100000, repeat: int = 3, depth: int = 16, expression_length: int = 32,
+                   seed: int = 0, methods: tuple = lr_table._methods, program: str = 'grammar') -> dict:
+    """
+    运行所有测量项:
+        以 program 方式生成 ntokens 个单词符号规模的程序, 每一项重复测量 repeat 次,
+        methods 为参与测量的 LR 分析法,
+        返回的字典中 results 以测量项的名称为键, 值含有每次的耗时 times、最小值 min、中位数 median,
+        词法分析和语法分析还含有处理的单词符号数 tokens 或分析步数 steps 以及对应的每秒处理量
+    """
+    for method in methods:
+        lr_table._check_method(method)
+    if program not in _programs:
+        raise ValueError("未知的程序生成方式 %s, 可选的方式为 'grammar' 或 'template'" % program)
+    results = {}
+
+    # 词法分析器生成
+    def nfa():
+        return generator._build_nfa(_rules)
+
+    def dfa():
+        fsm = nfa()
+        fsm.nfa2dfa()
+        return fsm
+
+    results['nfa2dfa'] = _measure(lambda fsm: fsm.nfa2dfa(), repeat, nfa)
+    results['minimize_dfa'] = _measure(lambda fsm: fsm.minimize_dfa(), repeat, dfa)
+
+    # 分析表构造, 文法分析的结果 (FIRST 和 FOLLOW 集合) 预先计算, 不计入耗时
+    util.get_follow_sets()
+    results['ll_table'] = _measure(ll_table._generate_table, repeat)
+    for method in methods:
+        results['lr_table_%s' % method] = _measure(lambda: lr_table._generate_table(method), repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'program.txt')
+        lexical = os.path.join(directory, 'program_lexical.txt')
+        grammar = os.path.join(directory, 'program_grammar.txt')
+        if program == 'grammar':
+            generate.write_program(source, ntokens, seed)
+        else:
+            with open(source, 'w') as f:
+                f.write(generate_program(ntokens, depth, expression_length, seed))
+
+        # 词法分析
+        clexer.get_lexer()
+        results['scan'] = _measure(lambda: clexer.scan(source, lexical), repeat)
+        scanned = _count_lines(lexical)
+        results['scan']['tokens'] = scanned
+        results['scan']['tokens_per_second'] = scanned / results['scan']['median']
+
+        # 语法分析, 分析步数即分析序列的记录数
+        drivers = [('ll_parse', lambda: cparser.ll_parse(lexical, grammar, ll_table.get_compiled_table()))]
+        for method in methods:
+            drivers.append(('lr_parse_%s' % method,
+                            lambda method=method: cparser.lr_parse(lexical, grammar, method,
+                                                                   lr_table.get_compiled_table(method))))
+        for name, driver in drivers:
+            try:
+                driver()
+                results[name] = _measure(driver, repeat)
+            except NotImplementedError as e:
+                # 分析表存在冲突的分析法可能无法分析生成的程序
+                results[name] = {'error': str(e)}
+                continue
+            steps = _count_lines(grammar)
+            results[name]['steps'] = steps
+            results[name]['steps_per_second'] = steps / results[name]['median']
+            results[name]['tokens_per_second'] = scanned / results[name]['median']
+
+    return {
+        'version': _RESULT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': {'ntokens': ntokens, 'repeat': repeat, 'depth': depth,
+                       'expression_length': expression_length, 'seed': seed, 'methods': list(methods),
+                       'program': program},
+        'results': results,
+    }
+
+
+def compare(baseline: dict, current: dict) -> dict:
+    """比较两次测量的结果, 返回两者都有的测量项的耗时中位数之比「current / baseline」, 大于 1 表示变慢"""
+    ratios = {}
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or 'median' not in base or 'median' not in result:
+            continue
+        ratios[name] = result['median'] / base['median']
+    return ratios
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="C-- 编译器前端的性能基准测试")
+    arg_parser.add_argument('-n', '--tokens', type=int, default=100000, help="生成的程序的单词符号数")
+    arg_parser.add_argument('-r', '--repeat', type=int, default=3, help="每一项的重复测量次数")
+    arg_parser.add_argument('-d', '--depth', type=int, default=16, help="语句块的嵌套深度, 只对 template 有效")
+    arg_parser.add_argument('-l', '--expression-length', type=int, default=32,
+                            help="表达式的最大操作数个数, 只对 template 有效")
+    arg_parser.add_argument('-s', '--seed', type=int, default=0, help="生成程序的随机数种子")
+    arg_parser.add_argument('-m', '--methods', default=','.join(lr_table._methods),
+                            help="参与测量的 LR 分析法, 以逗号分隔")
+    arg_parser.add_argument('-p', '--program', default='grammar', choices=_programs,
+                            help="程序生成方式: grammar 沿文法产生式随机推导生成 (默认), template 按固定的模板生成")
+    arg_parser.add_argument('-o', '--output', default='benchmark.json', help="结果文件")
+    arg_parser.add_argument('-c', '--compare', default=None, help="与之比较的基准结果文件")
+    args = arg_parser.parse_args()
+
+    report = run_benchmarks(args.tokens, args.repeat, args.depth, args.expression_length, args.seed,
+                            tuple(method for method in args.methods.split(',') if method), args.program)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report['results'].items():
+        if 'error' in result:
+            print("%-16s 错误: %s" % (name, result['error']))
+        else:
+            print("%-16s %10.4f s" % (name, result['median']))
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        # 生成方式成为参数之前的结果都是按模板生成的
+        base_program = baseline.get('parameters', {}).get('program', 'template')
+        if base_program != args.program:
+            print("注意: 基准结果的程序生成方式为 %s, 本次为 %s, 耗时之比不能直接反映性能变化"
+                  % (base_program, args.program))
+        print("与 %s 比较 (耗时之比, 大于 1 表示变慢):" % args.compare)
+        for name, ratio in compare(baseline, report).items():
+            print("%-16s %10.3f" % (name, ratio))
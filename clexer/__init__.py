@@ -4,8 +4,22 @@
 功能:
     输入C--语言的源代码, 输出识别出单词符号序列, 并填写符号表.
 
+接口:
+    scan: 扫描源代码文件, 将单词符号序列写入输出文件
+    tokenize / tokenize_str: 扫描源代码文件 / 字符串, 逐个生成单词符号记录 Token(kind, text, line, column),
+        可以直接交给语法分析器, 无需中间文件; tokenize 的 errors 参数为列表时, 无法识别的字符以 LexError 收集而不打印
+    Lexer: 持有编译好的 DFA 的词法分析器, 提供 scan / tokenize / tokenize_str 方法, 可以在多个线程中同时使用,
+        上述模块级方法使用的是 get_lexer 返回的默认词法分析器
+    build_lexer: 根据单词符号规则 (正则表达式或字面量列表) 生成并缓存词法分析用的 DFA,
+        默认规则定义在 _type.py 中
+    Stats: 统计信息, 作为 scan 的 stats 参数时记录读取文件、加载 DFA 和扫描的耗时、单词符号数以及 DFA 的来源,
+        也可以传给语法分析器, 见 stats.py
+    IncrementalLexer: 保存源代码及其单词符号序列, 编辑后只重新扫描受影响的区域, 返回单词符号序列的变化 TokenEdit
+
 输出格式:
     [源代码中的单词符号][TAB]<[单词符号类型]>
+
+    scan 的 trace 参数为 'binary' 时输出紧凑的二进制格式, 可以用 trace.read_trace 读取, 为 None 时不输出
     
 符号类型:
     KW: 关键字
@@ -16,4 +30,8 @@
 """
 
 from .fsm import FSM
-from .scanner import scan
+from .generator import build_lexer
+from ._type import Token
+from .scanner import Lexer, LexError, get_lexer, scan, tokenize, tokenize_str
+from .incremental import IncrementalLexer, TokenEdit
+from .stats import Stats
@@ -1,3 +1,12 @@
+from collections import namedtuple
+
+
+"""定义单词符号记录"""
+
+# 单词符号记录: 符号类型 (KW, OP, SE, IDN, INT)、单词符号文本、所在行号和列号 (均从 1 开始)
+Token = namedtuple('Token', ['kind', 'text', 'line', 'column'])
+
+
 """定义具体的单词符号类型"""
 
 # 关键字
@@ -16,10 +25,21 @@ _operator = {
 _boundary = ['(', ')', '{', '}', ';', ',']
 
 
-# """定义单词符号类型的正则表达式"""
+"""定义单词符号类型的正则表达式"""
+
+# 标识符
+_identifier = "[a-zA-Z_][a-zA-Z_0-9]*"
+
+# 整数
+_integer = "0|([1-9][0-9]*)"
+
 
-# # 标识符
-# _identifier = "[a-zA-Z_][a-zA-Z_0-9]*"
+"""定义词法分析器的生成规则, 排在前面的规则优先级更高"""
 
-# # 整数
-# _integer = "0|([1-9][0-9]*)"
+_rules = [
+    ('KW', _keyword),
+    ('IDN', _identifier),
+    ('INT', _integer),
+    ('OP', [op for ops in _operator.values() for op in ops]),
+    ('SE', _boundary),
+]
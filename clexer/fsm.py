@@ -1,5 +1,7 @@
+import time
 import pandas as pd
-import numpy as np
+from array import array
+from collections import deque
 
 
 class FSM:
@@ -10,33 +12,71 @@ class FSM:
       delta: 状态转移矩阵, 要求是一个 DataFrame 对象
       init: 初态集, 要求是一个列表
       final: 终态集, 要求是一个列表
+      tags: 终态标记, 要求是一个字典, 将终态映射为其识别的单词符号类型 (可选)
+      classes: 字符类, 要求是一个字典, 将作为列名的代表字符映射为该类包含的全部字符 (可选)
 
     支持:
       1. 状态的转换与 token 的匹配
-      2. 非确定有限状态自动机的确定化
-      3. 确定的有限状态自动机最小化
+      2. 字母表的字符类压缩
+      3. 非确定有限状态自动机的确定化
+      4. 确定的有限状态自动机最小化
+      5. 确定的有限状态自动机编译为稠密的整数状态转换表
     """
-    def __init__(self, delta: pd.DataFrame, init: list, final: list):
-        self.delta = delta  # 状态转换矩阵
+    def __init__(self, delta: pd.DataFrame, init: list, final: list, tags: dict = None,
+                 classes: dict = None):
+        self._delta = delta # 状态转换矩阵, 由缓存还原时为 None, 首次访问 delta 时才构造
+        self._columns = None
         self.init = init    # 初态集
         self.final = final  # 终态集
+        self.tags = tags if tags is not None else {}    # 终态标记
+        self.table = None   # 编译后的状态转换表, 未编译时为 None
+        self._set_classes(classes if classes is not None else {})
+
+
+    def _set_classes(self, classes: dict):
+        """设置字符类, 并建立字符到代表字符的映射, 未压缩的列以自身为代表"""
+        self.classes = classes  # 字符类: 代表字符 -> 该类包含的全部字符
+        self.class_of = {chr: representative
+                         for representative, chars in classes.items() for chr in chars}
 
 
     def forward(self, cstate, chr):
-        """通过查找状态转换矩阵的值进行状态的转换"""
+        """通过查找状态转换矩阵的值进行状态的转换, 字符先映射为其字符类的代表字符"""
         try:
-            return self.delta[chr][cstate]
+            return self.delta[self.class_of.get(chr, chr)][cstate]
         except:
             print("错误: 状态转换失败")
 
     
+    @property
+    def delta(self):
+        """状态转换矩阵, 由缓存还原的自动机在首次访问时才由整数状态转换表构造 DataFrame"""
+        if self._delta is None:
+            ncolumns, table = self.ncolumns, self.table
+            rows = []
+            for base in range(0, len(table), ncolumns):
+                rows.append({chr: table[base + column] for column, chr in enumerate(self._columns)
+                             if table[base + column] >= 0})
+            self._delta = pd.DataFrame(rows, index=range(len(rows)), columns=self._columns)
+        return self._delta
+
+
+    @delta.setter
+    def delta(self, delta: pd.DataFrame):
+        self._delta = delta
+
+
     def isnfa(self):
         """判断是否为非确定有限状态自动机"""
+        if self._delta is None:
+            return False
         return '' in self.delta.columns
     
 
     def isdfa(self):
         """判断是否为确定有限状态自动机"""
+        if self._delta is None:
+            return True
         return '' not in self.delta.columns
 
 
@@ -52,177 +92,384 @@ class FSM:
         return next_set
 
 
+    def _transitions(self):
+        """
+        将 DataFrame 形式的状态转换矩阵整理为 {状态: {字符: 目标状态元组}} 形式的字典, 
+        并略去缺失的转换
+        """
+        transitions = {}
+        for state, row in zip(self.delta.index, self.delta.itertuples(index=False)):
+            moves = {}
+            for chr, next in zip(self.delta.columns, row):
+                if isinstance(next, list):
+                    moves[chr] = tuple(next)
+                elif not pd.isnull(next):
+                    moves[chr] = (int(next),)
+            transitions[state] = moves
+        return transitions
+
+
+    def compress_alphabet(self):
+        """
+        字符类压缩: 在所有状态上转换都相同的字符行为完全一致, 合并为一个字符类,
+        以类中第一个字符为代表占据状态转换矩阵的一列, 其余字符的列被去除,
+        确定化和最小化因此只需遍历字符类而不是全部字符, 返回压缩后的字符类个数
+        """
+        transitions = self._transitions()
+        groups = {}
+        for chr in self.delta.columns:
+            if chr != '':
+                signature = tuple(moves.get(chr) for moves in transitions.values())
+                groups.setdefault(signature, []).append(chr)
+
+        classes = {}
+        for members in groups.values():
+            classes[members[0]] = ''.join(self.classes.get(chr, chr) for chr in members)
+        columns = [chr for chr in self.delta.columns if chr == '' or chr in classes]
+        if len(columns) < len(self.delta.columns):
+            self.delta = self.delta[columns].copy()
+        self._set_classes({chr: chars for chr, chars in classes.items() if chars != chr})
+        self.table = None
+        return len(classes)
+
+
+    @staticmethod
+    def _closure_of(state, transitions, closures):
+        """迭代地计算单个状态的ε-闭包, 结果缓存在 closures 中"""
+        closure = closures.get(state)
+        if closure is None:
+            closure = {state}
+            stack = [state]
+            while stack:
+                for next in transitions[stack.pop()].get('', ()):
+                    if next not in closure:
+                        closure.add(next)
+                        stack.append(next)
+            closure = closures[state] = frozenset(closure)
+        return closure
+
+
     def epsilon_closure(self, state_set):
         """计算状态集合的ε-闭包"""
-        closure = state_set.copy()
+        transitions = self._transitions()
+        closures = {}
+        closure = set()
         for state in state_set:
-            epsilon_next = self.forward(state, '')
-
-            if not isinstance(epsilon_next, list):
-                epsilon_next = [epsilon_next]
-            else:
-                epsilon_next = epsilon_next.copy()
-            closure += epsilon_next
-            if state in epsilon_next:
-                epsilon_next.remove(state)
-
-            closure += self.epsilon_closure(epsilon_next)
-        return list(set(closure))
+            closure |= self._closure_of(state, transitions, closures)
+        return list(closure)
 
 
     def nfa2dfa(self):
-        """将非确定有限状态自动机确定化, 转换为确定有限状态自动机"""
+        """
+        将非确定有限状态自动机确定化, 转换为确定有限状态自动机.
+        确定化之前先进行字符类压缩, 采用子集构造法: DFA 状态以 NFA 状态的 frozenset 为键映射到状态编号, 工作表为双端队列, 
+        单个状态的ε-闭包只计算一次, 每个 DFA 状态只遍历其中 NFA 状态实际存在的转换,
+        转换到空集的弧不生成死状态, 而是在状态转换矩阵中记为缺失
+        """
         if self.isdfa():
             print("错误: 该有限状态自动机已经是确定化状态, 不可重复确定化")
             return
+        self.compress_alphabet()
+
+        transitions = self._transitions()
+        alphabet = [chr for chr in self.delta.columns if chr != '']
+        order = {chr: idx for idx, chr in enumerate(alphabet)}
+        closures = {}
+
+        def closure_of(state_set):
+            closure = set()
+            for state in state_set:
+                closure |= self._closure_of(state, transitions, closures)
+            return frozenset(closure)
 
-        dfa_states = []
-        dfa_states.append(self.epsilon_closure([0]))
-        state_queue = dfa_states.copy()
+        init_state = closure_of(self.init)
+        dfa_states = [init_state]
+        dfa_ids = {init_state: 0}
+        state_queue = deque([init_state])
 
         dfa_delta = []
-        while True:
-            if not state_queue:
-                break
-            cstate = state_queue[0]
-            state_queue.pop(0)
-            delta_item = {}
+        while state_queue:
+            cstate = state_queue.popleft()
 
-            for chr in self.delta.columns:
-                if chr == '':
-                    continue
-                nstate = self.epsilon_closure(self.move(cstate, chr))
-                if nstate not in dfa_states:
+            # 计算从状态集合出发经过每个字符到达的状态全体
+            moves = {}
+            for state in cstate:
+                for chr, nexts in transitions[state].items():
+                    if chr != '':
+                        moves.setdefault(chr, set()).update(nexts)
+
+            delta_item = {}
+            for chr in sorted(moves, key=order.__getitem__):
+                nstate = closure_of(moves[chr])
+                if nstate not in dfa_ids:
+                    dfa_ids[nstate] = len(dfa_states)
                     dfa_states.append(nstate)
                     state_queue.append(nstate)
-                delta_item.update({chr: dfa_states.index(nstate)})
+                delta_item[chr] = dfa_ids[nstate]
 
             dfa_delta.append(delta_item)
-        self.delta = pd.DataFrame(dfa_delta)
+        self.delta = pd.DataFrame(dfa_delta, columns=alphabet)
 
-        # 更新初态集和终态集
-        dfa_init = []
+        # 更新初态集、终态集和终态标记,
+        # 一个状态集合包含多个带标记的终态时, 以终态集中靠前的终态的标记为准
         dfa_final = []
-        for state in dfa_states:
-            for init_state in self.init:
-                if init_state in state:
-                    dfa_init.append(dfa_states.index(state))
-            for final_state in self.final:
-                if final_state in state:
-                    dfa_final.append(dfa_states.index(state))
-        self.init = list(set(dfa_init))
-        self.final = list(set(dfa_final))
+        dfa_tags = {}
+        for idx, state in enumerate(dfa_states):
+            finals = [final_state for final_state in self.final if final_state in state]
+            if finals:
+                dfa_final.append(idx)
+            for final_state in finals:
+                if final_state in self.tags:
+                    dfa_tags[idx] = self.tags[final_state]
+                    break
+        self.init = [0]
+        self.final = dfa_final
+        self.tags = dfa_tags
 
 
     def minimize_dfa(self):
-        """化简确定有限状态自动机, 使之最小化"""
+        """
+        化简确定有限状态自动机, 使之最小化, 返回化简的统计信息:
+            states: 化简前的状态数
+            removed: 化简去除的状态数
+            seconds: 化简耗时 (秒)
+
+        步骤:
+            1. 进行字符类压缩, 将状态转换矩阵转换为整数数组, 通过可达性分析去掉从初态不可达的状态和无法到达终态的死状态
+            2. 使用 Hopcroft 算法进行划分求精, 时间复杂度为 O(n·k·log n)
+            3. 为最终划分的每一组构造一个新的状态
+        """
         if self.isnfa():
             print("错误: 该有限状态自动机还未确定化, 请先将其确定化")
             return
-        
-        # 步骤0: 检查是否为全状态的有限状态自动机, 如果不是则需要添加死状态
-        if self.delta.isnull().sum().sum() > 0:
-            dead_state = len(self.delta.index)
-            self.delta.loc[dead_state] = [dead_state for _ in self.delta.columns]
-            self.delta = self.delta.applymap(lambda x: dead_state if pd.isnull(x) else x)
-
-        # 步骤1: 初始化分: 构造终态和非终态两组划分
-        nofinal = [state if state not in self.final else np.nan for state in self.delta.index]
-        nofinal = list(filter(lambda x: not pd.isnull(x), nofinal))
-        partition = [nofinal, self.final]
-
-        # 步骤2: 使用传播性原则构造新的划分, 直到不能再继续划分为止
-        while True:
-            partition_ = partition.copy()
-            for iset in partition:
-                cut = False
-                for chr in self.delta.columns:
-                    nset = set(self.move(iset, chr))
-
-                    cut = True
-                    for jset in partition:
-                        if nset <= set(jset):
-                            # 状态集合经过一条chr弧到达的状态全体包含于原划分的某个状态组, 不用继续划分
-                            cut = False
-                            break
-                    if cut:
-                        # 状态集合经过一条chr弧到达的状态全体不全包含于原划分的某个状态组, 则需要继续划分
-                        iset_dir = {}
-                        for state in iset:
-                            nstate = self.forward(state, chr)
-                            for jset in partition:
-                                if nstate in jset:
-                                    break
-                            if tuple(jset) not in iset_dir:
-                                iset_dir[tuple(jset)] = []
-                            iset_dir[tuple(jset)].append(state)
-                        update = list(iset_dir.values())
-                        partition.remove(iset)
-                        partition += update
-                        break
-                if cut:
-                    break
-            if partition_ == partition:
-                break
+        begin = time.perf_counter()
+        self.compress_alphabet()
+
+        states = list(self.delta.index)
+        alphabet = list(self.delta.columns)
+        nstates, ncolumns = len(states), len(alphabet)
+        state_idx = {state: idx for idx, state in enumerate(states)}
+
+        # 步骤1: 转换为整数数组, 缺失的转换记为 -1
+        delta = array('i', [-1] * (nstates * ncolumns))
+        for idx, row in enumerate(self.delta.itertuples(index=False)):
+            for column, nstate in enumerate(row):
+                if not pd.isnull(nstate) and int(nstate) in state_idx:
+                    delta[idx * ncolumns + column] = state_idx[int(nstate)]
+
+        # 从初态出发的可达状态
+        reachable = bytearray(nstates)
+        stack = [state_idx[state] for state in self.init]
+        for state in stack:
+            reachable[state] = 1
+        while stack:
+            state = stack.pop()
+            for nstate in delta[state * ncolumns:(state + 1) * ncolumns]:
+                if nstate >= 0 and not reachable[nstate]:
+                    reachable[nstate] = 1
+                    stack.append(nstate)
+
+        # 能够到达终态的状态, 在逆向的转换上进行搜索
+        inverse = [[] for _ in range(nstates)]
+        for state in range(nstates):
+            for nstate in delta[state * ncolumns:(state + 1) * ncolumns]:
+                if nstate >= 0:
+                    inverse[nstate].append(state)
+        alive = bytearray(nstates)
+        stack = [state_idx[state] for state in self.final]
+        for state in stack:
+            alive[state] = 1
+        while stack:
+            for pstate in inverse[stack.pop()]:
+                if not alive[pstate]:
+                    alive[pstate] = 1
+                    stack.append(pstate)
+
+        # 保留可达且能够到达终态的状态, 其余状态连同指向它们的转换一并去除
+        kept = [state for state in range(nstates) if reachable[state] and alive[state]]
+        if not kept:
+            print("错误: 该有限状态自动机不接受任何符号串")
+            return
+        renumber = {state: idx for idx, state in enumerate(kept)}
+        nkept = len(kept)
+
+        # 补充一个死状态 (编号为 nkept) 使之成为全状态的有限状态自动机, 缺失的转换都指向死状态
+        dead = nkept
+        trans = array('i', [dead] * ((nkept + 1) * ncolumns))
+        for idx, state in enumerate(kept):
+            for column in range(ncolumns):
+                nstate = delta[state * ncolumns + column]
+                if nstate in renumber:
+                    trans[idx * ncolumns + column] = renumber[nstate]
+
+        # 步骤2: Hopcroft 划分求精
+        # 逆向转换: inverse[column][state] 为经过 column 列的字符到达 state 的状态列表
+        inverse = [[[] for _ in range(nkept + 1)] for _ in range(ncolumns)]
+        for state in range(nkept + 1):
+            for column in range(ncolumns):
+                inverse[column][trans[state * ncolumns + column]].append(state)
+
+        # 初始划分: 非终态 (含死状态) 一组, 终态按终态标记分组
+        final_idx = {state_idx[state]: state for state in self.final}
+        groups = {}
+        for idx, state in enumerate(kept):
+            if state in final_idx:
+                key = ('final', self.tags.get(states[state]))
+            else:
+                key = ('nofinal',)
+            groups.setdefault(key, []).append(idx)
+        groups.setdefault(('nofinal',), []).append(dead)
+
+        blocks = [set(group) for group in groups.values()]
+        block_of = array('i', [0] * (nkept + 1))
+        for block, members in enumerate(blocks):
+            for state in members:
+                block_of[state] = block
+
+        # 待处理的 (划分块, 字符) 对: 初始划分中除最大的一块之外的每一块与每个字符组成的对,
+        # 只有终态和非终态两块时即为较小的一块; 以最大的一块为 splitter 能做的划分都可以由其余各块得到
+        largest = max(range(len(blocks)), key=lambda block: len(blocks[block]))
+        worklist = deque((block, column) for block in range(len(blocks)) if block != largest
+                         for column in range(ncolumns))
+        waiting = set(worklist)
+        while worklist:
+            splitter = worklist.popleft()
+            waiting.discard(splitter)
+            block, column = splitter
+
+            # 经过 column 列的字符到达 splitter 块的状态, 按所在的划分块分组
+            touched = {}
+            for state in blocks[block]:
+                for pstate in inverse[column][state]:
+                    touched.setdefault(block_of[pstate], set()).add(pstate)
+
+            for target, inside in touched.items():
+                members = blocks[target]
+                if len(inside) == len(members):
+                    continue
+                # 把到达 splitter 块的状态移出原块成为新块, 工作量只与 inside 的大小有关
+                members -= inside
+                new = len(blocks)
+                blocks.append(inside)
+                for state in inside:
+                    block_of[state] = new
+
+                # (原块, 字符) 仍在工作表中时, 新块与该字符组成的对也加入工作表;
+                # 否则只需加入拆分后较小的一部分与该字符组成的对
+                smaller = new if len(inside) <= len(members) else target
+                for other in range(ncolumns):
+                    pair = (new, other) if (target, other) in waiting else (smaller, other)
+                    if pair not in waiting:
+                        worklist.append(pair)
+                        waiting.add(pair)
+
+        # 步骤3: 为最终划分的每一组构造一个新的状态, 按组内最小的状态编号排列, 死状态所在的组被去除
+        dead_block = block_of[dead]
+        order = sorted({block_of[state] for state in range(nkept)} - {dead_block},
+                       key=lambda block: min(blocks[block]))
+        new_idx = {block: idx for idx, block in enumerate(order)}
 
-        # 步骤3: 为最终划分的每一组选择一个代表, 这里我们选择每一组的第一个状态作为代表
         dfa_delta = []
-        dfa_init = []
         dfa_final = []
-
-        for iset in partition:
+        dfa_tags = {}
+        for idx, block in enumerate(order):
+            representative = min(blocks[block])
             delta_item = {}
-            for chr in self.delta.columns:
-                nstate = self.forward(iset[0], chr)
-                # 检查 nstate 包含于划分中的哪一组
-                for jset in partition:
-                    if nstate in jset:
-                        delta_item.update({chr: partition.index(jset)})
-                        break
+            for column, chr in enumerate(alphabet):
+                nblock = block_of[trans[representative * ncolumns + column]]
+                if nblock != dead_block:
+                    delta_item[chr] = new_idx[nblock]
             dfa_delta.append(delta_item)
 
-            for state in iset:
-                if state in self.init:
-                    dfa_init.append(partition.index(iset))
-                if state in self.final:
-                    dfa_final.append(partition.index(iset))
-
-        self.delta = pd.DataFrame(dfa_delta)
-        self.init = list(set(dfa_init))
-        self.final = list(set(dfa_final))
-
-        # 步骤4: 去掉新得到有限状态自动机中的死状态
-        dead_states = []
-        for state in self.delta.index:
-            # 死状态的判定: 没有通路到达终态的状态是死状态
-            if state in (dead_states + self.final):
-                continue
-            chr_idx = 0
-            cstate = state
-            trigger = False
-            while True:
-                # 尝试找到一条到达终态的通路
-                nstate = self.forward(cstate, self.delta.columns[chr_idx])
-                if nstate in self.final:
-                    # 已到达终态
-                    break
-                if pd.isnull(nstate) or nstate == cstate:
-                    # 此路不通, 尝试其它路径
-                    if chr_idx < len(self.delta.columns) - 1:
-                        chr_idx += 1
-                        trigger = True
-                    else:
-                        # 找到一个死状态, 去除之
-                        self.delta = self.delta.drop(index=cstate)
-                        self.delta = self.delta.applymap(lambda x: np.nan if x == cstate else x)
-                        dead_states.append(cstate)
-                        break
-                else:
-                    if trigger:
-                        trigger = False
-                        chr_idx = 0
-                    cstate = nstate
-        
+            state = states[kept[representative]]
+            if state in self.final:
+                dfa_final.append(idx)
+                if state in self.tags:
+                    dfa_tags[idx] = self.tags[state]
+
+        self.delta = pd.DataFrame(dfa_delta, columns=alphabet)
+        self.init = [new_idx[block_of[renumber[state_idx[self.init[0]]]]]]
+        self.final = dfa_final
+        self.tags = dfa_tags
+
+        return {
+            'states': nstates,
+            'removed': nstates - len(order),
+            'seconds': time.perf_counter() - begin,
+        }
+
+
+    def compile(self):
+        """
+        将确定有限状态自动机冻结为稠密的整数状态转换表:
+            table: 扁平的 array('i'), 下标为「状态 × 字符类」, 缺失的转换记为 -1
+            char_class: 长度为 256 的 array('i'), 将字符编码映射为字符类 (即列号), 不在字母表中的字符记为 -1
+            states: 编译后的状态编号到原状态的映射
+            accepting: 编译后的状态是否为终态
+            accept_tags: 编译后的终态对应的终态标记, 非终态或没有标记时为 None
+        编译后 DataFrame 形式的状态转换矩阵仍然保留, 以便检查和调试
+        """
+        if self.isnfa():
+            print("错误: 该有限状态自动机还未确定化, 请先将其确定化")
+            return
+
+        self.states = list(self.delta.index)
+        state_idx = {state: idx for idx, state in enumerate(self.states)}
+
+        self.char_class = array('i', [-1] * 256)
+        for column, representative in enumerate(self.delta.columns):
+            for chr in self.classes.get(representative, representative):
+                if ord(chr) < 256:
+                    self.char_class[ord(chr)] = column
+        self.ncolumns = len(self.delta.columns)
+
+        self.table = array('i', [-1] * (len(self.states) * self.ncolumns))
+        for state, row in zip(self.states, self.delta.itertuples(index=False)):
+            base = state_idx[state] * self.ncolumns
+            for column, nstate in enumerate(row):
+                # 转换到已被去除的死状态, 同样视为缺失的转换
+                if not pd.isnull(nstate) and int(nstate) in state_idx:
+                    self.table[base + column] = state_idx[int(nstate)]
+
+        self.start = state_idx[self.init[0]]
+        self.accepting = bytearray(len(self.states))
+        self.accept_tags = [None] * len(self.states)
+        for state in self.final:
+            if state in state_idx:
+                self.accepting[state_idx[state]] = 1
+                self.accept_tags[state_idx[state]] = self.tags.get(state)
+
+
+    @classmethod
+    def from_table(cls, columns: list, table: array, init: list, final: list, tags: dict = None,
+                   classes: dict = None):
+        """
+        由稠密的整数状态转换表还原已编译的确定有限状态自动机,
+        table 的下标为「状态 × len(columns)」, 缺失的转换记为 -1, 状态编号即为编译后的编号,
+        columns 为各字符类的代表字符, classes 为字符类.
+        编译结果直接由 table 得到, 不经过 pandas; DataFrame 形式的状态转换矩阵在首次访问 delta 时才构造
+        """
+        fsm = cls(None, init, final, tags, classes)
+        fsm._columns = list(columns)
+        fsm.ncolumns = len(columns)
+        fsm.table = table
+        nstates = len(table) // fsm.ncolumns if fsm.ncolumns else 0
+        fsm.states = list(range(nstates))
+
+        fsm.char_class = array('i', [-1] * 256)
+        for column, representative in enumerate(columns):
+            for chr in fsm.classes.get(representative, representative):
+                if ord(chr) < 256:
+                    fsm.char_class[ord(chr)] = column
+
+        fsm.start = init[0]
+        fsm.accepting = bytearray(nstates)
+        fsm.accept_tags = [None] * nstates
+        for state in final:
+            fsm.accepting[state] = 1
+            fsm.accept_tags[state] = fsm.tags.get(state)
+        return fsm
+
 
     def mathch(self, token):
         """输入一个字符串进行匹配, 若匹配成功则返回一个终态, 否则打印错误信息"""
@@ -230,6 +477,24 @@ class FSM:
             print("错误: 该有限状态自动机还未确定化, 请先将其确定化")
             return
 
+        # 已编译的自动机直接通过整数下标进行状态转换
+        if self.table is not None:
+            table, char_class, ncolumns = self.table, self.char_class, self.ncolumns
+            cstate = self.start
+            for chr in token:
+                code = ord(chr)
+                column = char_class[code] if code < 256 else -1
+                cstate = table[cstate * ncolumns + column] if column >= 0 else -1
+                if cstate < 0:
+                    print("错误: token 非法")
+                    return
+
+            if not self.accepting[cstate]:
+                print("错误: token 不完整")
+                return
+            else:
+                return self.states[cstate]
+
         cstate = self.init[0]
         for chr in token:
             nstate = self.forward(cstate, chr)
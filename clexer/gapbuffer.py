@@ -0,0 +1,248 @@
+"""
+间隙缓冲区模块
+
+功能:
+    增量词法分析和增量语法分析用来保存可编辑序列的数据结构,
+    一次编辑的工作量只与编辑区域的大小和相邻两次编辑之间的距离有关, 与序列的长度无关.
+
+    GapBuffer: 序列以「间隙」为界分为两部分, 间隙之前的元素按顺序存放在 front 中,
+        间隙之后的元素逆序存放在 back 中 (back 的最后一个元素紧跟在间隙之后).
+        移动间隙只需要在两部分的末尾之间搬运经过的元素, 在间隙处删除和插入元素只涉及两部分的末尾.
+    OffsetBuffer: 保存严格递增的偏移量的间隙缓冲区, 间隙之前为从序列开头算起的绝对偏移量,
+        间隙之后为到序列末尾的距离 (逆序存放后仍然递增, 可以二分查找).
+        在间隙处编辑后, 间隙之后的偏移量到末尾的距离不变, 不需要逐个调整.
+    TextBuffer: 分块存储的文本, 文本块及其起始偏移量、换行符的偏移量都以间隙方式存储,
+        替换一段文本只需要重新切分所在的几个文本块, 由换行符的偏移量计算行号和列号.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# 文本块的大小
+_chunk_size = 1 << 12
+
+
+class GapBuffer:
+    """
+    间隙缓冲区
+    --------
+    输入:
+      items: 初始的元素, 间隙位于末尾 (可选)
+      typecode: 不为 None 时以该类型的 array 存储元素, 否则以列表存储 (可选)
+    """
+    def __init__(self, items=(), typecode: str = None):
+        self.typecode = typecode
+        self.front = self._new(items)
+        self.back = self._new(())
+
+
+    def _new(self, items):
+        return list(items) if self.typecode is None else array(self.typecode, items)
+
+
+    def __len__(self):
+        return len(self.front) + len(self.back)
+
+
+    def __getitem__(self, idx: int):
+        """第 idx 个元素, 0 <= idx < len(self)"""
+        front = self.front
+        if idx < len(front):
+            return front[idx]
+        return self.back[len(front) + len(self.back) - 1 - idx]
+
+
+    def __iter__(self):
+        yield from self.front
+        yield from reversed(self.back)
+
+
+    def iter_from(self, idx: int):
+        """从第 idx 个元素开始逐个生成元素, 生成期间不能修改缓冲区"""
+        front, back = self.front, self.back
+        split = len(front)
+        for k in range(idx, split):
+            yield front[k]
+        for k in range(split + len(back) - 1 - max(idx, split), -1, -1):
+            yield back[k]
+
+
+    @property
+    def gap(self) -> int:
+        """间隙的位置, 即间隙之前的元素个数"""
+        return len(self.front)
+
+
+    def _move(self, idx: int, length: int = None):
+        """把间隙移动到第 idx 个元素之前, length 不为 None 时经过的元素 v 转换为 length - v"""
+        front, back = self.front, self.back
+        if idx < len(front):
+            moved, source, target = front[idx:][::-1], front, back
+            del front[idx:]
+        elif idx > len(front):
+            split = len(back) - (idx - len(front))
+            moved, source, target = back[split:][::-1], back, front
+            del back[split:]
+        else:
+            return
+        target.extend(moved if length is None else [length - value for value in moved])
+
+
+    def move_gap(self, idx: int):
+        """把间隙移动到第 idx 个元素之前, 只搬运两个位置之间的元素"""
+        self._move(idx)
+
+
+    def replace(self, removed: int, items):
+        """删除紧跟在间隙之后的 removed 个元素, 并在间隙处插入 items, 间隙移动到插入的元素之后"""
+        back = self.back
+        del back[len(back) - removed:]
+        self.front.extend(items)
+
+
+class OffsetBuffer(GapBuffer):
+    """
+    偏移量的间隙缓冲区
+    ---------------
+    以 array('q') 存储严格递增的偏移量, 读取、移动间隙和查找时需要给出序列的当前长度 length,
+    在间隙处插入的偏移量是绝对偏移量
+    """
+    def __init__(self, items=()):
+        super().__init__(items, 'q')
+
+
+    def get(self, idx: int, length: int) -> int:
+        """第 idx 个偏移量"""
+        front = self.front
+        if idx < len(front):
+            return front[idx]
+        return length - self.back[len(front) + len(self.back) - 1 - idx]
+
+
+    def move_gap(self, idx: int, length: int):
+        """把间隙移动到第 idx 个偏移量之前, 经过的偏移量在绝对偏移量和到末尾的距离之间转换"""
+        self._move(idx, length)
+
+
+    def bisect_left(self, offset: int, length: int) -> int:
+        """小于 offset 的偏移量的个数"""
+        front, back = self.front, self.back
+        if front and front[-1] >= offset:
+            return bisect_left(front, offset)
+        return len(front) + len(back) - bisect_right(back, length - offset)
+
+
+    def bisect_right(self, offset: int, length: int) -> int:
+        """不大于 offset 的偏移量的个数"""
+        front, back = self.front, self.back
+        if front and front[-1] > offset:
+            return bisect_right(front, offset)
+        return len(front) + len(back) - bisect_left(back, length - offset)
+
+
+class TextBuffer:
+    """
+    分块存储的文本
+    ------------
+    输入:
+      text: 初始的文本 (可选)
+      chunk_size: 文本块的大小 (可选)
+
+    属性:
+      chunks: 文本块, 都不为空
+      starts: 各文本块的起始偏移量
+      newlines: 各换行符的偏移量
+    """
+    def __init__(self, text: str = '', chunk_size: int = _chunk_size):
+        self.chunk_size = chunk_size
+        self.chunks = GapBuffer(text[i:i + chunk_size] for i in range(0, len(text), chunk_size))
+        self.starts = OffsetBuffer(range(0, len(text), chunk_size))
+        self.newlines = OffsetBuffer(_find_all(text, '\n'))
+        self._length = len(text)
+
+
+    def __len__(self):
+        return self._length
+
+
+    def __str__(self):
+        return ''.join(self.chunks)
+
+
+    def _locate(self, offset: int) -> int:
+        """偏移量 offset 所在的文本块的下标, offset 为文本末尾时为最后一个文本块"""
+        return max(self.starts.bisect_right(offset, self._length) - 1, 0)
+
+
+    def iter_chunks(self, start: int = 0, stop: int = None):
+        """依次生成偏移量 start 到 stop (不含) 之间的文本块, 首尾的文本块被截短"""
+        stop = self._length if stop is None else stop
+        if start >= stop:
+            return
+        chunks = self.chunks
+        idx = self._locate(start)
+        offset = self.starts.get(idx, self._length)
+        while offset < stop:
+            chunk = chunks[idx]
+            yield chunk[max(start - offset, 0):stop - offset]
+            offset += len(chunk)
+            idx += 1
+
+
+    def __getitem__(self, key: slice) -> str:
+        """文本的切片, 只支持步长为 1 的切片"""
+        start, stop, _ = key.indices(self._length)
+        return ''.join(self.iter_chunks(start, stop))
+
+
+    def positions(self, offsets):
+        """依次生成递增的偏移量 offsets 所在的「(行号, 列号)」, 行号和列号都从 1 开始"""
+        newlines, length = self.newlines, self._length
+        count = len(newlines)
+        line = None     # 偏移量之前的换行符个数
+        for offset in offsets:
+            if line is None:
+                line = newlines.bisect_left(offset, length)
+            while line < count and newlines.get(line, length) < offset:
+                line += 1
+            yield line + 1, offset - (newlines.get(line - 1, length) if line else -1)
+
+
+    def position(self, offset: int) -> tuple:
+        """偏移量 offset 所在的「(行号, 列号)」"""
+        return next(self.positions((offset,)))
+
+
+    def replace(self, offset: int, removed: int, inserted: str):
+        """删除从 offset 开始的 removed 个字符, 并在 offset 处插入 inserted"""
+        chunks, starts, newlines, length = self.chunks, self.starts, self.newlines, self._length
+        end = offset + removed
+
+        # 换行符: 删除编辑区域中的换行符, 插入 inserted 中的换行符
+        first = newlines.bisect_left(offset, length)
+        newlines.move_gap(first, length)
+        newlines.replace(newlines.bisect_left(end, length) - first, (offset + i for i in _find_all(inserted, '\n')))
+
+        # 文本块: 把编辑区域所在的文本块拼接后替换, 末块过短时并入下一个文本块, 再重新切分
+        count = len(chunks)
+        first = self._locate(offset)
+        last = min(self._locate(end) + 1, count)
+        chunks.move_gap(first)
+        starts.move_gap(first, length)
+        size = self.chunk_size
+        base = starts.get(first, length) if first < count else 0
+        if last < count and (starts.get(last, length) - base + len(inserted) - removed) % size < size // 2:
+            last += 1
+        text = ''.join(chunks[i] for i in range(first, last))
+        text = text[:offset - base] + inserted + text[end - base:]
+        chunks.replace(last - first, (text[i:i + size] for i in range(0, len(text), size)))
+        starts.replace(last - first, range(base, base + len(text), size))
+        self._length = length - removed + len(inserted)
+
+
+def _find_all(text: str, sub: str):
+    """依次生成 sub 在 text 中各次出现的偏移量"""
+    idx = text.find(sub)
+    while idx >= 0:
+        yield idx
+        idx = text.find(sub, idx + 1)
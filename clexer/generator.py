@@ -0,0 +1,293 @@
+"""
+词法分析器生成模块
+
+功能:
+    根据带名称的单词符号规则生成词法分析用的有限状态自动机.
+    规则是 (符号类型, 模式) 二元组的列表, 模式可以是正则表达式字符串, 也可以是字面量字符串的列表,
+    排在前面的规则优先级更高, 例如关键字规则排在标识符规则之前时, 「int」被识别为关键字.
+
+    生成过程:
+        1. 用 Thompson 构造法将每条规则转换为 NFA, 并用一个新的初态以ε弧连接起来
+        2. 用 FSM 的 nfa2dfa 和 minimize_dfa 确定化和最小化
+        3. 编译为稠密的整数状态转换表, 并以规则的哈希值为键缓存到 __dfacache__ 目录下,
+           此后直接加载缓存, 无需重新生成
+
+正则表达式语法:
+    支持字符、转义字符「\\」、字符类「[a-z_]」、分组「()」、选择「|」以及闭包「*」「+」「?」
+"""
+import os
+import sys
+import json
+import struct
+import hashlib
+import pandas as pd
+from array import array
+from .fsm import FSM
+from .stats import Stats
+
+
+# 生成器版本, 生成方法或缓存格式改变时需要递增
+_GENERATOR_VERSION = 2
+
+# 魔数
+_MAGIC = b'CDFA'
+
+# 缓存目录
+_cache_dir = os.path.join(os.path.dirname(__file__), '__dfacache__')
+
+
+class _RegexParser:
+    """
+    正则表达式的递归下降分析器, 在分析的同时用 Thompson 构造法生成 NFA 片段,
+    NFA 的状态转换以 {字符: 目标状态或目标状态列表} 字典的列表 rows 表示, 
+    每个片段是一个 (开始状态, 结束状态) 二元组
+    """
+    def __init__(self, pattern: str, rows: list):
+        self.pattern = pattern
+        self.pos = 0
+        self.rows = rows
+
+    def error(self, message):
+        raise ValueError("正则表达式 %r 第 %d 个字符处: %s" % (self.pattern, self.pos + 1, message))
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self):
+        chr = self.peek()
+        if chr is None:
+            self.error("意外的结尾")
+        self.pos += 1
+        return chr
+
+    def parse(self):
+        fragment = self.alternation()
+        if self.peek() is not None:
+            self.error("多余的字符 %r" % self.peek())
+        return fragment
+
+    def alternation(self):
+        """alternation -> concatenation ('|' concatenation)*"""
+        fragments = [self.concatenation()]
+        while self.peek() == '|':
+            self.pos += 1
+            fragments.append(self.concatenation())
+        if len(fragments) == 1:
+            return fragments[0]
+        start, end = _new_state(self.rows), _new_state(self.rows)
+        for fstart, fend in fragments:
+            _add_edge(self.rows, start, '', fstart)
+            _add_edge(self.rows, fend, '', end)
+        return start, end
+
+    def concatenation(self):
+        """concatenation -> repetition*"""
+        fragments = []
+        while self.peek() not in (None, '|', ')'):
+            fragments.append(self.repetition())
+        if not fragments:
+            # 空串
+            state = _new_state(self.rows)
+            return state, state
+        for (_, prev_end), (next_start, _) in zip(fragments, fragments[1:]):
+            _add_edge(self.rows, prev_end, '', next_start)
+        return fragments[0][0], fragments[-1][1]
+
+    def repetition(self):
+        """repetition -> atom ('*' | '+' | '?')*"""
+        fstart, fend = self.atom()
+        while self.peek() in ('*', '+', '?'):
+            op = self.take()
+            start, end = _new_state(self.rows), _new_state(self.rows)
+            _add_edge(self.rows, start, '', fstart)
+            _add_edge(self.rows, fend, '', end)
+            if op in ('*', '?'):
+                _add_edge(self.rows, start, '', end)
+            if op in ('*', '+'):
+                _add_edge(self.rows, fend, '', fstart)
+            fstart, fend = start, end
+        return fstart, fend
+
+    def atom(self):
+        """atom -> '(' alternation ')' | '[' class ']' | '\\' char | char"""
+        chr = self.take()
+        if chr == '(':
+            fragment = self.alternation()
+            if self.take() != ')':
+                self.error("缺少「)」")
+            return fragment
+        if chr == '[':
+            return self.char_class()
+        if chr in ('*', '+', '?', ')', ']'):
+            self.error("意外的字符 %r" % chr)
+        if chr == '.':
+            self.error("不支持「.」, 请使用字符类")
+        if chr == '\\':
+            chr = self.take()
+        start, end = _new_state(self.rows), _new_state(self.rows)
+        _add_edge(self.rows, start, chr, end)
+        return start, end
+
+    def char_class(self):
+        """class -> (char | char '-' char)+ ']'"""
+        codes = []
+        if self.peek() == '^':
+            self.error("不支持取反的字符类")
+        while self.peek() != ']':
+            first = self.take()
+            if first == '\\':
+                first = self.take()
+            if self.peek() == '-' and self.pattern[self.pos + 1:self.pos + 2] not in ('', ']'):
+                self.pos += 1
+                last = self.take()
+                if last == '\\':
+                    last = self.take()
+                if ord(last) < ord(first):
+                    self.error("字符范围 %s-%s 无效" % (first, last))
+                codes += range(ord(first), ord(last) + 1)
+            else:
+                codes.append(ord(first))
+        self.pos += 1
+        if not codes:
+            self.error("空的字符类")
+        start, end = _new_state(self.rows), _new_state(self.rows)
+        for code in dict.fromkeys(codes):
+            _add_edge(self.rows, start, chr(code), end)
+        return start, end
+
+
+def _new_state(rows: list) -> int:
+    """新建一个 NFA 状态"""
+    rows.append({})
+    return len(rows) - 1
+
+
+def _add_edge(rows: list, state: int, chr: str, next: int):
+    """添加一条从 state 经过 chr 弧 (chr 为空串时为ε弧) 到达 next 的转换"""
+    targets = rows[state].get(chr)
+    if targets is None:
+        rows[state][chr] = next
+    elif isinstance(targets, list):
+        if next not in targets:
+            targets.append(next)
+    elif targets != next:
+        rows[state][chr] = [targets, next]
+
+
+def _build_nfa(rules: list) -> FSM:
+    """用 Thompson 构造法把所有规则合并为一个 NFA, 终态集按规则的优先级排列"""
+    rows = [{}]
+    final = []
+    tags = {}
+    for tag, pattern in rules:
+        if isinstance(pattern, str):
+            start, end = _RegexParser(pattern, rows).parse()
+            _add_edge(rows, 0, '', start)
+            final.append(end)
+            tags[end] = tag
+        else:
+            # 字面量列表: 每个字面量是一条字符链
+            for literal in pattern:
+                cstate = _new_state(rows)
+                _add_edge(rows, 0, '', cstate)
+                for chr in literal:
+                    nstate = _new_state(rows)
+                    _add_edge(rows, cstate, chr, nstate)
+                    cstate = nstate
+                final.append(cstate)
+                tags[cstate] = tag
+
+    # 保证状态转换矩阵含有ε列, 以便被识别为 NFA
+    rows[0].setdefault('', 0)
+    return FSM(pd.DataFrame(rows), [0], final, tags)
+
+
+def spec_hash(rules: list) -> str:
+    """计算规则的哈希值, 作为缓存的键"""
+    spec = [_GENERATOR_VERSION, sys.byteorder, [[tag, pattern] for tag, pattern in rules]]
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    """缓存文件的路径"""
+    return os.path.join(_cache_dir, 'dfa-%s.bin' % key[:16])
+
+
+def _save_dfa(fsm: FSM, key: str):
+    """
+    缓存编译后的 DFA, 缓存目录不可写时放弃缓存,
+    文件格式: [魔数 CDFA][4 字节头部长度][JSON 头部][填充至 4 字节对齐][int32 状态转换表]
+    """
+    columns = list(fsm.delta.columns)
+    header = {
+        'key': key,
+        'columns': columns,
+        'classes': fsm.classes,
+        'init': [fsm.start],
+        'final': [state for state in range(len(fsm.states)) if fsm.accepting[state]],
+        'tags': [[state, tag] for state, tag in enumerate(fsm.accept_tags) if tag is not None],
+    }
+    encoded = json.dumps(header).encode()
+    try:
+        os.makedirs(_cache_dir, exist_ok=True)
+        tmp_path = _cache_path(key) + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<I', len(encoded)))
+            f.write(encoded)
+            f.write(b'\0' * (-(8 + len(encoded)) % 4))
+            fsm.table.tofile(f)
+        os.replace(tmp_path, _cache_path(key))
+    except OSError:
+        pass
+
+
+def _load_dfa(key: str):
+    """加载缓存的 DFA, 缓存不存在、已损坏或已失效时返回 None"""
+    try:
+        with open(_cache_path(key), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    try:
+        if data[:4] != _MAGIC:
+            return None
+        header_len, = struct.unpack_from('<I', data, 4)
+        header = json.loads(data[8:8 + header_len].decode())
+        if header['key'] != key:
+            return None
+        start = 8 + header_len
+        start += -start % 4
+        table = array('i')
+        table.frombytes(data[start:])
+        return FSM.from_table(header['columns'], table, header['init'], header['final'],
+                              {state: tag for state, tag in header['tags']}, header['classes'])
+    except (ValueError, KeyError, struct.error):
+        return None
+
+
+def build_lexer(rules: list, cache: bool = True, stats: Stats = None) -> FSM:
+    """
+    根据单词符号规则生成编译好的 DFA, 终态标记为规则的符号类型,
+    cache 为 True 时优先加载以规则哈希值为键的缓存, 缓存缺失时生成并写入缓存,
+    stats 不为 None 时把 DFA 的来源 ('hit' 或 'miss') 记录到 stats.caches['dfa']
+    """
+    key = spec_hash(rules)
+    if cache:
+        fsm = _load_dfa(key)
+        if fsm is not None:
+            if stats is not None:
+                stats.caches['dfa'] = 'hit'
+            return fsm
+    if stats is not None:
+        stats.caches['dfa'] = 'miss'
+
+    fsm = _build_nfa(rules)
+    fsm.nfa2dfa()
+    fsm.minimize_dfa()
+    fsm.compile()
+
+    if cache:
+        _save_dfa(fsm, key)
+    return fsm
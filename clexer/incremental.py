@@ -0,0 +1,139 @@
+"""
+增量词法分析模块
+
+功能:
+    保存源代码及其单词符号序列, 源代码被编辑后只重新扫描受影响的区域.
+
+    重新扫描从编辑位置之前最近的「安全」单词符号开始: 该单词符号与前一个单词符号之间隔有空白字符,
+    由于单词符号中不含空白字符, 前一个单词符号的最长匹配不会越过空白字符读到编辑区域.
+    越过编辑区域后, 一旦重新扫描得到的单词符号的起始位置与某个未受影响的原单词符号的起始位置重合,
+    自动机就回到了与原扫描相同的状态, 之后的单词符号都与原来相同, 扫描即可停止.
+
+    源代码分块存储在 TextBuffer 中, 单词符号的符号类型、文本和起始偏移量都存储在间隙缓冲区中 (见 gapbuffer.py):
+    间隙之前的起始偏移量是从文本开头算起的绝对偏移量, 间隙之后的是到文本末尾的距离.
+    编辑时把间隙移动到重新扫描的起点, 编辑区域之后的单词符号到文本末尾的距离不变, 不需要逐个调整;
+    行号和列号由同样以间隙方式存储的换行符偏移量二分查找得到.
+    因此一次编辑的工作量只与编辑区域的大小和相邻两次编辑之间的距离有关, 与源代码的大小无关.
+"""
+from collections import namedtuple
+from ._type import Token
+from .scanner import Lexer, get_lexer
+from .gapbuffer import GapBuffer, OffsetBuffer, TextBuffer
+
+
+# 一次编辑对单词符号序列的影响: 从第 first 个单词符号开始的 removed 个单词符号被替换为 tokens
+TokenEdit = namedtuple('TokenEdit', ['first', 'removed', 'tokens'])
+
+
+class IncrementalLexer:
+    """
+    增量词法分析器
+    ------------
+    输入:
+      source: 源代码字符串
+      lexer: 词法分析器, 默认为 get_lexer 返回的词法分析器 (可选)
+
+    属性:
+      text: 当前的源代码, 每次访问时由各文本块拼接得到
+      kinds / texts: 单词符号的符号类型 / 文本, 以 GapBuffer 存储, 支持下标访问和迭代
+    """
+    def __init__(self, source: str, lexer: Lexer = None):
+        self.lexer = lexer if lexer is not None else get_lexer()
+        self._text = TextBuffer(source)
+        kinds, texts, starts = [], [], []
+        for token in self.lexer._tokenize((source,), starts=starts):
+            kinds.append(token.kind)
+            texts.append(token.text)
+        self.kinds = GapBuffer(kinds)
+        self.texts = GapBuffer(texts)
+        self._starts = OffsetBuffer(starts)     # 单词符号的起始偏移量
+
+
+    def __len__(self):
+        return len(self.kinds)
+
+
+    @property
+    def text(self) -> str:
+        return str(self._text)
+
+
+    def start(self, idx: int) -> int:
+        """第 idx 个单词符号的起始偏移量"""
+        return self._starts.get(idx, len(self._text))
+
+
+    def _move_gap(self, idx: int):
+        """把间隙移动到第 idx 个单词符号之前"""
+        self.kinds.move_gap(idx)
+        self.texts.move_gap(idx)
+        self._starts.move_gap(idx, len(self._text))
+
+
+    def _find(self, offset: int) -> int:
+        """起始偏移量不大于 offset 的最后一个单词符号的下标, 不存在时为 -1"""
+        return self._starts.bisect_right(offset, len(self._text)) - 1
+
+
+    def token(self, idx: int) -> Token:
+        """第 idx 个单词符号记录, 行号和列号根据当前的源代码计算"""
+        line, column = self._text.position(self.start(idx))
+        return Token(self.kinds[idx], self.texts[idx], line, column)
+
+
+    def tokens(self, first: int = 0, last: int = None) -> list:
+        """第 first 到第 last (不含) 个单词符号记录的列表"""
+        last = len(self.kinds) if last is None else last
+        kinds, texts = self.kinds, self.texts
+        indices = range(first, last)
+        positions = self._text.positions(map(self.start, indices))
+        return [Token(kinds[idx], texts[idx], line, column) for idx, (line, column) in zip(indices, positions)]
+
+
+    def edit(self, offset: int, removed: int, inserted: str) -> TokenEdit:
+        """
+        编辑源代码: 删除从 offset 开始的 removed 个字符, 并在 offset 处插入 inserted,
+        重新扫描受影响的区域, 返回单词符号序列的变化 TokenEdit
+        """
+        text = self._text
+        if not 0 <= offset <= offset + removed <= len(text):
+            raise ValueError("编辑区域 [%d, %d) 超出了源代码的范围" % (offset, offset + removed))
+
+        # 重新扫描的起点: 起始偏移量不大于 offset 的最后一个单词符号,
+        # 若它与前一个单词符号之间没有空白字符, 则继续向前, 直到遇到空白字符
+        count = len(self.kinds)
+        first = max(self._find(offset), 0)
+        while first > 0 and self.start(first - 1) + len(self.texts[first - 1]) == self.start(first):
+            first -= 1
+        restart = min(offset, self.start(first)) if first < count else offset
+
+        # 间隙移动到起点后, 起点之后的单词符号都以到文本末尾的距离存储, 不受编辑的影响
+        self._move_gap(first)
+        starts = self._starts
+        # 编辑区域之后第一个未受影响的原单词符号
+        old = max(starts.bisect_left(offset + removed, len(text)), first)
+
+        text.replace(offset, removed, inserted)
+        length = len(text)
+        edit_end = offset + len(inserted)
+        line, column = text.position(restart)
+
+        kinds, texts, new_starts = [], [], []
+        for token in self.lexer._tokenize(text.iter_chunks(restart), restart, line, restart - column + 1, new_starts):
+            start = new_starts[-1]
+            if start >= edit_end:
+                # 越过编辑区域后, 检查是否与原单词符号重新同步
+                while old < count and starts.get(old, length) < start:
+                    old += 1
+                if old < count and starts.get(old, length) == start:
+                    new_starts.pop()
+                    break
+            kinds.append(token.kind)
+            texts.append(token.text)
+        else:
+            old = count
+
+        self.kinds.replace(old - first, kinds)
+        self.texts.replace(old - first, texts)
+        starts.replace(old - first, new_starts)
+        return TokenEdit(first, old - first, self.tokens(first, first + len(kinds)) if kinds else [])
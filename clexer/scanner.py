@@ -1,175 +1,260 @@
-import pandas as pd
-import string
-
-from . import FSM
-from ._type import _keyword, _operator, _boundary
+import threading
+from collections import namedtuple
+from itertools import count
+from operator import itemgetter
+from time import perf_counter
+from .fsm import FSM
+from .generator import build_lexer
+from .trace import TraceWriter
+from .stats import Stats, phase
+from ._type import Token, _rules
 from typing import Union
 from os import PathLike
 
 
 FilePath = Union[str, "PathLike[str]"]
 
-def _print_token(token, tp):
-    """打印识别出的 token 及其所属的符号类型"""
-    _fout.write("%s\t<%s>\n" %(token, tp))
-
-
-def _analyse_token(token):
-    """分析 token, 将识别出的 token 输入有限状态自动机"""
-    # 空 token, 直接返回
-    if token == "":
-        return
-    
-    # 判断 token 是否为关键字
-    if token in _keyword:
-        _print_token(token, 'KW')
-        return
-
-    # 判断 token 是否为由两个字符组成的运算符
-    if token in (_operator['relational'] + _operator['logical']):
-        _print_token(token, 'OP')
-        return
-    
-    # 判断 token 是否为半个关系运算符
-    if token in _operator['half']:
-        _print_token(token, 'OP')
-        return
-    
-    # 判断 token 是否为位运算符
-    if token in _operator['bitwise']:
-        _print_token(token, 'OP')
-        return
-
-    # 将 token 输入有限状态自动机
-    fstate = _fsm.mathch(token)
-    if fstate == 2:
-        _print_token(token, 'IDN')
-    elif fstate == 3 or fstate == 4:
-        _print_token(token, 'INT')
-    else:
-        print("词法分析错误: token 分析失败")
-
-
-def scan(src: FilePath, output: FilePath):
+# 流式扫描时每次读入的字符数
+_chunk_size = 1 << 16
+
+# 单词符号序列的输出格式: [单词符号][TAB]<[单词符号类型]>
+_trace_format = "%s\t<%s>\n"
+
+# 二进制格式的单词符号序列的魔数
+_trace_magic = b'CLTR'
+
+# 由单词符号记录 Token 得到单词符号序列的一条记录「(单词符号, 符号类型)」
+_trace_record = itemgetter(1, 0)
+
+# 词法错误: 无法识别的字符 char 及其所在的行号 line 和列号 column (都从 1 开始)
+LexError = namedtuple('LexError', ['char', 'line', 'column'])
+
+class Lexer:
     """
-    源码扫描器:
-        扫描C--语言的源代码, 
-        输出识别出单词符号序列
+    词法分析器
+    --------
+    持有编译好的 DFA, 构造后不再修改, 扫描过程中的状态 (缓冲区、偏移量、行号、输出文件) 都保存在局部变量中,
+    因此同一个 Lexer 对象可以在多个线程中同时使用
+
+    输入:
+      fsm: 编译好的确定有限状态自动机, 终态标记为单词符号类型, 默认由 _type.py 中的规则生成 (可选)
     """
-    # 读取源文件
-    try:
-        with open(src, 'r') as f:
-            lines = f.readlines()
-    except:
-        print("错误: 打开文件 %s 失败" % src)
-        return
-
-    # 加载用于词法分析的有限状态自动机
-    global _fsm
-    try:
-        if _fsm.isdfa():
-            pass
-        else:
-            print("词法分析错误: 有限状态机异常")
-    except:
-        # 创建用于词法分析的有限状态自动机
-        delta = pd.DataFrame([
-            {
-                **{'': 0},  # 空串
-                **{chr: 1 for chr in (string.ascii_uppercase + string.ascii_lowercase)},    # 大写或小写字母
-                **{'_': 1}, # 下划线
-                **{str(digit): 4 for digit in range(1, 10)}, # 数字 1-9
-                **{str(0): 6}    # 数字
-            },  # 初态
-
-            {'': [1, 2]},   # 状态 1
-
-            {
-                **{'': [2, 3]},     # 空串
-                **{chr: 2 for chr in (string.ascii_uppercase + string.ascii_lowercase)},    # 大写或小写字母
-                **{'_': 1},         # 下划线
-                **{str(digit): 2 for digit in range(0, 10)}, # 数字 0-9
-            },              # 状态 2
-
-            {'': 3},        # 状态 3
-
-            {'': [4, 5]},   # 状态 4
-
-            {
-                **{'': [5, 6]},   # 空串
-                **{str(digit): 5 for digit in range(0, 10)}, # 数字 0-9
-            },              # 状态 5
-
-            {'': 6}         # 状态 6
-        ])
-
-        _fsm = FSM(delta, [0], [3, 6])
-        _fsm.nfa2dfa()
-        _fsm.minimize_dfa()
-
-    # 打开输出的目标文件
-    global _fout
-    _fout = open(output, 'w')
-
-    # 开始逐行逐字扫描源代码, 将识别出的 token 输入有限状态自动机
-    token = ""
-    for line in lines:
-        for chr in line:
-            # 当扫描到换行符和文本分隔符, 包括空格和制表符
+    def __init__(self, fsm: FSM = None):
+        if fsm is None:
+            fsm = build_lexer(_rules)
+        if not fsm.isdfa() or fsm.table is None:
+            raise ValueError("词法分析错误: 有限状态机异常, 需要编译好的确定有限状态自动机")
+        self.fsm = fsm
+
+
+    def _tokenize(self, chunks, pos: int = 0, line: int = 1, line_start: int = 0, starts: list = None,
+                  errors: list = None):
+        """
+        单遍最长匹配:
+            以起止偏移量在源代码上运行有限状态自动机, 每次取能够到达终态的最长前缀作为 token,
+            token 直接从缓冲区中切片得到, 生成单词符号记录 Token.
+            源代码以文本块的可迭代对象给出, 缓冲区耗尽时才读入下一个文本块, 并丢弃已扫描完的部分,
+            因此跨越文本块边界的 token (如「==」「&&」「<=」) 能够被正确识别, 且缓冲区大小与源代码大小无关.
+
+            增量词法分析从源代码的中间开始扫描: pos 为第一个文本块的偏移量,
+            line 和 line_start 为偏移量 pos 所在的行号和行首的偏移量,
+            starts 不为 None 时, 生成每个单词符号记录之前把它的起始偏移量追加到 starts 中.
+
+            遇到无法识别的字符时跳过该字符, errors 为 None 时打印错误信息, 否则把 LexError 追加到 errors 中
+        """
+        fsm = self.fsm
+        table, char_class, ncolumns = fsm.table, fsm.char_class, fsm.ncolumns
+        start, accept_tags = fsm.start, fsm.accept_tags
+
+        chunks = (chunk for chunk in chunks if chunk)
+        text = ''           # 缓冲区
+        length = 0          # 缓冲区长度
+        base = pos          # 缓冲区开头的偏移量
+        pos = 0             # 当前 token 相对于缓冲区的起始偏移量
+        line_start -= base  # 当前行首相对于缓冲区的偏移量
+        while True:
+            if pos >= length:
+                # 缓冲区已扫描完, 读入下一个文本块
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                base += length
+                line_start -= length
+                text = chunk
+                length = len(text)
+                pos = 0
+
+            # 跳过换行符和文本分隔符, 包括空格和制表符
+            chr = text[pos]
             if chr in ('\n', ' ', '\t'):
-                _analyse_token(token)
-                token = ""
-                continue             
-
-            # 当扫描到界符
-            if chr in _boundary:
-                _analyse_token(token)
-                _print_token(chr, 'SE')
-                token = ""
-                continue
-            
-            # 当扫描到敏感运算符
-            if chr in _operator['half']:
-                # 检查 token 是否也是半个关系运算符, 如果是且当前读入的是等号, 则说明扫描到了由2个字符组成的关系运算符
-                if token in _operator['half']:
-                    if chr == '=':
-                        token += chr
-                        _analyse_token(token)
-                        token = ""
-                    else:
-                        _print_token(token, 'OP')
-                        _print_token(chr, 'OP')
-                        token = ""
-                else:
-                    _analyse_token(token)
-                    token = chr      
+                pos += 1
+                if chr == '\n':
+                    line += 1
+                    line_start = pos
                 continue
 
-            if chr in _operator['bitwise']:
-                # 检查 token 是否也是位运算符, 如果是且当前读入了与 token 相同的位运算符, 则说明扫描到了由2个字符组成的逻辑运算符
-                if token in _operator['bitwise']:
-                    if token == chr:
-                        token += chr
-                        _analyse_token(token)
-                        token = ""
-                    else:
-                        _print_token(token, 'OP')
-                        _print_token(chr, 'OP')
-                        token = ""
+            cstate = start
+            end = -1
+            tp = None
+            i = pos
+            while True:
+                if i >= length:
+                    # 缓冲区耗尽而自动机仍可继续转换, token 可能跨越文本块的边界, 读入下一个文本块
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    text = text[pos:] + chunk
+                    i -= pos
+                    end -= pos if end >= 0 else 0
+                    line_start -= pos
+                    base += pos
+                    pos = 0
+                    length = len(text)
+
+                code = ord(text[i])
+                column = char_class[code] if code < 256 else -1
+                if column < 0:
+                    break
+                cstate = table[cstate * ncolumns + column]
+                if cstate < 0:
+                    break
+                i += 1
+                if accept_tags[cstate] is not None:
+                    end = i
+                    tp = accept_tags[cstate]
+
+            if end < 0:
+                error = LexError(chr, line, pos - line_start + 1)
+                if errors is None:
+                    print(_describe(error))
                 else:
-                    _analyse_token(token)
-                    token = chr
+                    errors.append(error)
+                pos += 1
                 continue
 
-            # 当扫描到算术运算符
-            if chr in _operator['arithmetic']:
-                _analyse_token(token)
-                _print_token(chr, 'OP')
-                token = ""
-                continue
+            if starts is not None:
+                starts.append(base + pos)
+            yield Token(tp, text[pos:end], line, pos - line_start + 1)
+            pos = end
+
+
+    def tokenize(self, src: FilePath, chunk_size: int = _chunk_size, errors: list = None):
+        """
+        单词符号生成器:
+            以流的方式扫描C--语言的源代码文件, 每次读入 chunk_size 个字符,
+            逐个生成识别出的单词符号记录 Token(kind, text, line, column),
+            errors 不为 None 时词法错误以 LexError 追加到 errors 中而不打印
+        """
+        with open(src, 'r') as f:
+            yield from self._tokenize(_read_chunks(f, chunk_size), errors=errors)
+
+
+    def tokenize_str(self, source: str):
+        """
+        单词符号生成器:
+            扫描字符串形式的C--语言源代码,
+            逐个生成识别出的单词符号记录 Token(kind, text, line, column)
+        """
+        yield from self._tokenize((source,))
+
+
+    def scan(self, src: FilePath, output: FilePath, chunk_size: int = _chunk_size, trace: str = 'text',
+             stats: Stats = None):
+        """
+        源码扫描器:
+            以流的方式扫描C--语言的源代码, 每次读入 chunk_size 个字符,
+            输出识别出单词符号序列, 
+            trace 为输出模式: 'text' 为文本格式, 'binary' 为二进制格式 (记录为「(单词符号, 符号类型)」), 
+            None 为不输出, 只检查词法错误,
+            stats 不为 None 时把读取文件和扫描的耗时以及单词符号数记录到 stats 中
+        """
+        # 打开源文件
+        try:
+            f = open(src, 'r')
+        except:
+            print("错误: 打开文件 %s 失败" % src)
+            if stats is not None:
+                stats.finish()
+            return
+
+        # 单遍扫描源代码, 输出识别出的 token 及其所属的符号类型
+        if stats is None:
+            with f, TraceWriter(output, _trace_format, trace, _trace_magic) as writer:
+                writer.write_all(map(_trace_record, self._tokenize(_read_chunks(f, chunk_size))))
+            return
+
+        # 收集统计信息: 单独计时读取文件, 单词符号与计数器一起迭代以统计个数
+        reading = [0.0]
+        counter = count()
+        start = perf_counter()
+        try:
+            with f, TraceWriter(output, _trace_format, trace, _trace_magic) as writer:
+                tokens = self._tokenize(_timed_chunks(f, chunk_size, reading))
+                writer.write_all(map(_trace_record, map(itemgetter(0), zip(tokens, counter))))
+        finally:
+            stats.add_time('read', reading[0])
+            stats.add_time('tokenize', perf_counter() - start - reading[0])
+            stats.count('tokens', next(counter))
+            stats.finish()
+
+
+def _describe(error: LexError) -> str:
+    """词法错误的文字描述"""
+    return "词法分析错误: 无法识别的字符 %r (%d 行 %d 列)" % error
+
+
+def _read_chunks(f, chunk_size):
+    """按固定大小逐块读取文件"""
+    return iter(lambda: f.read(chunk_size), '')
+
+
+def _timed_chunks(f, chunk_size, reading: list):
+    """按固定大小逐块读取文件, 读取的耗时累加到 reading[0]"""
+    while True:
+        start = perf_counter()
+        chunk = f.read(chunk_size)
+        reading[0] += perf_counter() - start
+        if not chunk:
+            return
+        yield chunk
+
+
+# 默认的词法分析器, 首次使用时创建
+_lexer = None
+
+# 创建默认词法分析器时持有的锁
+_lexer_lock = threading.Lock()
+
+def get_lexer(stats: Stats = None) -> Lexer:
+    """
+    访问使用默认规则的词法分析器, 多个线程同时首次访问时只创建一次,
+    stats 不为 None 时把 DFA 的来源记录到 stats 中
+    """
+    global _lexer
+    source = 'memory'
+    if _lexer is None:
+        with _lexer_lock:
+            if _lexer is None:
+                _lexer = Lexer(build_lexer(_rules, stats=stats))
+                source = None
+    if stats is not None and source is not None:
+        stats.caches['dfa'] = source
+    return _lexer
+
+
+def tokenize(src: FilePath, chunk_size: int = _chunk_size, errors: list = None):
+    """使用默认的词法分析器逐个生成源代码文件中的单词符号记录, 见 Lexer.tokenize"""
+    return get_lexer().tokenize(src, chunk_size, errors)
+
+
+def tokenize_str(source: str):
+    """使用默认的词法分析器逐个生成字符串中的单词符号记录, 见 Lexer.tokenize_str"""
+    return get_lexer().tokenize_str(source)
+
 
-            # 当扫描到的并非特殊字符
-            token += chr
-    
-    # 关闭输出的目标文件
-    _fout.close()
+def scan(src: FilePath, output: FilePath, chunk_size: int = _chunk_size, trace: str = 'text',
+         stats: Stats = None):
+    """使用默认的词法分析器扫描源代码文件并输出单词符号序列, 见 Lexer.scan"""
+    with phase(stats, 'dfa'):
+        lexer = get_lexer(stats)
+    lexer.scan(src, output, chunk_size, trace, stats)
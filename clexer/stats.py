@@ -0,0 +1,126 @@
+"""
+统计信息模块
+
+功能:
+    收集词法分析和语法分析各阶段的耗时、计数以及 DFA 和分析表的来源.
+    scan、ll_parse、lr_parse 等接口的 stats 参数为 None (默认) 时不收集统计信息,
+    分析循环与不支持统计时完全相同, 没有任何额外开销;
+    给出 Stats 对象时, 分析循环本身也不做任何判断: 执行动作由 TraceWriter 在写出缓冲区时整块计数,
+    分析栈换成记录最大深度的 PeakStack, 只有入栈时多一次 Python 方法调用.
+    在百万级单词符号的输入上并输出文本格式的分析序列时, 开启统计使 LL(1) 分析慢 30%~50%, LR 分析慢 10%~30%.
+
+阶段 (timings):
+    dfa: 访问默认的词法分析器, 包括加载或生成 DFA
+    read: 读取源代码文件或词法分析结果文件
+    tokenize: 扫描源代码并输出单词符号序列 (不含读取文件)
+    table: 加载或生成分析表
+    parse: 语法分析并输出分析序列, 输入为单词符号生成器时包括词法分析
+
+计数 (counters):
+    tokens: 识别出的单词符号数
+    steps: 分析步数, 即分析序列的记录数
+    moves: 移进 (LR) 或匹配 (LL) 的输入符号数
+    reductions: 规约 (LR) 或推导 (LL) 次数
+    errors: 发现的语法错误数
+    lookups: 查表次数, LL 为推导次数与出错次数之和, LR 为 ACTION 表与 GOTO 表的查表次数之和
+    max_stack_depth: 分析栈的最大深度
+
+来源 (caches):
+    以 'dfa' 和分析法名称为键, 值为 'memory' (已在内存中)、'hit' (从缓存文件加载) 或 'miss' (重新生成)
+"""
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+
+
+class Stats:
+    """
+    统计信息
+    ------
+    同一个 Stats 对象可以用于多次调用, 耗时和计数都会累加, 栈的最大深度取最大值
+
+    输入:
+      callback: 每次扫描或分析结束 (包括因错误中止) 时以 Stats 对象为参数调用 (可选)
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.timings = {}
+        self.counters = {}
+        self.caches = {}
+
+
+    def add_time(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def maximum(self, name: str, value: int):
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+
+    @contextmanager
+    def timer(self, phase: str):
+        """计时的上下文管理器, 退出时 (包括因异常退出) 把耗时累加到 phase 阶段"""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, perf_counter() - start)
+
+
+    def add_actions(self, actions: Counter, lookups: int):
+        """累加一次语法分析中各执行动作的次数, lookups 为本次分析的查表次数"""
+        self.count('steps', sum(actions.values()))
+        self.count('moves', actions['move'])
+        self.count('reductions', actions['reduction'])
+        self.count('errors', actions['error'])
+        self.count('lookups', lookups)
+
+
+    def finish(self):
+        """一次扫描或分析结束, 调用回调函数"""
+        if self.callback is not None:
+            self.callback(self)
+
+
+    def as_dict(self) -> dict:
+        """转换为可以写成 JSON 的字典"""
+        return {'timings': dict(self.timings), 'counters': dict(self.counters), 'caches': dict(self.caches)}
+
+
+    def __repr__(self):
+        return 'Stats(%r)' % self.as_dict()
+
+
+def phase(stats: Stats, name: str):
+    """stats 不为 None 时为 name 阶段计时, 否则什么也不做"""
+    return nullcontext() if stats is None else stats.timer(name)
+
+
+class PeakStack(list):
+    """
+    记录最大深度的栈, 只在收集统计信息时代替 list 作为分析栈, 深度创新高时更新 stats 的 max_stack_depth,
+    为了减少入栈的开销, 比较深度的代码直接写在 append 和 __iadd__ 中
+    """
+    def __init__(self, items, stats: Stats):
+        super().__init__(items)
+        self.stats = stats
+        self.peak = len(self)
+        stats.maximum('max_stack_depth', self.peak)
+
+    def append(self, item):
+        list.append(self, item)
+        if len(self) > self.peak:
+            self.peak = len(self)
+            self.stats.maximum('max_stack_depth', self.peak)
+
+    def __iadd__(self, items):
+        list.extend(self, items)
+        if len(self) > self.peak:
+            self.peak = len(self)
+            self.stats.maximum('max_stack_depth', self.peak)
+        return self
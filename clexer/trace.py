@@ -0,0 +1,197 @@
+"""
+分析序列输出模块
+
+功能:
+    词法分析器和语法分析器的分析序列 (trace) 由一条条记录构成, 每条记录是若干个字段组成的元组.
+    TraceWriter 将记录收集在缓冲区中, 缓冲区满时整块格式化并写出, 避免逐条调用 write 和格式化.
+    写入一条记录只是一次列表的 append, 分析器在适当的时机 (如每读入一个单词符号) 调用 check 检查缓冲区是否已满.
+
+输出模式:
+    'text': 文本格式, 每条记录按格式字符串格式化, 与逐条写出的结果完全相同
+    'binary': 紧凑的二进制格式, 供程序读取, 见 read_trace
+    None: 不输出分析序列
+
+    给出 actions 时, 每次整块写出缓冲区之前, 按记录的最后一个字段 (执行动作) 整块计数,
+    计数在 C 层面完成, 不为每条记录调用 Python 函数; 此时即使不输出, 记录也会先收集在缓冲区中
+
+二进制格式:
+    [4 字节魔数][若干条记录, 每个字段为一个 int32][JSON 尾部][4 字节尾部长度]
+
+    字符串字段被编码为字符串表中的下标, 整数字段原样存储, int32 按小端字节序存储.
+    JSON 尾部记录每条记录的字段数 width, 字符串字段的位置 string_fields 和字符串表 strings.
+"""
+import sys
+import json
+import struct
+from array import array
+from collections import Counter, deque
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Union
+from os import PathLike
+
+
+FilePath = Union[str, "PathLike[str]"]
+
+# 输出模式
+_modes = ('text', 'binary', None)
+
+# 缓冲区能够容纳的记录数
+_buffer_records = 1 << 14
+
+
+class TraceWriter:
+    """
+    分析序列输出器
+    ------------
+    输入:
+      output: 输出文件的路径, 模式为 None 时可以为 None
+      fmt: 文本格式下每条记录的格式字符串, 格式字符串中的字段数即为记录的字段数
+      mode: 输出模式, 可以是 'text'、'binary' 或 None
+      magic: 二进制格式的 4 字节魔数
+      buffer_records: 缓冲区能够容纳的记录数 (可选)
+      actions: 按执行动作对记录计数的 Counter (可选)
+
+    用法:
+      with TraceWriter(output, fmt, mode, magic) as writer:
+          write, check = writer.write, writer.check
+          write((field1, field2, ...))
+          check()
+    """
+    def __init__(self, output: FilePath, fmt: str, mode: str = 'text', magic: bytes = b'TRCE',
+                 buffer_records: int = _buffer_records, actions: Counter = None):
+        if mode not in _modes:
+            raise ValueError("未知的输出模式 %s, 可选的模式为 'text'、'binary' 或 None" % mode)
+        self.mode = mode
+        self.fmt = fmt
+        self.buffer_records = buffer_records
+        self.actions = actions
+        self._records = []
+
+        if mode is None:
+            # 不输出也不计数时, 记录写入一个长度为 0 的双端队列, 即直接丢弃
+            self._file = None
+            self.write = deque(maxlen=0).append if actions is None else self._records.append
+            return
+        if mode == 'text':
+            self._file = open(output, 'w')
+        else:
+            self._file = open(output, 'wb')
+            self._file.write(magic)
+            self._strings = []      # 字符串表
+            self._string_ids = {}   # 字符串到下标的映射
+            self._string_fields = None
+            self._width = 0
+        self.write = self._records.append   # 写入一条记录
+
+
+    def check(self):
+        """缓冲区满时整块写出"""
+        if len(self._records) >= self.buffer_records:
+            self.flush()
+
+
+    def write_all(self, records):
+        """写入记录的可迭代对象中的所有记录, 每次从中取出一个缓冲区的记录整块写出"""
+        if self._file is None and self.actions is None:
+            deque(records, maxlen=0)
+            return
+        self.flush()
+        records = iter(records)
+        while True:
+            self._records[:] = islice(records, self.buffer_records)
+            if not self._records:
+                break
+            self.flush()
+
+
+    def flush(self):
+        """将缓冲区中的记录整块计数并写出"""
+        records = self._records
+        if not records:
+            return
+        if self.actions is not None:
+            self.actions.update(map(itemgetter(-1), records))
+        if self.mode == 'text':
+            # 将格式字符串重复与记录数相同的次数, 一次格式化整个缓冲区
+            self._file.write((self.fmt * len(records)) % tuple(chain.from_iterable(records)))
+        elif self.mode == 'binary':
+            self._file.write(self._encode(records))
+        records.clear()
+
+
+    def _encode(self, records: list) -> bytes:
+        """将记录编码为 int32 数组, 字符串字段编码为字符串表中的下标"""
+        if self._string_fields is None:
+            self._width = len(records[0])
+            self._string_fields = [idx for idx, field in enumerate(records[0]) if isinstance(field, str)]
+        strings, string_ids = self._strings, self._string_ids
+        data = array('i')
+        for record in records:
+            for field in record:
+                if isinstance(field, str):
+                    sid = string_ids.get(field)
+                    if sid is None:
+                        sid = string_ids[field] = len(strings)
+                        strings.append(field)
+                    field = sid
+                data.append(field)
+        if sys.byteorder != 'little':
+            data.byteswap()
+        return data.tobytes()
+
+
+    def close(self):
+        """写出缓冲区中剩余的记录, 二进制格式下写入尾部, 然后关闭输出文件"""
+        if self._file is None:
+            self.flush()
+            return
+        try:
+            self.flush()
+            if self.mode == 'binary':
+                trailer = json.dumps({
+                    'width': self._width,
+                    'string_fields': self._string_fields or [],
+                    'strings': self._strings,
+                }).encode()
+                self._file.write(trailer)
+                self._file.write(struct.pack('<I', len(trailer)))
+        finally:
+            self._file.close()
+            self._file = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_trace(path: FilePath, magic: bytes = None) -> list:
+    """
+    读取二进制格式的分析序列, 返回记录元组的列表, 字符串字段还原为字符串,
+    给出 magic 时检查文件的魔数
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if magic is not None and data[:4] != magic:
+        raise ValueError("%s 不是预期格式的二进制分析序列" % path)
+    trailer_len, = struct.unpack_from('<I', data, len(data) - 4)
+    trailer = json.loads(data[len(data) - 4 - trailer_len:len(data) - 4].decode())
+
+    fields = array('i')
+    fields.frombytes(data[4:len(data) - 4 - trailer_len])
+    if sys.byteorder != 'little':
+        fields.byteswap()
+
+    width, strings = trailer['width'], trailer['strings']
+    string_fields = set(trailer['string_fields'])
+    records = []
+    if not width:
+        return records
+    for base in range(0, len(fields), width):
+        records.append(tuple(strings[field] if idx in string_fields else field
+                             for idx, field in enumerate(fields[base:base + width])))
+    return records
@@ -8,9 +8,52 @@
 输出格式:
     [序号][TAB][栈顶符号]#[面临的输入符号][TAB][执行动作]
 
-    执行动作包括「reduction 规约/推导」,「move 移进/跳过」,「accept 接受」和「error 出错」
+    执行动作包括「reduction 规约/推导」,「move 移进/跳过」,「accept 接受」和「error 出错」,
+    出错恢复模式下还有「pop 弹出栈顶符号」和「skip 删除输入符号」
+
+    ll_parse 和 lr_parse 的 trace 参数为 'binary' 时输出紧凑的二进制格式, 可以用 clexer.trace.read_trace 读取,
+    为 None 时不输出分析序列, 只检查语法错误
+
+输入:
+    ll_parse 和 lr_parse 的输入既可以是词法分析结果文件的路径,
+    也可以是单词符号记录的可迭代对象 (如 clexer.tokenize 生成的 Token), 
+    后者可以将词法分析和语法分析直接串联起来, 无需中间文件
+
+语法树:
+    ll_parse、lr_parse 和 Parser.parse 的 tree 参数为 True 时, 在分析的同时构造具体语法树 SyntaxTree 并返回,
+    结点以平行的整数数组存储 (符号编号、单词符号序号、第一个子结点、下一个兄弟结点), 见 tree.py
+
+出错恢复:
+    ll_parse 和 Parser.parse (LL(1)) 的 errors 参数为列表时, 遇到语法错误不再中止,
+    而是以 FOLLOW 集合为同步符号集合进行恐慌模式恢复, 一遍分析收集所有语法错误 ParseError,
+    错误数达到 max_errors 时中止. 默认不恢复, 遇到第一个语法错误即抛出 NotImplementedError
+
+统计信息:
+    ll_parse、lr_parse 和 Parser.parse 的 stats 参数为 clexer.Stats 对象时, 记录读取输入、加载分析表和分析的耗时,
+    分析步数、规约次数、查表次数、栈的最大深度等计数以及分析表来自内存、缓存文件还是重新生成,
+    stats 为 None (默认) 时分析循环没有任何额外开销
+
+增量分析:
+    IncrementalParser 保存 LL(1) 分析的检查点, 输入符号序列被编辑后 (如 clexer.IncrementalLexer.edit 的结果)
+    从编辑位置之前最近的检查点恢复分析, 与原分析重新同步后即停止, 见 incremental.py
+
+冲突分析:
+    conflicts.find_conflicts 直接由项目集族重新构造一次分析表, 报告 LL(1) 和各 LR 分析表中每一个冲突的表项、竞争的动作
+    和分析表实际保留的动作, LR 冲突还给出到达冲突状态的最短文法符号前缀,
+    也可以在命令行中运行 python3 -m cparser.conflicts
+
+预先生成的分析器:
+    codegen.write_module 把某种分析法的分析表以字面量内联, 生成只依赖标准库的独立语法分析器模块,
+    导入时不导入 pandas 也不加载分析表, 输出与 ll_parse / lr_parse 相同, 见 codegen.py
+
+线程安全:
+    Parser 对象持有编译后的只读分析表, 每次分析的状态都保存在局部变量中,
+    同一个 Parser 对象以及 ll_parse 和 lr_parse 都可以在多个线程中同时调用
 
 """
 
 from .lr_parser import parse as lr_parse
-from .ll_parser import parse as ll_parse
+from .ll_parser import parse as ll_parse, ParseError
+from .parser import Parser
+from .tree import SyntaxTree
+from .incremental import IncrementalParser
@@ -0,0 +1,118 @@
+"""
+分析表缓存模块
+
+功能:
+    以二进制格式缓存编译后的 LL(1) 和 LR 分析表, 缓存文件存放在 __tablecache__ 目录下.
+    缓存以文法文件 grammar.txt 的内容、终结符列表、分析法和缓存格式版本的哈希值为键,
+    文法或分析法改变后缓存自动失效, 并在下次访问时重新生成.
+
+文件格式:
+    [魔数 CCTB][4 字节头部长度][JSON 头部][填充至 4 字节对齐][若干个 int32 数组]
+
+    JSON 头部记录缓存的键、其它 JSON 值 (如符号列表) 以及各 int32 数组相对于数组区起始位置的偏移量和长度,
+    int32 数组按本机字节序存储, 可以直接读入 array('i').
+"""
+import os
+import sys
+import json
+import struct
+import hashlib
+import threading
+from array import array
+from .util import _terminal
+
+
+# 缓存格式版本, 分析表的构造方法或缓存格式改变时需要递增
+_CACHE_VERSION = 2
+
+# 魔数
+_MAGIC = b'CCTB'
+
+# 缓存目录
+_cache_dir = os.path.join(os.path.dirname(__file__), '__tablecache__')
+
+# 文法文件, 其内容是缓存的键的一部分
+_grammar_path = os.path.join(os.path.dirname(__file__), 'grammar.txt')
+
+# 构造或加载分析表时持有的锁, 多个线程同时首次访问分析表时只构造一次,
+# 文法、FIRST/FOLLOW 集合等中间结果也只在持有该锁时计算
+lock = threading.RLock()
+
+
+def cache_key(method: str) -> str:
+    """计算分析表缓存的键"""
+    digest = hashlib.sha256()
+    with open(_grammar_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps([_CACHE_VERSION, method, _terminal, sys.byteorder]).encode())
+    return digest.hexdigest()
+
+
+def _cache_path(method: str) -> str:
+    """分析表缓存文件的路径"""
+    return os.path.join(_cache_dir, '%s.bin' % method)
+
+
+def load(method: str):
+    """
+    加载分析表缓存, 返回由 JSON 值和 array('i') 组成的字典,
+    缓存不存在、已损坏或已失效时返回 None
+    """
+    try:
+        with open(_cache_path(method), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    try:
+        if data[:4] != _MAGIC:
+            return None
+        header_len, = struct.unpack_from('<I', data, 4)
+        header = json.loads(data[8:8 + header_len].decode())
+        if header['key'] != cache_key(method):
+            return None
+
+        start = 8 + header_len
+        start += -start % 4
+        arrays = dict(header['values'])
+        for name, offset, count in header['arrays']:
+            values = array('i')
+            values.frombytes(data[start + offset:start + offset + count * values.itemsize])
+            # 被截断的文件读出的数组比头部记录的短, 视为缓存损坏
+            if len(values) != count:
+                return None
+            arrays[name] = values
+        return arrays
+    except (ValueError, KeyError, struct.error):
+        return None
+
+
+def save(method: str, arrays: dict):
+    """
+    保存分析表缓存, arrays 是由 JSON 值 (如符号列表) 和 array('i') 组成的字典,
+    缓存目录不可写时放弃缓存
+    """
+    values = {name: value for name, value in arrays.items() if not isinstance(value, array)}
+    int_arrays = [(name, value) for name, value in arrays.items() if isinstance(value, array)]
+
+    layout = []
+    offset = 0
+    for name, value in int_arrays:
+        layout.append([name, offset, len(value)])
+        offset += len(value) * value.itemsize
+    header = {'key': cache_key(method), 'values': values, 'arrays': layout}
+    encoded = json.dumps(header).encode()
+
+    try:
+        os.makedirs(_cache_dir, exist_ok=True)
+        tmp_path = _cache_path(method) + '.%d.tmp' % os.getpid()
+        with open(tmp_path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(struct.pack('<I', len(encoded)))
+            f.write(encoded)
+            f.write(b'\0' * (-(8 + len(encoded)) % 4))
+            for _, value in int_arrays:
+                value.tofile(f)
+        os.replace(tmp_path, _cache_path(method))
+    except OSError:
+        pass
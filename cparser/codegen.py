@@ -0,0 +1,355 @@
+"""
+语法分析器代码生成模块
+
+功能:
+    根据编译后的分析表预先生成一个独立的 Python 模块, 模块中以字面量内联分析表,
+    分析循环针对一种分析法特化, 只依赖标准库: 导入时既不导入 pandas, 也不需要加载分析表缓存或构造分析表,
+    适合频繁启动的短命令行调用. 生成的模块的输入和文本格式的输出与 ll_parse / lr_parse 相同.
+
+    LL(1): 预测分析表内联为「非终结符 -> {终结符: 产生式右部的逆序元组}」的字典, 符号栈直接存储符号名,
+           栈顶符号没有对应的行即为终结符, 推导时用一次切片赋值把栈顶替换为产生式右部.
+    LR: ACTION 表内联为每个状态一个「终结符 -> 动作」的字典, 移进的动作为目标状态 (int),
+        规约的动作为 (左部符号, 右部长度) 元组, 接受的动作为 'accept'; GOTO 表同样按状态内联为字典.
+
+    生成的模块记录文法的摘要 GRAMMAR_DIGEST (与分析表缓存的键相同), 文法改变后可以用 is_current 检查是否需要重新生成.
+    生成的模块不支持出错恢复、语法树和统计信息, 需要这些功能时使用 ll_parse、lr_parse 或 Parser.
+
+接口:
+    generate_module: 生成指定分析法的语法分析器模块的源代码
+    write_module: 把生成的模块写入文件
+    is_current: 检查生成的模块是否与当前的文法一致
+
+命令行:
+    python3 -m cparser.codegen [-m 分析法] -o 输出文件
+"""
+import re
+import argparse
+from . import cache, ll_table, lr_table
+from .ll_parser import _trace_format as _ll_trace_format
+from .lr_parser import _trace_format as _lr_trace_format
+from .tokens import FilePath
+
+
+# 支持的分析法
+_methods = ('ll1',) + lr_table._methods
+
+# 分析法的名称
+_names = {'ll1': 'LL(1)', 'lr0': 'LR(0)', 'lalr1': 'LALR(1)', 'lr1': 'LR(1)'}
+
+
+# 生成的模块的公共部分, 其中 __NAME__ 等占位符在生成时替换
+_HEADER = '''"""
+__NAME__ 语法分析器
+
+由 cparser.codegen 根据 grammar.txt 自动生成, 请勿手工修改, 文法改变后需要重新生成.
+只依赖标准库, 分析表以字面量内联在模块中, 导入时不需要加载或构造分析表.
+输入与输出与 cparser.__DRIVER__ 相同, trace 可以是 'text' 或 None (不输出, 只检查语法错误).
+
+用法:
+    parse('demo_lexical', 'demo_grammar')
+
+命令行:
+    python3 模块文件 词法分析结果文件 分析序列输出文件
+"""
+import sys
+from collections import deque
+from itertools import chain
+from os import PathLike
+
+
+# 分析法
+METHOD = __METHOD__
+
+# 生成时的文法摘要, 与分析表缓存的键相同
+GRAMMAR_DIGEST = __DIGEST__
+
+# 分析序列的输出格式
+_trace_format = __FORMAT__
+
+# 缓冲区能够容纳的记录数
+_buffer_records = 1 << 14
+
+
+class _TraceWriter:
+    """分析序列输出器, 与 clexer.trace.TraceWriter 的文本格式相同, 只支持 'text' 和 None 两种模式"""
+    def __init__(self, output, mode):
+        if mode not in ('text', None):
+            raise ValueError("未知的输出模式 %s, 可选的模式为 'text' 或 None" % mode)
+        self._records = []
+        if mode is None:
+            self._file = None
+            self.write = deque(maxlen=0).append
+        else:
+            self._file = open(output, 'w')
+            self.write = self._records.append
+
+    def check(self):
+        """缓冲区满时整块写出"""
+        if len(self._records) >= _buffer_records:
+            self.flush()
+
+    def flush(self):
+        records = self._records
+        if records:
+            self._file.write((_trace_format * len(records)) % tuple(chain.from_iterable(records)))
+            records.clear()
+
+    def close(self):
+        if self._file is not None:
+            try:
+                self.flush()
+            finally:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _read_tokens(input):
+    """input 为文件路径时读取词法分析结果文件, 否则视为单词符号记录的可迭代对象"""
+    if not isinstance(input, (str, PathLike)):
+        return input
+    tokens = []
+    with open(input, 'r') as f:
+        for line in f:
+            token, tp = line.replace('\\n', '').split('\\t')
+            tokens.append((tp[1:-1], token))
+    return tokens
+
+
+def _input_symbols(tokens):
+    """将单词符号记录逐个转换为面临的输入符号, 最后生成文本结束符「#」"""
+    for token in tokens:
+        if token[0] in ('IDN', 'INT'):
+            yield token[0]
+        else:
+            yield token[1]
+    yield '#'
+
+
+def parse(input, output, trace='text'):
+    """
+    根据词法分析结果进行语法分析, 将分析序列写入 output,
+    词法分析结果可以是结果文件的路径, 也可以是单词符号记录的可迭代对象,
+    遇到语法错误时抛出 NotImplementedError
+    """
+    try:
+        istr = _input_symbols(_read_tokens(input))
+    except Exception as e:
+        print("语法分析错误:", e)
+        return
+    with _TraceWriter(output, trace) as writer:
+        _parse(istr, writer)
+'''
+
+_LL_DRIVER = '''
+
+# 文法开始符号
+_BEGIN = __BEGIN__
+
+# 预测分析表: 非终结符 -> {面临的输入符号: 产生式右部的逆序元组}
+_PREDICT = {
+__PREDICT__}
+
+
+def _parse(istr, writer):
+    """在输入符号流上运行 LL(1) 分析, 符号栈存储符号名, 没有对应预测分析表行的符号为终结符"""
+    write, check = writer.write, writer.check
+    predict = _PREDICT.get
+    stack = ['#', _BEGIN]
+    csymbol = next(istr)
+    shown = 'EOF' if csymbol == '#' else csymbol
+    while True:
+        top = stack[-1]
+        row = predict(top)
+        if row is None:
+            # 栈顶符号为终结符, 与面临的输入符号相同时跳过, 都是文本结束符时接受
+            if top == csymbol:
+                if csymbol == '#':
+                    write(('EOF', 'EOF', 'accept'))
+                    break
+                write((csymbol, csymbol, 'move'))
+                check()
+                stack.pop()
+                csymbol = next(istr)
+                shown = 'EOF' if csymbol == '#' else csymbol
+                continue
+        else:
+            # 栈顶符号为非终结符, 表项为产生式时推导
+            rhs = row.get(csymbol)
+            if rhs is not None:
+                write((top, shown, 'reduction'))
+                stack[-1:] = rhs
+                continue
+
+        write(('EOF' if top == '#' else top, shown, 'error'))
+        raise NotImplementedError("存在语法错误, 暂不支持自动恢复, 分析中止")
+'''
+
+_LR_DRIVER = '''
+
+# ACTION 表: 每个状态一个字典, 面临的输入符号 -> 移进的目标状态、(规约的左部符号, 右部长度) 或 'accept'
+_ACTION = (
+__ACTION__)
+
+# GOTO 表: 每个状态一个字典, 非终结符 -> 转移的目标状态
+_GOTO = (
+__GOTO__)
+
+
+def _parse(istr, writer):
+    """在输入符号流上运行 LR 分析, 符号栈存储符号名"""
+    write, check = writer.write, writer.check
+    action, goto = _ACTION, _GOTO
+    no = 0          # 序号
+    states = [0]    # 状态栈
+    symbols = []    # 符号栈
+    csymbol = next(istr)
+    shown = 'EOF' if csymbol == '#' else csymbol
+    while True:
+        no += 1
+        entry = action[states[-1]].get(csymbol)
+
+        # 表项为状态, 移进
+        if entry.__class__ is int:
+            write((no, symbols[-1] if symbols else 'EOF', csymbol, 'move'))
+            check()
+            states.append(entry)
+            symbols.append(csymbol)
+            csymbol = next(istr)
+            shown = 'EOF' if csymbol == '#' else csymbol
+            continue
+
+        # 表项为产生式, 规约
+        if entry.__class__ is tuple:
+            write((no, symbols[-1] if symbols else 'EOF', shown, 'reduction'))
+            left, rlen = entry
+            if rlen:
+                del symbols[-rlen:]
+                del states[-rlen:]
+            nstate = goto[states[-1]].get(left)
+            if nstate is not None:
+                symbols.append(left)
+                states.append(nstate)
+                continue
+
+        # 表项为「accept」, 接受输入符号串, 语法分析完成
+        elif entry == 'accept':
+            write((no, symbols[-1] if symbols else 'EOF', 'EOF', 'accept'))
+            break
+
+        # 表项为「error」或规约后无法转移, 发现语法错误
+        write((no, symbols[-1] if symbols else 'EOF', shown, 'error'))
+        raise NotImplementedError("存在语法错误, 暂不支持自动恢复, 分析中止")
+'''
+
+_MAIN = '''
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("用法: python3 %s 词法分析结果文件 分析序列输出文件" % sys.argv[0])
+        sys.exit(2)
+    try:
+        parse(sys.argv[1], sys.argv[2])
+    except NotImplementedError as e:
+        print("语法分析错误:", e)
+        sys.exit(1)
+'''
+
+
+def _check_method(method: str):
+    """检查分析法是否受支持"""
+    if method not in _methods:
+        raise ValueError("未知的分析法 %s, 可选的分析法为 %s" % (method, ', '.join(_methods)))
+
+
+def _ll_tables() -> dict:
+    """由编译后的预测分析表生成 LL(1) 驱动的占位符内容"""
+    table = ll_table.get_compiled_table()
+    names, nterminals = table.symbols, table.nterminals
+    rows = []
+    for row, left in enumerate(names[nterminals:]):
+        entries = {}
+        for column in range(nterminals):
+            pid = table.table[row * nterminals + column]
+            if pid >= 0:
+                entries[names[column]] = tuple(names[symbol] for symbol in table.rhs_reversed[pid])
+        rows.append('    %r: %r,\n' % (left, entries))
+    return {'__BEGIN__': repr(names[table.begin]), '__PREDICT__': ''.join(rows)}
+
+
+def _lr_tables(method: str) -> dict:
+    """由编译后的 LR 分析表生成 LR 驱动的占位符内容"""
+    table = lr_table.get_compiled_table(method)
+    names, nterminals = table.symbols, table.nterminals
+    nnonterminals = len(names) - nterminals
+    nstates = len(table.action) // nterminals
+    action_rows, goto_rows = [], []
+    for state in range(nstates):
+        actions = {}
+        for column in range(nterminals):
+            entry = table.action[state * nterminals + column]
+            kind = entry & 3
+            if kind == lr_table._SHIFT:
+                actions[names[column]] = entry >> 2
+            elif kind == lr_table._REDUCE:
+                pid = entry >> 2
+                actions[names[column]] = (names[table.lhs[pid]], table.rhs_len[pid])
+            elif kind == lr_table._ACCEPT:
+                actions[names[column]] = 'accept'
+        gotos = {}
+        for column in range(nnonterminals):
+            target = table.goto[state * nnonterminals + column]
+            if target >= 0:
+                gotos[names[nterminals + column]] = target
+        action_rows.append('    %r,  # %d\n' % (actions, state))
+        goto_rows.append('    %r,  # %d\n' % (gotos, state))
+    return {'__ACTION__': ''.join(action_rows), '__GOTO__': ''.join(goto_rows)}
+
+
+def generate_module(method: str = 'll1') -> str:
+    """生成 method 分析法 ('ll1'、'lr0'、'lalr1' 或 'lr1') 的独立语法分析器模块的源代码"""
+    _check_method(method)
+    if method == 'll1':
+        driver, replacements = _LL_DRIVER, _ll_tables()
+        replacements.update({'__DRIVER__': 'll_parse', '__FORMAT__': repr(_ll_trace_format)})
+    else:
+        driver, replacements = _LR_DRIVER, _lr_tables(method)
+        replacements.update({'__DRIVER__': 'lr_parse', '__FORMAT__': repr(_lr_trace_format)})
+    replacements.update({'__NAME__': _names[method], '__METHOD__': repr(method),
+                         '__DIGEST__': repr(cache.cache_key(method))})
+
+    source = _HEADER + driver + _MAIN
+    for placeholder, value in replacements.items():
+        source = source.replace(placeholder, value)
+    return source
+
+
+def write_module(path: FilePath, method: str = 'll1'):
+    """把 method 分析法的独立语法分析器模块写入文件 path"""
+    source = generate_module(method)
+    with open(path, 'w') as f:
+        f.write(source)
+
+
+def is_current(path: FilePath) -> bool:
+    """检查生成的模块 path 记录的文法摘要是否与当前的文法一致, 不一致时需要重新生成"""
+    with open(path, 'r') as f:
+        source = f.read()
+    method = re.search(r"^METHOD = '(\w+)'$", source, re.MULTILINE)
+    digest = re.search(r"^GRAMMAR_DIGEST = '(\w+)'$", source, re.MULTILINE)
+    if method is None or digest is None or method.group(1) not in _methods:
+        return False
+    return digest.group(1) == cache.cache_key(method.group(1))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="生成独立的 C-- 语法分析器模块")
+    arg_parser.add_argument('-m', '--method', default='ll1', help="分析法: ll1, lr0, lalr1 或 lr1")
+    arg_parser.add_argument('-o', '--output', required=True, help="输出的模块文件")
+    args = arg_parser.parse_args()
+    write_module(args.output, args.method)
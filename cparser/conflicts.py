@@ -0,0 +1,191 @@
+"""
+文法冲突分析模块
+
+功能:
+    ll_table 和 lr_table 构造分析表时, 同一表项被多个产生式或项目填写 (即存在冲突) 时后写入的覆盖先写入的,
+    不给出任何提示. 本模块直接由文法分析的结果和 LR 项目集族构造一次分析表 (不经过 DataFrame 和分析表缓存),
+    报告每一个冲突的表项、竞争的动作以及分析表实际保留的动作;
+    LR 冲突还给出到达冲突状态的一个最短文法符号前缀, 由项目集族的转换图上从初始状态出发的广度优先搜索得到.
+
+    动作以字符串表示: LL(1) 为产生式「A -> α」, 空产生式的右部写作「$」;
+    LR 为「shift 目标状态」、「reduce A -> α」或「accept」.
+
+接口:
+    ll_conflicts: LL(1) 预测分析表中的冲突
+    lr_conflicts: 指定 LR 分析法的分析表中的冲突
+    find_conflicts: 依次分析多种分析法, 返回所有冲突
+    format_conflict: 把一个冲突格式化为便于阅读的多行文本
+
+命令行:
+    python3 -m cparser.conflicts [-m 分析法] 存在冲突时以状态码 1 退出
+"""
+import sys
+import argparse
+from collections import namedtuple, deque
+from .grammar import get_grammar_begin, get_productions
+from .util import get_grammar, get_follow_sets, first_of_sequence, _terminal
+from .lr_table import _methods, _check_method, _table_symbols, _canonical_collection, _lalr_collection, _item_scope
+
+
+# 一个冲突:
+#   method: 分析法, 'll1'、'lr0'、'lalr1' 或 'lr1'
+#   state: LL(1) 为表项所在行的非终结符, LR 为状态编号
+#   symbol: 表项所在列的终结符
+#   kind: 冲突类型, LL(1) 为 'FIRST/FIRST' 或 'FIRST/FOLLOW', LR 为 'shift/reduce'、'reduce/reduce' 等
+#   actions: 竞争的动作, 按构造分析表时写入的顺序排列
+#   chosen: 分析表实际保留的动作, 即最后写入的动作
+#   prefix: LR 为到达该状态的最短文法符号前缀, LL(1) 为 None
+Conflict = namedtuple('Conflict', ['method', 'state', 'symbol', 'kind', 'actions', 'chosen', 'prefix'])
+
+# 分析法的名称
+_names = {'ll1': 'LL(1)', 'lr0': 'LR(0)', 'lalr1': 'LALR(1)', 'lr1': 'LR(1)'}
+
+
+def _production_text(production: int) -> str:
+    left, right = get_productions()[production]
+    return '%s -> %s' % (left, ' '.join(right) if right else '$')
+
+
+def ll_conflicts() -> list:
+    """
+    LL(1) 预测分析表中的冲突, 表项的填写顺序与 ll_table._generate_table 相同:
+    产生式「A -> α」填入 FIRST(α) 中的每个终结符, α 可空时还填入 FOLLOW(A) 中的每个终结符.
+    FOLLOW(A) 取真正的 FOLLOW 集合, 即按 LL(1) 文法的定义判断冲突,
+    而不是构造分析表使用的更大的集合 (见 util.get_table_follow_sets)
+    """
+    follow_sets = get_follow_sets()
+    # 每个表项依次写入的 (产生式编号, 是否经由 FOLLOW 集合写入)
+    cells = {}
+    for idx, (left, right) in enumerate(get_productions()):
+        for asymbol in first_of_sequence(right):
+            if asymbol == '$':
+                for bsymbol in follow_sets[left]:
+                    cells.setdefault((left, bsymbol), []).append((idx, True))
+            else:
+                cells.setdefault((left, asymbol), []).append((idx, False))
+
+    conflicts = []
+    order = {symbol: idx for idx, symbol in enumerate(_terminal)}
+    nonterminals = {left: idx for idx, left in enumerate(get_grammar())}
+    for (left, symbol), entries in sorted(cells.items(), key=lambda cell: (nonterminals[cell[0][0]],
+                                                                           order.get(cell[0][1], len(order)))):
+        if len(entries) < 2:
+            continue
+        actions = tuple(_production_text(idx) for idx, _ in entries)
+        kind = 'FIRST/FOLLOW' if any(via_follow for _, via_follow in entries) else 'FIRST/FIRST'
+        conflicts.append(Conflict('ll1', left, symbol, kind, actions, actions[-1], None))
+    return conflicts
+
+
+def _shortest_prefixes(goto: list) -> list:
+    """在项目集族的转换图上从初始状态出发广度优先搜索, 返回到达每个状态的最短文法符号前缀"""
+    parents = [None] * len(goto)
+    parents[0] = (-1, None)
+    queue = deque([0])
+    while queue:
+        state = queue.popleft()
+        for symbol, target in goto[state].items():
+            if parents[target] is None:
+                parents[target] = (state, symbol)
+                queue.append(target)
+
+    prefixes = [()] * len(goto)
+    for state in range(len(goto)):
+        symbols = []
+        current = state
+        while current > 0:
+            current, symbol = parents[current]
+            symbols.append(symbol)
+        prefixes[state] = tuple(reversed(symbols))
+    return prefixes
+
+
+def lr_conflicts(method: str = 'lr0') -> list:
+    """
+    指定 LR 分析法的分析表中的冲突, method 可以是 'lr0'、'lalr1' 或 'lr1',
+    表项的填写顺序与 lr_table._generate_table 相同, 即按项目在项目集中的顺序
+    """
+    _check_method(method)
+    grammar_begin = get_grammar_begin()
+    productions = get_productions()
+    table_symbols = _table_symbols()
+    reduce_symbols = [symbol for symbol in table_symbols if symbol in _terminal]
+    order = {symbol: idx for idx, symbol in enumerate(table_symbols)}
+
+    with _item_scope():
+        if method == 'lalr1':
+            collection, goto = _lalr_collection()
+        else:
+            collection, goto = _canonical_collection(lookahead=(method == 'lr1'))
+    prefixes = None
+
+    conflicts = []
+    for state, items in enumerate(collection):
+        # 每个终结符对应的表项依次写入的不同动作 (动作字符串到动作类型的映射) 和最后写入的动作
+        cells = {}
+        chosen = {}
+        for production, dot, lookahead in items:
+            left, right = productions[production]
+            if dot < len(right):
+                if right[dot] not in _terminal:
+                    continue
+                action, kind, symbols = 'shift %d' % goto[state][right[dot]], 'shift', (right[dot],)
+            elif left == grammar_begin:
+                action, kind, symbols = 'accept', 'accept', ('#',)
+            else:
+                action, kind = 'reduce ' + _production_text(production), 'reduce'
+                symbols = (lookahead,) if lookahead else reduce_symbols
+            for symbol in symbols:
+                cells.setdefault(symbol, {})[action] = kind
+                chosen[symbol] = action
+
+        for symbol in sorted(cells, key=order.__getitem__):
+            entries = cells[symbol]
+            if len(entries) < 2:
+                continue
+            kinds = sorted(set(entries.values()), reverse=True)
+            kind = '/'.join(kinds if len(kinds) > 1 else kinds * 2)
+            if prefixes is None:
+                prefixes = _shortest_prefixes(goto)
+            conflicts.append(Conflict(method, state, symbol, kind, tuple(entries), chosen[symbol], prefixes[state]))
+    return conflicts
+
+
+def find_conflicts(methods: tuple = ('ll1',) + _methods) -> list:
+    """依次分析 methods 中的每种分析法 ('ll1' 或 LR 分析法), 返回所有冲突的列表"""
+    conflicts = []
+    for method in methods:
+        conflicts += ll_conflicts() if method == 'll1' else lr_conflicts(method)
+    return conflicts
+
+
+def format_conflict(conflict: Conflict) -> str:
+    """把一个冲突格式化为多行文本"""
+    if conflict.method == 'll1':
+        lines = ['%s 表项 [%s, %s]: %s 冲突' % (_names['ll1'], conflict.state, conflict.symbol, conflict.kind)]
+    else:
+        lines = ['%s 状态 %d 面临 %s: %s 冲突' % (_names[conflict.method], conflict.state, conflict.symbol,
+                                              conflict.kind)]
+    for action in conflict.actions:
+        lines.append('    %s%s' % (action, ' (分析表保留)' if action == conflict.chosen else ''))
+    if conflict.prefix is not None:
+        lines.append('    最短前缀: %s' % (' '.join(conflict.prefix) if conflict.prefix else '(空)'))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="报告 LL(1) 和 LR 分析表中的冲突")
+    arg_parser.add_argument('-m', '--methods', default=','.join(('ll1',) + _methods),
+                            help="分析的分析法, 以逗号分隔")
+    args = arg_parser.parse_args()
+
+    methods = tuple(method for method in args.methods.split(',') if method)
+    for method in methods:
+        if method != 'll1':
+            _check_method(method)
+    found = find_conflicts(methods)
+    for conflict in found:
+        print(format_conflict(conflict))
+    for method in methods:
+        print('%s: %d 个冲突' % (_names[method], sum(1 for conflict in found if conflict.method == method)))
+    sys.exit(1 if found else 0)
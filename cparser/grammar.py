@@ -14,24 +14,29 @@ _grammar_dict = {}
 # 拓广文法的开始符号
 _grammar_begin = ''
 
+# 产生式列表
+_productions = []
+
 def _load_grammar():
     """从文法文件 grammar.txt 中加载文法产生式, 生成文法产生式字典"""
     grammar_path = os.path.join(os.path.dirname(__file__), 'grammar.txt')
 
     # 读取文法文件 grammer.txt
+    grammar_dict = {}
     with open(grammar_path, 'r') as f:
         lines = f.readlines()
         for line in lines:
             symbols = line.split()
             symbols.remove('->')
-            if lines.index(line) == 0:
-                global _grammar_begin
-                _grammar_begin = symbols[0]
-            global _grammar_dict
-            if symbols[0] in _grammar_dict:
-                _grammar_dict[symbols[0]].append([symbol for symbol in symbols[1:]])
+            if symbols[0] in grammar_dict:
+                grammar_dict[symbols[0]].append([symbol for symbol in symbols[1:]])
             else:
-                _grammar_dict[symbols[0]] = [[symbol for symbol in symbols[1:]]]
+                grammar_dict[symbols[0]] = [[symbol for symbol in symbols[1:]]]
+
+    # 文法加载完成后才发布, 其它线程不会看到加载到一半的文法
+    global _grammar_begin, _grammar_dict
+    _grammar_begin = lines[0].split()[0]
+    _grammar_dict = grammar_dict
 
 
 def get_grammar():
@@ -41,6 +46,18 @@ def get_grammar():
     return _grammar_dict
 
 
+def get_productions():
+    """
+    访问按文法文件中的顺序编号的产生式列表,
+    每个产生式为 (左部符号, 右部符号列表) 二元组, 空产生式的右部为空列表
+    """
+    global _productions
+    if not _productions:
+        _productions = [(left, [] if symbols == ['$'] else symbols)
+                        for left, right in get_grammar().items() for symbols in right]
+    return _productions
+
+
 def get_grammar_begin():
     """获取文法的开始符号"""
     if not _grammar_begin:
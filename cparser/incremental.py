@@ -0,0 +1,165 @@
+"""
+增量语法分析模块
+
+功能:
+    在输入符号序列被编辑后重新进行 LL(1) 分析, 只重新分析受影响的部分.
+
+    LL(1) 分析器的状态完全由符号栈决定. 分析时每读入 interval 个输入符号保存一个检查点,
+    记录读入该输入符号之前的符号栈, 分析序列按检查点分段存储.
+    编辑后从编辑位置之前最近的检查点恢复符号栈, 重新分析;
+    越过编辑区域后, 每到达一个原检查点的位置就比较符号栈, 若与原分析在该位置的符号栈相同,
+    则之后的分析过程与原分析完全相同, 直接复用原分析序列在该检查点之后的各段, 分析即可停止.
+
+    与增量词法分析相同, 输入符号序列、检查点及其符号栈和分析序列的各段都存储在间隙缓冲区中 (见 clexer.gapbuffer):
+    检查点的位置在间隙之前为输入符号的绝对序号, 在间隙之后为到输入符号序列末尾的距离, 复用的检查点不需要逐个调整,
+    编辑只在间隙处删除和插入元素, 工作量与输入符号序列的长度无关.
+"""
+from itertools import chain
+from .ll_table import LLTable, get_compiled_table
+from .tokens import FilePath, input_symbols
+from .ll_parser import _trace_format, _trace_magic, _drive
+from clexer.trace import TraceWriter
+from clexer.gapbuffer import GapBuffer, OffsetBuffer
+
+
+class IncrementalParser:
+    """
+    增量 LL(1) 语法分析器
+    ------------------
+    输入:
+      parsing_table: 编译后的预测分析表, 默认使用 get_compiled_table 返回的分析表 (可选)
+      interval: 相邻两个检查点之间的输入符号个数 (可选)
+
+    属性:
+      symbols: 输入符号序列, 不含文本结束符「#」, 以 GapBuffer 存储
+      error: 发现语法错误时面临的输入符号的序号, 接受输入符号串时为 None
+
+    用法:
+      lexer = clexer.IncrementalLexer(source)
+      parser = IncrementalParser()
+      parser.parse(lexer.tokens())
+      parser.update(*lexer.edit(offset, removed, inserted))
+    """
+    def __init__(self, parsing_table: LLTable = None, interval: int = 64):
+        self.table = parsing_table if parsing_table is not None else get_compiled_table()
+        self.interval = interval
+        self.symbols = GapBuffer()
+        self.error = None
+        self._positions = OffsetBuffer()    # 检查点的位置, 即读入的下一个输入符号的序号
+        self._stacks = GapBuffer()          # 检查点的符号栈
+        self._segments = GapBuffer()        # 分析序列, 第 k 段为从第 k 个检查点到下一个检查点之间的记录
+
+
+    @property
+    def records(self) -> list:
+        """分析序列, 每条记录为「(栈顶符号, 面临的输入符号, 执行动作)」, 与 ll_parse 的输出一致"""
+        return list(chain.from_iterable(self._segments))
+
+
+    def parse(self, tokens):
+        """对单词符号记录的序列进行完整的分析"""
+        self.symbols = GapBuffer(list(input_symbols(tokens))[:-1])
+        self._positions = OffsetBuffer([0])
+        self._stacks = GapBuffer([(self.table.eof, self.table.begin)])
+        self._segments = GapBuffer([[]])
+        self._move_gap(0)
+        # 首次分析没有可以复用的原检查点, 第 old 个原检查点取检查点的个数, 即不尝试重新同步
+        self._run(0, len(self._positions))
+
+
+    def update(self, first: int, removed: int, tokens):
+        """
+        从第 first 个单词符号开始的 removed 个单词符号被替换为 tokens 后, 增量地重新分析,
+        参数与 clexer.incremental.TokenEdit 的字段一致
+        """
+        # 从位置不超过 first 的最后一个检查点恢复, 该检查点之前的输入符号都未被修改
+        length = len(self.symbols)
+        idx = self._find(first)
+        self._move_gap(idx)
+
+        # 编辑区域之后的第一个原检查点, 从它开始可以尝试重新同步
+        old = max(self._positions.bisect_left(first + removed, length), idx + 1)
+
+        inserted = list(input_symbols(tokens))[:-1]
+        self.symbols.move_gap(first)
+        self.symbols.replace(removed, inserted)
+        self._run(idx, old, len(inserted) - removed)
+
+
+    def _find(self, position: int) -> int:
+        """位置不超过 position 的最后一个检查点的下标"""
+        return self._positions.bisect_right(position, len(self.symbols)) - 1
+
+
+    def _move_gap(self, idx: int):
+        """把间隙移动到第 idx 个检查点之后, 即第 idx 段分析序列之前"""
+        self._positions.move_gap(idx + 1, len(self.symbols))
+        self._stacks.move_gap(idx + 1)
+        self._segments.move_gap(idx)
+
+
+    def _run(self, idx: int, old: int, delta: int = 0):
+        """
+        从第 idx 个检查点 (紧邻间隙之前) 开始分析, 尝试与第 old 个及其后的原检查点 (都位于编辑区域之后) 重新同步,
+        delta 为编辑引起的输入符号个数的变化.
+        分析由 ll_parser._drive 完成, 每读入一个输入符号回调一次 check, 由它保存新的检查点并判断是否已经重新同步
+        """
+        interval = self.interval
+        positions, stacks = self._positions, self._stacks
+        length = len(self.symbols)
+        count = len(positions)
+        # 第 old 个原检查点的位置, 位于编辑区域之后; 没有可以重新同步的原检查点时大于任何位置
+        resync = positions.get(old, length) if old < count else length + 1
+
+        position = positions.get(idx, length)
+        stack = list(stacks[idx])
+        records = []                        # 重新分析得到的分析序列
+        bounds = [0]                        # 每个新检查点在 records 中的起始下标
+        new_positions = []                  # 新检查点的位置
+        new_stacks = []
+        last = position                     # 最近一个检查点的位置
+
+        def check():
+            nonlocal position, resync, old, last
+            position += 1
+            if position >= resync:
+                # 越过编辑区域后, 到达原检查点的位置时比较符号栈, 相同则重新同步
+                while resync < position:
+                    old += 1
+                    resync = positions.get(old, length) if old < count else length + 1
+                if resync == position and stacks[old] == tuple(stack):
+                    return True
+            if position - last >= interval:
+                bounds.append(len(records))
+                new_positions.append(position)
+                new_stacks.append(tuple(stack))
+                last = position
+            return False
+
+        istr = chain(self.symbols.iter_from(position), ('#',))
+        try:
+            synced = _drive(istr, stack, records.append, check, self.table, position=position)
+        except NotImplementedError:
+            # 发现语法错误, 分析中止
+            self.error = position
+            old = count
+        else:
+            if synced:
+                if self.error is not None:
+                    self.error += delta
+            else:
+                self.error = None
+                old = count
+
+        # 用重新分析得到的检查点和分析序列替换第 idx 个检查点到第 old 个原检查点之间的部分
+        bounds.append(len(records))
+        new_segments = [records[bounds[k]:bounds[k + 1]] for k in range(len(bounds) - 1)]
+        self._segments.replace(old - idx, new_segments)
+        stacks.replace(old - idx - 1, new_stacks)
+        positions.replace(old - idx - 1, new_positions)
+
+
+    def write(self, output: FilePath, trace: str = 'text'):
+        """将分析序列写入 output, 格式与 ll_parse 的输出相同"""
+        with TraceWriter(output, _trace_format, trace, _trace_magic) as writer:
+            writer.write_all(chain.from_iterable(self._segments))
@@ -1,82 +1,212 @@
-from .ll_table import get_table
-from .grammar import get_grammar_begin, derivate
-from typing import Union
-from os import PathLike
+from collections import Counter, namedtuple
+from .ll_table import LLTable, get_compiled_table
+from .tokens import FilePath, read_tokens, input_symbols
+from .tree import SyntaxTree
+from clexer.trace import TraceWriter
+from clexer.stats import Stats, PeakStack, phase
+from typing import Iterable, Union
 
+# 分析序列的输出格式: [栈顶符号]#[面临的输入符号][TAB][执行动作]
+_trace_format = "%s#%s\t%s\n"
 
-FilePath = Union[str, "PathLike[str]"]
+# 二进制格式的分析序列的魔数
+_trace_magic = b'CLLT'
 
-def _log(no, csymbol, nsymbol, action):
-    """记录语法分析器的一次行为"""
-    _fout.write("%s#%s\t%s\n" % (csymbol, nsymbol, action))
+# 出错恢复模式下记录的语法错误:
+#   position: 发现错误时面临的输入符号的序号 (从 0 开始)
+#   token: 对应的单词符号记录, 面临文本结束符时为 None
+#   expected: 栈顶符号
+#   found: 面临的输入符号
+ParseError = namedtuple('ParseError', ['position', 'token', 'expected', 'found'])
 
 
-def parse(input: FilePath, output: FilePath):
+def parse(input: Union[FilePath, Iterable], output: FilePath, parsing_table: LLTable = None,
+          trace: str = 'text', tree: bool = False, errors: list = None, max_errors: int = 100,
+          stats: Stats = None):
     """
     LL 语法分析器:
         根据词法分析结果进行语法分析, 
-        通过查找预测分析表, 生成最右推导序列
+        词法分析结果可以是结果文件的路径, 也可以是单词符号记录的可迭代对象, 
+        通过查找预测分析表, 生成最右推导序列,
+        parsing_table 为编译后的预测分析表, 默认使用 get_compiled_table 返回的分析表,
+        trace 为输出模式: 'text' 为文本格式, 'binary' 为二进制格式 (记录为「(栈顶符号, 输入符号, 动作)」),
+        None 为不输出, 只检查语法错误,
+        tree 为 True 时在推导的同时自顶向下构造具体语法树并返回, 否则返回 None.
+        errors 为 None 时遇到语法错误即中止分析并抛出 NotImplementedError,
+        为列表时进入出错恢复模式, 发现的每个语法错误以 ParseError 追加到 errors 中 (不打印, 由调用者用 _describe 格式化),
+        错误数达到 max_errors 时中止分析,
+        stats 不为 None 时把各阶段的耗时、分析步数等计数以及分析表的来源记录到 stats 中.
+        分析过程中的状态都保存在局部变量中, 可以在多个线程中同时调用
     """
-    istr = []
-    # 读取词法分析结果, 
-    # 将单词符号及其类别以二元组的方式存储到输入串列表 istr 中
+    if errors is not None and max_errors < 1:
+        raise ValueError("错误数上限 max_errors 必须为正整数, 而不是 %r" % max_errors)
+
+    actions = Counter() if stats is not None else None
     try:
-        with open(input, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                istr.append(tuple(line.replace('\n', '').split('\t')))
-    except Exception as e:
-        print("语法分析错误:", e)
-        return
-    
-    # 打开输出的目标文件
-    global _fout
-    _fout = open(output, 'w')
-
-    istr.append(('#', '<EOF>'))
-    parsing_table = get_table()
-
-    no = 0                               # 序号
-    stack = ['#', get_grammar_begin()]  # 符号栈
+        # 读取词法分析结果, 逐个取出面临的输入符号
+        with phase(stats, 'read'):
+            try:
+                tokens = read_tokens(input)
+            except Exception as e:
+                print("语法分析错误:", e)
+                return
+
+        # 出错恢复模式下记住面临的输入符号对应的单词符号记录, 用于报告错误位置
+        current = [None]
+        if errors is not None:
+            tokens = _tracked(tokens, current)
+        istr = input_symbols(tokens)
+
+        with phase(stats, 'table'):
+            if parsing_table is None:
+                parsing_table = get_compiled_table(stats)
+        syntax_tree = SyntaxTree(parsing_table.symbols) if tree else None
+        with TraceWriter(output, _trace_format, trace, _trace_magic, actions=actions) as writer, \
+                phase(stats, 'parse'):
+            _parse(istr, writer, parsing_table, syntax_tree, errors, max_errors, current, stats)
+        return syntax_tree
+    finally:
+        if stats is not None:
+            stats.add_actions(actions, actions['reduction'] + actions['error'])
+            stats.finish()
+
+
+def _tracked(tokens, current: list):
+    """逐个生成单词符号记录, 同时把最近生成的记录保存在 current[0] 中, 生成完毕后置为 None"""
+    for token in tokens:
+        current[0] = token
+        yield token
+    current[0] = None
+
+
+def _describe(error: ParseError) -> str:
+    """语法错误的文字描述, 单词符号从 1 开始计数 (ParseError.position 从 0 开始)"""
+    token = error.token
+    if token is None:
+        where = "文本末尾"
+    elif len(token) >= 4:
+        where = "第 %d 个单词符号 %r (%d 行 %d 列)" % (error.position + 1, token[1], token[2], token[3])
+    else:
+        where = "第 %d 个单词符号 %r" % (error.position + 1, token[1])
+    return "语法分析错误: %s处期望 %s, 遇到 %s" % (where, error.expected, error.found)
+
+
+def _accepts(parsing_table: LLTable, symbol: int, cid: int) -> bool:
+    """栈中的符号 symbol 能否接受输入符号 cid: 两者相同, 或 symbol 为非终结符且预测分析表中有对应的产生式"""
+    nterminals = parsing_table.nterminals
+    if symbol == cid:
+        return True
+    return symbol >= nterminals and 0 <= cid < nterminals and \
+        parsing_table.table[(symbol - nterminals) * nterminals + cid] >= 0
+
+
+def _parse(istr, writer, parsing_table, tree, errors=None, max_errors=0, current=None, stats=None):
+    """
+    在输入符号流上从头运行 LL(1) 分析, 逐条记录分析序列, 每读入一个输入符号检查一次输出缓冲区,
+    tree 不为 None 时同时构造具体语法树, 其余参数见 _drive.
+    stats 不为 None 时, 符号栈换成记录最大深度的 PeakStack (执行动作由 writer 计数)
+    """
+    stack = [parsing_table.eof, parsing_table.begin]
+    if stats is not None:
+        stack = PeakStack(stack, stats)
+    nodes = None
+    if tree is not None:
+        tree.root = tree.add_node(parsing_table.begin)
+        nodes = [-1, tree.root]
+    _drive(istr, stack, writer.write, writer.check, parsing_table, tree, nodes, errors, max_errors, current)
 
+
+def _drive(istr, stack, write, check, parsing_table, tree=None, nodes=None, errors=None, max_errors=0,
+           current=None, position: int = 0) -> bool:
+    """
+    可恢复的 LL(1) 驱动循环:
+        以符号栈 stack (存储符号编号, 就地修改) 从第 position 个输入符号开始分析, istr 从该输入符号开始逐个生成输入符号,
+        每条分析记录以 write 写出. 每匹配或删除一个输入符号, 弹出栈顶符号之后、读入下一个输入符号之前调用一次 check,
+        check 返回真值时暂停分析并返回 True, 此时 stack 为分析到该位置的符号栈, 可以保存下来在之后恢复分析;
+        接受输入符号串或错误数达到上限时返回 False.
+        tree 不为 None 时, 推导时为栈顶符号的结点添加子结点, 跳过终结符时记录叶结点对应的单词符号序号,
+        nodes 为与符号栈平行的结点栈.
+
+    errors 为 None 时遇到语法错误即写出「error」记录并抛出 NotImplementedError;
+    不为 None 时以恐慌模式 (panic mode) 从语法错误中恢复, 以 FOLLOW 集合为同步符号集合:
+        栈顶为非终结符 A 且面临的输入符号属于 FOLLOW(A) 或为文本结束符时, 弹出 A, 视为 A 已分析完毕;
+        否则若栈中更深处有符号能够接受面临的输入符号, 弹出栈顶符号, 视为在输入中插入了栈顶符号所缺的部分;
+        否则删除面临的输入符号.
+    恢复动作分别记录为「pop 弹出」和「skip 删除」. 恢复后至少匹配一个输入符号才报告下一个错误,
+    以免一处错误引起的连锁错误被重复报告. 恢复只发生在出错的分支中, 不影响正常分析的速度.
+    """
+    symbols, symbol_ids = parsing_table.symbols, parsing_table.symbol_ids
+    nterminals, eof = parsing_table.nterminals, parsing_table.eof
+    table, rhs_reversed = parsing_table.table, parsing_table.rhs_reversed
+    quiet = -1                              # 最近一次恢复动作后面临的输入符号的序号, 在此之前不报告新的错误
+
+    csymbol = next(istr)
+    cid = symbol_ids.get(csymbol, -1)
     while True:
-        if istr[0][1] == '<IDN>':
-            csymbol = 'IDN'
-        elif istr[0][1] == '<INT>':
-            csymbol = 'INT'
-        else:
-            csymbol = istr[0][0]
-        no += 1
+        top = stack[-1]
 
         # 栈顶符号与面临的输入符号相同
-        if stack[-1] == csymbol:
+        if top == cid:
             # 栈顶符号和面临的输入符号都是文本终结符, 接受输入符号串, 语法分析完成
-            if csymbol == '#':
-                _log(no, 'EOF', 'EOF', 'accept')
-                break
+            if cid == eof:
+                write(('EOF', 'EOF', 'accept'))
+                return False
 
             # 栈顶符号和面临的输入符号都是某个终结符, 跳过
             else:
-                _log(no, stack[-1], csymbol, 'move')
+                write((csymbol, csymbol, 'move'))
                 stack.pop()
-                istr.pop(0)
+                if tree is not None:
+                    tree.token[nodes.pop()] = position
+                position += 1
+                if check():
+                    return True
+                csymbol = next(istr)
+                cid = symbol_ids.get(csymbol, -1)
+            continue
 
         # 栈顶符号为非终结符, 查看预测分析表
+        if top >= nterminals and 0 <= cid < nterminals:
+            pid = table[(top - nterminals) * nterminals + cid]
         else:
-            # 表项为产生式, 推导
-            if isinstance(parsing_table[csymbol][stack[-1]], tuple):
-                _log(no, stack[-1], 'EOF' if csymbol == '#' else csymbol, 'reduction')
-                production = parsing_table[csymbol][stack[-1]]
-                nsymbols = derivate(stack.pop(), production)
-                nsymbols.reverse()
-                stack += nsymbols
-
-            # 表项为「error」, 发现语法错误
-            elif parsing_table[csymbol][stack[-1]] == 'error':
-                _log(no, 'EOF' if stack[-1] == '#' else stack[-1],
-                     'EOF' if csymbol == '#' else csymbol, 'error')
-                _fout.close()
+            pid = -1
+
+        # 表项为产生式, 推导
+        if pid >= 0:
+            write((symbols[top], 'EOF' if cid == eof else csymbol, 'reduction'))
+            stack.pop()
+            stack += rhs_reversed[pid]
+            if tree is not None:
+                nodes += tree.add_children(nodes.pop(), rhs_reversed[pid])
+
+        # 表项为「error」或栈顶终结符与输入符号不匹配, 发现语法错误
+        else:
+            expected = 'EOF' if top == eof else symbols[top]
+            found = 'EOF' if cid == eof else csymbol
+            if errors is None:
+                write((expected, found, 'error'))
                 raise NotImplementedError("存在语法错误, 暂不支持自动恢复, 分析中止")
-            
-    # 关闭输出的目标文件
-    _fout.close()
+
+            if position > quiet:
+                write((expected, found, 'error'))
+                error = ParseError(position, current[0] if cid != eof else None, expected, found)
+                errors.append(error)
+                if len(errors) >= max_errors:
+                    return False
+
+            if ((top >= nterminals and (cid == eof or cid in parsing_table.sync_sets()[top - nterminals]))
+                    or any(_accepts(parsing_table, symbol, cid) for symbol in stack[-2::-1])):
+                # 弹出栈顶符号
+                write((expected, found, 'pop'))
+                stack.pop()
+                if tree is not None:
+                    nodes.pop()
+            else:
+                # 删除面临的输入符号
+                write((expected, found, 'skip'))
+                position += 1
+                if check():
+                    return True
+                csymbol = next(istr)
+                cid = symbol_ids.get(csymbol, -1)
+            quiet = position
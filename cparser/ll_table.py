@@ -6,12 +6,92 @@
     
 """
 import pandas as pd
-from .util import get_grammar, get_all_symbols, first, follow, _terminal
+from array import array
+from . import cache
+from clexer.stats import Stats
+from .grammar import get_grammar_begin, get_productions
+from .util import get_grammar, get_all_symbols, first_of_sequence, get_follow_sets, get_table_follow_sets, _terminal
 
 
 # 预测分析表
 _parsing_table = pd.DataFrame()
 
+# 编译后的预测分析表
+_compiled_table = None
+
+
+class LLTable:
+    """
+    编译后的 LL(1) 预测分析表, 所有符号都被编码为小整数, 由以下属性构成
+        symbols: 符号列表, 符号在列表中的下标即为其编号, 终结符在前, 非终结符在后
+        symbol_ids: 符号到编号的映射
+        nterminals: 终结符的个数, 编号小于该值的符号为终结符
+        eof: 文本结束符「#」的编号
+        begin: 文法开始符号的编号
+        table: 扁平的 array('i'), 下标为「(非终结符编号 - nterminals) × nterminals + 终结符编号」, 
+               值为产生式编号, 表项为「error」时为 -1
+        rhs_reversed: 每个产生式右部符号编号的逆序元组, 推导时直接压入符号栈
+    出错恢复用的同步符号集合由 sync_sets 在首次访问时计算
+    """
+    def __init__(self, symbols: list, nterminals: int, table: array, rhs_reversed: list):
+        self.symbols = symbols
+        self.symbol_ids = {symbol: idx for idx, symbol in enumerate(symbols)}
+        self.nterminals = nterminals
+        self.eof = self.symbol_ids['#']
+        self.begin = self.symbol_ids[get_grammar_begin()]
+        self.table = table
+        self.rhs_reversed = rhs_reversed
+        self._sync_sets = None
+
+    def sync_sets(self) -> list:
+        """
+        出错恢复用的同步符号集合, 下标为「非终结符编号 - nterminals」,
+        值为该非终结符的 FOLLOW 集合中终结符编号的 frozenset
+        """
+        if self._sync_sets is None:
+            follow_sets = get_follow_sets()
+            self._sync_sets = [frozenset(self.symbol_ids[symbol] for symbol in follow_sets.get(left, ())
+                                         if symbol in self.symbol_ids)
+                               for left in self.symbols[self.nterminals:]]
+        return self._sync_sets
+
+    @classmethod
+    def from_dataframe(cls, parsing_table: pd.DataFrame):
+        """由 DataFrame 形式的预测分析表编译"""
+        productions = get_productions()
+        production_ids = {(left, tuple(right)): idx for idx, (left, right) in enumerate(productions)}
+
+        terminals = list(parsing_table.columns)
+        nonterminals = list(parsing_table.index)
+        symbol_ids = {symbol: idx for idx, symbol in enumerate(terminals + nonterminals)}
+
+        table = array('i', [-1] * (len(nonterminals) * len(terminals)))
+        for row, left in enumerate(nonterminals):
+            for column, terminal in enumerate(terminals):
+                production = parsing_table[terminal][left]
+                if isinstance(production, tuple):
+                    table[row * len(terminals) + column] = production_ids[(production[0], tuple(production[1]))]
+
+        rhs_reversed = [tuple(symbol_ids[symbol] for symbol in reversed(right)) for _, right in productions]
+        return cls(terminals + nonterminals, len(terminals), table, rhs_reversed)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """由分析表缓存中的数组还原"""
+        rhs, offsets = arrays['rhs'], arrays['rhs_offsets']
+        rhs_reversed = [tuple(rhs[offsets[idx]:offsets[idx + 1]]) for idx in range(len(offsets) - 1)]
+        return cls(arrays['symbols'], arrays['nterminals'], arrays['table'], rhs_reversed)
+
+    def to_arrays(self) -> dict:
+        """转换为可以写入分析表缓存的数组"""
+        rhs = array('i')
+        offsets = array('i', [0])
+        for symbols in self.rhs_reversed:
+            rhs.extend(symbols)
+            offsets.append(len(rhs))
+        return {'symbols': self.symbols, 'nterminals': self.nterminals, 'table': self.table,
+                'rhs': rhs, 'rhs_offsets': offsets}
+
 
 def _generate_table():
     """生成预测分析表"""
@@ -21,25 +101,54 @@ def _generate_table():
     if '$' in all_symbols:
         all_symbols.remove('$')
 
-    global _parsing_table
-    _parsing_table = pd.DataFrame([{symbol: 'error' for symbol in _terminal}], index=list(set(all_symbols) - set(_terminal)))
+    follow_sets = get_table_follow_sets()
+
+    parsing_table = pd.DataFrame([{symbol: 'error' for symbol in _terminal}], index=list(set(all_symbols) - set(_terminal)))
     for left, right in grammar_dict.items():
         for symbols in right:
             # 对于文法的每一个产生式「A -> α」
             production = (left, [] if symbols == ['$'] else symbols)
-            for asymbol in first(symbols):
+            for asymbol in first_of_sequence(symbols):
                 # 对于每个 FIRST(α) 中的终结符 a
                 if asymbol == '$':
                     # 当该终结符 a 为空时, 对于每个 FOLLOW(A) 中的终结符 b, 把「A -> α」加入表中 b 对应的表项
-                    for bsymbol in follow(left):
-                        _parsing_table[bsymbol][left] = production
+                    for bsymbol in follow_sets[left]:
+                        parsing_table[bsymbol][left] = production
                 else:
                     # 否则把「A -> α」加入表中 a 对应的表项
-                    _parsing_table[asymbol][left] = production
+                    parsing_table[asymbol][left] = production
+
+    # 分析表构造完成后才发布, 其它线程不会看到构造到一半的分析表
+    global _parsing_table
+    _parsing_table = parsing_table
 
 
 def get_table():
     """访问预测分析表"""
-    if _parsing_table.empty:
-        _generate_table()
-    return _parsing_table
\ No newline at end of file
+    with cache.lock:
+        if _parsing_table.empty:
+            _generate_table()
+    return _parsing_table
+
+
+def get_compiled_table(stats: Stats = None):
+    """
+    访问编译后的预测分析表, 
+    优先从分析表缓存中加载, 缓存不存在或已失效时重新生成并写入缓存,
+    stats 不为 None 时把分析表的来源记录到 stats.caches['ll1']
+    """
+    global _compiled_table
+    source = 'memory'
+    with cache.lock:
+        if _compiled_table is None:
+            arrays = cache.load('ll1')
+            if arrays is not None:
+                _compiled_table = LLTable.from_arrays(arrays)
+                source = 'hit'
+            else:
+                _compiled_table = LLTable.from_dataframe(get_table())
+                cache.save('ll1', _compiled_table.to_arrays())
+                source = 'miss'
+    if stats is not None:
+        stats.caches['ll1'] = source
+    return _compiled_table
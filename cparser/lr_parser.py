@@ -1,88 +1,131 @@
-from .lr_table import get_table
-from .grammar import reduce
-from typing import Union
-from os import PathLike
+from .lr_table import LRTable, get_compiled_table, _SHIFT, _REDUCE, _ACCEPT
+from collections import Counter
+from .tokens import FilePath, read_tokens, input_symbols
+from .tree import SyntaxTree
+from clexer.trace import TraceWriter
+from clexer.stats import Stats, PeakStack, phase
+from typing import Iterable, Union
 
+# 分析序列的输出格式: [序号][TAB][栈顶符号]#[面临的输入符号][TAB][执行动作]
+_trace_format = "%d\t%s#%s\t%s\n"
 
-FilePath = Union[str, "PathLike[str]"]
+# 二进制格式的分析序列的魔数
+_trace_magic = b'CLRT'
 
-def _log(no, csymbol, nsymbol, action):
-    """记录语法分析器的一次行为"""
-    _fout.write("%d\t%s#%s\t%s\n" % (no, csymbol, nsymbol, action))
 
-
-def parse(input: FilePath, output: FilePath):
+def parse(input: Union[FilePath, Iterable], output: FilePath, method: str = 'lr0',
+          parsing_table: LRTable = None, trace: str = 'text', tree: bool = False, stats: Stats = None):
     """
     LR 语法分析器:
         根据词法分析结果进行语法分析, 
-        通过查找 LR 分析表, 生成「移进-规约」序列
+        词法分析结果可以是结果文件的路径, 也可以是单词符号记录的可迭代对象, 
+        通过查找 LR 分析表, 生成「移进-规约」序列, 
+        method 指定 LR 分析表的构造方法, 可以是 'lr0'、'lalr1' 或 'lr1',
+        parsing_table 为编译后的 LR 分析表, 给出时忽略 method,
+        trace 为输出模式: 'text' 为文本格式, 'binary' 为二进制格式 (记录为「(序号, 栈顶符号, 输入符号, 动作)」),
+        None 为不输出, 只检查语法错误,
+        tree 为 True 时在规约的同时自底向上构造具体语法树并返回, 否则返回 None,
+        stats 不为 None 时把各阶段的耗时、分析步数等计数以及分析表的来源记录到 stats 中.
+        分析过程中的状态都保存在局部变量中, 可以在多个线程中同时调用
     """
-    istr = []
-    # 读取词法分析结果, 
-    # 将单词符号及其类别以二元组的方式存储到输入串列表 istr 中
+    actions = Counter() if stats is not None else None
     try:
-        with open(input, 'r') as f:
-            lines = f.readlines()
-            for line in lines:
-                istr.append(tuple(line.replace('\n', '').split('\t')))
-    except Exception as e:
-        print("语法分析错误:", e)
-        return
-    
-    # 打开输出的目标文件
-    global _fout
-    _fout = open(output, 'w')
+        # 读取词法分析结果, 逐个取出面临的输入符号
+        with phase(stats, 'read'):
+            try:
+                istr = input_symbols(read_tokens(input))
+            except Exception as e:
+                print("语法分析错误:", e)
+                return
+
+        with phase(stats, 'table'):
+            if parsing_table is None:
+                parsing_table = get_compiled_table(method, stats)
+        syntax_tree = SyntaxTree(parsing_table.symbols) if tree else None
+        with TraceWriter(output, _trace_format, trace, _trace_magic, actions=actions) as writer, \
+                phase(stats, 'parse'):
+            _parse(istr, writer, parsing_table, syntax_tree, stats)
+        return syntax_tree
+    finally:
+        if stats is not None:
+            # 每一步查一次 ACTION 表, 每次规约后再查一次 GOTO 表
+            stats.add_actions(actions, sum(actions.values()) + actions['reduction'])
+            stats.finish()
+
 
-    istr.append(('#', '<EOF>'))
-    parsing_table = get_table()
+def _parse(istr, writer, parsing_table, tree, stats=None):
+    """
+    在输入符号流上运行 LR 分析, 逐条记录分析序列, 每读入一个输入符号检查一次输出缓冲区,
+    tree 不为 None 时, 移进时添加叶结点, 规约时以符号栈顶部的结点为子结点添加父结点,
+    stats 不为 None 时, 状态栈换成记录最大深度的 PeakStack (执行动作由 writer 计数)
+    """
+    write, check = writer.write, writer.check
+    names, symbol_ids = parsing_table.symbols, parsing_table.symbol_ids
+    nterminals, eof = parsing_table.nterminals, parsing_table.eof
+    nnonterminals = len(names) - nterminals
+    action, goto = parsing_table.action, parsing_table.goto
+    lhs, rhs_len = parsing_table.lhs, parsing_table.rhs_len
 
     no = 0          # 序号
     states = [0]    # 状态栈
-    symbols = []    # 符号栈
+    if stats is not None:
+        states = PeakStack(states, stats)
+    symbols = []    # 符号栈, 存储符号编号
+    nodes = []      # 与符号栈平行的结点栈
+    position = 0    # 面临的输入符号的序号
 
+    csymbol = next(istr)
+    cid = symbol_ids.get(csymbol, -1)
+    if cid >= nterminals:
+        cid = -1
     while True:
-        if istr[0][1] == '<IDN>':
-            csymbol = 'IDN'
-        elif istr[0][1] == '<INT>':
-            csymbol = 'INT'
-        else:
-            csymbol = istr[0][0]
         no += 1
-        
+        entry = action[states[-1] * nterminals + cid] if cid >= 0 else 0
+        kind = entry & 3
+
         # 表项为状态, 移进
-        if isinstance(parsing_table[csymbol][states[-1]], int):
-            _log(no, 'EOF' if not symbols else symbols[-1], csymbol, 'move')
-            states.append(parsing_table[csymbol][states[-1]])
-            symbols.append(csymbol)
-            istr.pop(0)
+        if kind == _SHIFT:
+            write((no, 'EOF' if not symbols else names[symbols[-1]], csymbol, 'move'))
+            check()
+            states.append(entry >> 2)
+            symbols.append(cid)
+            if tree is not None:
+                nodes.append(tree.add_node(cid, position))
+            position += 1
+            csymbol = next(istr)
+            cid = symbol_ids.get(csymbol, -1)
+            if cid >= nterminals:
+                cid = -1
+            continue
 
         # 表项为产生式, 规约
-        elif isinstance(parsing_table[csymbol][states[-1]], tuple):
-            _log(no, symbols[-1], 'EOF' if csymbol == '#' else csymbol, 'reduction')
-            production = parsing_table[csymbol][states[-1]]
-
-            rlen = len(production[1])
-            csymbols = [symbols.pop() for _ in range(rlen)]
-            csymbols.reverse()
-            nsymbol = reduce(csymbols, production)
-            symbols.append(nsymbol)
-
-            for _ in range(rlen):
-                states.pop()
-            nstate = parsing_table[nsymbol][states[-1]]
-            states.append(nstate)
+        if kind == _REDUCE:
+            write((no, 'EOF' if not symbols else names[symbols[-1]], 'EOF' if cid == eof else csymbol, 'reduction'))
+            pid = entry >> 2
+            rlen = rhs_len[pid]
+            if rlen:
+                del symbols[-rlen:]
+                del states[-rlen:]
+            nsymbol = lhs[pid]
+            nstate = goto[states[-1] * nnonterminals + nsymbol - nterminals]
+            if nstate >= 0:
+                symbols.append(nsymbol)
+                states.append(nstate)
+                if tree is not None:
+                    children = nodes[len(nodes) - rlen:]
+                    del nodes[len(nodes) - rlen:]
+                    nodes.append(tree.add_parent(nsymbol, children))
+                continue
 
         # 表项为「accept」, 接受输入符号串, 语法分析完成
-        elif parsing_table[csymbol][states[-1]] == 'accept':
-            _log(no, symbols[-1], 'EOF', 'accept')
+        elif kind == _ACCEPT:
+            write((no, 'EOF' if not symbols else names[symbols[-1]], 'EOF', 'accept'))
+            if tree is not None:
+                # 接受相当于按开始符号的产生式 (编号为 0) 规约, 为其添加根结点
+                tree.root = tree.add_parent(lhs[0], nodes)
             break
 
-        # 表项为「error」, 发现语法错误
-        elif parsing_table[csymbol][states[-1]] == 'error':
-            _log(no, 'EOF' if not symbols else symbols[-1], 
-                 'EOF' if csymbol == '#' else csymbol, 'error')
-            _fout.close()
-            raise NotImplementedError("存在语法错误, 暂不支持自动恢复, 分析中止")
-
-    # 关闭输出的目标文件
-    _fout.close()
+        # 表项为「error」或规约后无法转移, 发现语法错误
+        write((no, 'EOF' if not symbols else names[symbols[-1]],
+               'EOF' if cid == eof else csymbol, 'error'))
+        raise NotImplementedError("存在语法错误, 暂不支持自动恢复, 分析中止")
@@ -2,199 +2,370 @@
 分析表生成模块
 
 功能:
-    根据文法产生式字典来构造 LR 分析表, 支持 LR(0) 和 LR(1) 分析法.
+    根据文法产生式字典来构造 LR 分析表, 支持 LR(0)、LALR(1) 和 LR(1) 分析法,
+    分别通过参数 method='lr0'、'lalr1' 和 'lr1' 选择.
     
 """
-import os
 import pandas as pd
-from .grammar import get_grammar_begin
-from .util import get_grammar, get_all_symbols, first, _terminal
+from array import array
+from contextlib import contextmanager
+from . import cache
+from clexer.stats import Stats
+from .grammar import get_grammar_begin, get_productions
+from .util import get_grammar, get_all_symbols, first_of_sequence, _terminal
 
 
-# LR 分析表
-_parsing_table = pd.DataFrame()
+# 支持的 LR 分析法
+_methods = ('lr0', 'lalr1', 'lr1')
 
-# 展望串长度, 为 0 时生成 LR(0) 分析表, 为 1 时生成 LR(1) 分析表
-_lookahead_len = 0
+# 各分析法的 LR 分析表, 用于检查和调试
+_parsing_tables = {}
 
-class Item:
+# 各分析法编译后的 LR 分析表
+_compiled_tables = {}
+
+# 构造 LALR(1) 分析表时用于标记「传播的展望符号」的哑符号
+_PROPAGATE = '<propagate>'
+
+# 编译后的 ACTION 表项的动作类型, 存储在表项的低 2 位, 其余位存储移进的目标状态或规约的产生式编号
+_ERROR, _SHIFT, _REDUCE, _ACCEPT = 0, 1, 2, 3
+
+# 驻留的 LR 项目, 只在构造项目集族期间使用, 见 _item_scope
+_interned_items = {}
+
+
+class Item(tuple):
     """
-    LR(1) 项目, 由以下属性构成
-        target: 产生式左部符号
-        done: 产生式右部已分析完成的符号列表
-        undone: 产生式右部未分析完成的符号列表
-        lookahead: 展望串列表, 对于 LR(1) 分析法, 每个展望串的长度为 1
+    LR(1) 项目, 是一个被驻留的不可变三元组, 由以下属性构成
+        production: 产生式编号
+        dot: 圆点位置, 即产生式右部已分析完成的符号个数
+        lookahead: 展望符号, 对于 LR(0) 项目为空串
+    相同的项目只会被创建一次, 因此项目的比较和哈希都很廉价
     """
-    def __init__(self, target, done, undone):
-        self.target = target
-        self.done = done.copy()
-        self.undone = undone.copy()
-        self.lookahead = ''
-
-    # 重载「==」运算符
-    def __eq__(self, obj):
-        if isinstance(obj, Item) and \
-            self.target == obj.target and \
-            self.done == obj.done and \
-            self.undone == obj.undone and \
-            self.lookahead == obj.lookahead:
-            return True
-        else:
-            return False
-        
-    # 对象拷贝
-    def copy(self):
-        new = Item(self.target, self.done, self.undone)
-        new.lookahead = self.lookahead
-        return new
-
-
-def _items_closure(items, all):
-    """构造 LR 项目集的闭包"""
-    closure = items.copy()
-    items_ = closure.copy()
-    while True:
-        new = []
-        for item in items_:
-            # 如果项目为「A -> α·Bβ, a」
-            if item.undone and item.undone[0] not in _terminal:
-                if len(item.undone) == 1:
-                    # β 为空时
-                    followit = '$'
-                else:
-                    followit = item.undone[1]
-                
-                # 找到所有形如「B -> ·ξ, b」的项目
-                next = []
-                for oth_item in all:
-                    if oth_item.target == item.undone[0] and not oth_item.done:
-                        next.append(oth_item)
-
-                for next_item in next:
-                    global _lookahead_len
-                    if _lookahead_len == 1:
-                        # LR(1): 对于每一个终结符 b, 如果「B -> ·ξ, b」不在闭包中, 则把它加进去
-                        for symbol in first([followit, item.lookahead]):
-                            temp = next_item.copy()
-                            temp.lookahead = symbol
-                            if temp not in closure:
-                                closure.append(temp)
-                                new.append(temp)
-                    else:
-                        # LR(0): 如果「B -> ·ξ」不在闭包中, 则把它加进去
-                        if next_item not in closure:
-                            closure.append(next_item)
-                            new.append(next_item)
-        if not new:
-            break
-        items_ = new.copy()
-    return closure
-
-
-def _items_go(items, symbol, all):
-    """项目集转换函数"""
-    next = []
-    for item in items:
-        if item.undone and item.undone[0] == symbol:
-            item_ = item.copy()
-            item_.done.append(item_.undone[0])
-            item_.undone.pop(0)
-            next.append(item_)
-    return _items_closure(next, all)
-
-
-def _generate_table():
-    """生成 LR 分析表"""
-    grammar_dict = get_grammar()
-    grammar_begin = get_grammar_begin()
+    __slots__ = ()
+
+    def __new__(cls, production: int, dot: int, lookahead: str = ''):
+        key = (production, dot, lookahead)
+        item = _interned_items.get(key)
+        if item is None:
+            item = _interned_items[key] = tuple.__new__(cls, key)
+        return item
+
+    @property
+    def production(self):
+        return self[0]
+
+    @property
+    def dot(self):
+        return self[1]
+
+    @property
+    def lookahead(self):
+        return self[2]
+
+
+@contextmanager
+def _item_scope():
+    """
+    项目只在一次构造项目集族的过程中驻留, 退出时清空驻留表, 驻留表不会随构造次数和文法的改变而增长.
+    项目按值比较, 清空后已构造的项目集仍然有效
+    """
+    try:
+        yield
+    finally:
+        _interned_items.clear()
+
 
-    # 根据文法的产生式规则生成项目
-    all_items = []
-    for left, right in grammar_dict.items():
-        for symbols in right:
-            if symbols == ['$']:
-                all_items += [Item(left, [], [])]
+def _items_closure(kernel, productions, alternatives):
+    """
+    构造 LR 项目集的闭包, 核心项目带有展望符号时构造 LR(1) 闭包, 否则构造 LR(0) 闭包,
+    返回按加入顺序排列的项目元组, 核心项目在前, 闭包新加入的项目依次在后
+    """
+    closure = list(kernel)
+    members = set(kernel)
+    for item in closure:
+        production, dot, lookahead = item
+        right = productions[production][1]
+        # 如果项目为「A -> α·Bβ, a」
+        if dot < len(right) and right[dot] in alternatives:
+            if lookahead:
+                # 展望符号为 FIRST(βa), β 可空时包含 a
+                lookaheads = first_of_sequence((*right[dot + 1:], lookahead))
             else:
-                symbols_len = len(symbols)
-                items_ = [Item(left, symbols[:i], symbols[i:]) for i in range(symbols_len + 1)]
-                all_items += items_
+                lookaheads = ('',)
+
+            # 对于每一个「B -> ·ξ, b」, 如果它不在闭包中, 则把它加进去
+            for next_production in alternatives[right[dot]]:
+                for symbol in lookaheads:
+                    next_item = Item(next_production, 0, symbol)
+                    if next_item not in members:
+                        members.add(next_item)
+                        closure.append(next_item)
+    return tuple(closure)
+
+
+def _items_go(items, symbol, productions):
+    """项目集转换函数, 返回转换后的核心项目"""
+    kernel = []
+    for production, dot, lookahead in items:
+        right = productions[production][1]
+        if dot < len(right) and right[dot] == symbol:
+            kernel.append(Item(production, dot + 1, lookahead))
+    return kernel
+
+
+def _alternatives(productions):
+    """每个非终结符的产生式编号列表"""
+    alternatives = {left: [] for left in get_grammar()}
+    for idx, (left, _) in enumerate(productions):
+        alternatives[left].append(idx)
+    return alternatives
 
-    # 构造 LR(0) 项目集规范族
-    collection = []
-    global _lookahead_len
-    if _lookahead_len == 1:
-        all_items[0].lookahead = '#'
-    collection.append(_items_closure([all_items[0]], all=all_items))
 
+def _table_symbols():
+    """LR 分析表的列, 即除拓广文法开始符号和空串以外的所有符号, 以及文本结束符"""
     all_symbols = get_all_symbols().copy()
-    all_symbols.remove(grammar_begin)
+    all_symbols.remove(get_grammar_begin())
     if '$' in all_symbols:
         all_symbols.remove('$')
+    return all_symbols + ['#']
+
+
+def _canonical_collection(lookahead: bool):
+    """
+    构造 LR(0) (lookahead 为 False 时) 或 LR(1) 项目集规范族, 返回以下两项
+        collection: 项目集列表, 项目集在列表中的下标即为状态编号
+        goto: 项目集转换函数的结果, goto[状态编号][符号] 为转换后的状态编号
+    项目集以核心项目的 frozenset 为键索引状态编号, 每个 (状态, 符号) 的转换只计算一次
+    """
+    productions = get_productions()
+    alternatives = _alternatives(productions)
+    all_symbols = _table_symbols()[:-1]
+
+    init = Item(0, 0, '#' if lookahead else '')
+    collection = [_items_closure((init,), productions, alternatives)]
+    states = {frozenset((init,)): 0}
+    goto = []
 
-    collection_ = collection.copy()
-    while True:
-        new = []
-        for items in collection_:
-            for symbol in all_symbols:
-                next = _items_go(items, symbol, all=all_items)
-                if next and next not in collection:
-                    collection.append(next)
-                    new.append(next)
-        if not new:
-            break
-        collection_ = new
-
-    # 根据项目集规范族和项目集转换函数构造 LR 语法分析表
-    global _parsing_table
-    _parsing_table = pd.DataFrame([{symbol: 'error' for symbol in (all_symbols + ['#'])} for _ in collection])
     for items in collection:
-        for item in items:
-            if item.undone:
+        transitions = {}
+        for symbol in all_symbols:
+            kernel = _items_go(items, symbol, productions)
+            if not kernel:
+                continue
+            key = frozenset(kernel)
+            state = states.get(key)
+            if state is None:
+                state = states[key] = len(collection)
+                collection.append(_items_closure(kernel, productions, alternatives))
+            transitions[symbol] = state
+        goto.append(transitions)
+    return collection, goto
+
+
+def _lalr_collection():
+    """
+    构造 LALR(1) 项目集族, 返回值与 _canonical_collection 相同.
+    先构造 LR(0) 项目集规范族, 再以传播的方式计算各状态核心项目的展望符号:
+        1. 对每个核心项目 K 构造以哑符号为展望符号的 LR(1) 闭包, 闭包中项目经转换后得到的核心项目,
+           其展望符号若不是哑符号则为自生的展望符号, 否则由 K 传播而来
+        2. 从拓广文法开始项目的展望符号「#」出发, 沿传播关系反复传播, 直到不再变化
+    最后以带展望符号的核心项目重新构造 LR(1) 闭包, 状态与 LR(0) 项目集规范族一一对应
+    """
+    productions = get_productions()
+    alternatives = _alternatives(productions)
+    collection, goto = _canonical_collection(lookahead=False)
+
+    # 各状态的核心项目, 以 (产生式编号, 圆点位置) 表示
+    kernels = [[(0, 0)]] + [[(production, dot) for production, dot, _ in items if dot > 0]
+                            for items in collection[1:]]
+
+    # 步骤1: 确定自生的展望符号和传播关系
+    lookaheads = [{core: {} for core in kernel} for kernel in kernels]
+    propagation = {}
+    for state, kernel in enumerate(kernels):
+        for core in kernel:
+            targets = propagation[(state, core)] = []
+            closure = _items_closure((Item(*core, _PROPAGATE),), productions, alternatives)
+            for production, dot, lookahead in closure:
+                right = productions[production][1]
+                if dot == len(right):
+                    continue
+                target = (goto[state][right[dot]], (production, dot + 1))
+                if lookahead == _PROPAGATE:
+                    targets.append(target)
+                else:
+                    lookaheads[target[0]][target[1]][lookahead] = None
+    lookaheads[0][(0, 0)]['#'] = None
+
+    # 步骤2: 传播展望符号, 直到不再变化
+    worklist = [(state, core) for state, kernel in enumerate(kernels) for core in kernel]
+    queued = set(worklist)
+    while worklist:
+        source = worklist.pop()
+        queued.discard(source)
+        symbols = lookaheads[source[0]][source[1]]
+        for target in propagation[source]:
+            target_symbols = lookaheads[target[0]][target[1]]
+            if not symbols.keys() <= target_symbols.keys():
+                target_symbols.update(symbols)
+                if target not in queued:
+                    worklist.append(target)
+                    queued.add(target)
+
+    # 步骤3: 以带展望符号的核心项目构造 LR(1) 闭包, 展望符号按分析表的列排序以保证结果确定
+    order = {symbol: idx for idx, symbol in enumerate(_table_symbols())}
+    lalr_collection = []
+    for state, kernel in enumerate(kernels):
+        items = [Item(*core, symbol) for core in kernel
+                 for symbol in sorted(lookaheads[state][core], key=order.__getitem__)]
+        lalr_collection.append(_items_closure(items, productions, alternatives))
+    return lalr_collection, goto
+
+
+def _generate_table(method: str):
+    """生成 LR 分析表"""
+    grammar_begin = get_grammar_begin()
+    productions = get_productions()
+
+    table_symbols = _table_symbols()
+    reduce_symbols = list(set(_terminal) & set(table_symbols[:-1])) + ['#']
+
+    # 构造 LR 项目集规范族
+    with _item_scope():
+        if method == 'lalr1':
+            collection, goto = _lalr_collection()
+        else:
+            collection, goto = _canonical_collection(lookahead=(method == 'lr1'))
+
+    # 根据项目集规范族和项目集转换函数构造 LR 语法分析表, 
+    # 同一表项被多个项目填写时 (即存在冲突时), 以项目集中靠后的项目为准
+    rows = []
+    for state, items in enumerate(collection):
+        row = {symbol: 'error' for symbol in table_symbols}
+        for production, dot, lookahead in items:
+            left, right = productions[production]
+            if dot < len(right):
                 # 面临终结符需要移进或面临非终结符需要跳转
-                next = _items_go(items, item.undone[0], all=all_items)
-                if next in collection:
-                    _parsing_table[item.undone[0]][collection.index(items)] = collection.index(next)
+                row[right[dot]] = goto[state][right[dot]]
+            elif left == grammar_begin:
+                # 面临终结符需要接受
+                row['#'] = 'accept'
+            elif lookahead:
+                # LR(1) 和 LALR(1) 规约
+                row[lookahead] = (left, right.copy())
             else:
-                if item.target == grammar_begin:
-                    # 面临终结符需要接受
-                    _parsing_table['#'][collection.index(items)] = 'accept'
-                else:
-                    # 面临终结符需要规约
-                    production = (item.target, item.done)
-                    if _lookahead_len == 1:
-                        # LR(1) 规约
-                        _parsing_table[item.lookahead][collection.index(items)] = production
-                    else:
-                        # LR (0) 规约
-                        for symbol in list(set(_terminal) & set(all_symbols)) + ['#']:
-                            _parsing_table[symbol][collection.index(items)] = production
-    
-    # 缓存 LR 分析表, 供以后使用
-    _parsing_table.to_csv(table_path, sep=',', index=False, header=True)
+                # LR (0) 规约
+                for symbol in reduce_symbols:
+                    row[symbol] = (left, right.copy())
+        rows.append(row)
+
+    _parsing_tables[method] = pd.DataFrame(rows, columns=table_symbols)
 
 
-def _load_table():
+def _check_method(method: str):
+    """检查 LR 分析法是否受支持"""
+    if method not in _methods:
+        raise ValueError("未知的 LR 分析法 %s, 可选的分析法为 %s" % (method, ', '.join(_methods)))
+
+
+def get_table(method: str = 'lr0'):
+    """访问 LR 分析表, method 可以是 'lr0'、'lalr1' 或 'lr1'"""
+    _check_method(method)
+    with cache.lock:
+        if method not in _parsing_tables:
+            _generate_table(method)
+    return _parsing_tables[method]
+
+
+class LRTable:
     """
-    从分析表文件 table.txt 中加载 LR 分析表, 
-    若分析表文件不存在, 则自动生成一张 LR 分析表
+    编译后的 LR 分析表, 所有符号都被编码为小整数, 由以下属性构成
+        symbols: 符号列表, 符号在列表中的下标即为其编号, 终结符在前, 非终结符在后
+        symbol_ids: 符号到编号的映射
+        nterminals: 终结符的个数, 编号小于该值的符号为终结符
+        eof: 文本结束符「#」的编号
+        action: 扁平的 array('i'), 下标为「状态 × nterminals + 终结符编号」,
+                表项的低 2 位为动作类型, 其余位为移进的目标状态或规约的产生式编号
+        goto: 扁平的 array('i'), 下标为「状态 × 非终结符个数 + 非终结符编号 - nterminals」, 没有转移时为 -1
+        lhs: 每个产生式左部符号的编号
+        rhs_len: 每个产生式右部符号的个数
     """
-    global table_path
-    table_path = os.path.join(os.path.dirname(__file__), 'table.txt')
-    try:
-        global _parsing_table
-        _parsing_table = pd.read_csv(table_path)
-        for index in _parsing_table.index:
-            for column in _parsing_table.columns:
-                try:
-                    _parsing_table[column][index] = eval(_parsing_table[column][index])
-                except NameError:
-                    pass
-    except:
-        _generate_table()
-
-
-def get_table():
-    """访问 LR 分析表"""
-    if _parsing_table.empty:
-        _load_table()
-    return _parsing_table
+    def __init__(self, symbols: list, nterminals: int, action: array, goto: array, lhs: array, rhs_len: array):
+        self.symbols = symbols
+        self.symbol_ids = {symbol: idx for idx, symbol in enumerate(symbols)}
+        self.nterminals = nterminals
+        self.eof = self.symbol_ids['#']
+        self.action = action
+        self.goto = goto
+        self.lhs = lhs
+        self.rhs_len = rhs_len
+
+    @classmethod
+    def from_dataframe(cls, parsing_table: pd.DataFrame):
+        """由 DataFrame 形式的 LR 分析表编译"""
+        grammar_dict = get_grammar()
+        productions = get_productions()
+        production_ids = {(left, tuple(right)): idx for idx, (left, right) in enumerate(productions)}
+
+        terminals = [symbol for symbol in parsing_table.columns if symbol not in grammar_dict]
+        nonterminals = [symbol for symbol in grammar_dict]
+        symbol_ids = {symbol: idx for idx, symbol in enumerate(terminals + nonterminals)}
+        nterminals = len(terminals)
+
+        nstates = len(parsing_table.index)
+        nnonterminals = len(nonterminals)
+        action = array('i', [_ERROR] * (nstates * nterminals))
+        goto = array('i', [-1] * (nstates * nnonterminals))
+        for symbol in parsing_table.columns:
+            sid = symbol_ids[symbol]
+            for state, entry in enumerate(parsing_table[symbol]):
+                if sid >= nterminals:
+                    # 非终结符对应的表项为 GOTO 表项
+                    if isinstance(entry, int):
+                        goto[state * nnonterminals + sid - nterminals] = entry
+                elif isinstance(entry, int):
+                    action[state * nterminals + sid] = entry << 2 | _SHIFT
+                elif isinstance(entry, tuple):
+                    pid = production_ids[(entry[0], tuple(entry[1]))]
+                    action[state * nterminals + sid] = pid << 2 | _REDUCE
+                elif entry == 'accept':
+                    action[state * nterminals + sid] = _ACCEPT
+
+        lhs = array('i', [symbol_ids[left] for left, _ in productions])
+        rhs_len = array('i', [len(right) for _, right in productions])
+        return cls(terminals + nonterminals, nterminals, action, goto, lhs, rhs_len)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """由分析表缓存中的数组还原"""
+        return cls(arrays['symbols'], arrays['nterminals'], arrays['action'], arrays['goto'],
+                   arrays['lhs'], arrays['rhs_len'])
+
+    def to_arrays(self) -> dict:
+        """转换为可以写入分析表缓存的数组"""
+        return {'symbols': self.symbols, 'nterminals': self.nterminals, 'action': self.action,
+                'goto': self.goto, 'lhs': self.lhs, 'rhs_len': self.rhs_len}
+
+
+def get_compiled_table(method: str = 'lr0', stats: Stats = None):
+    """
+    访问编译后的 LR 分析表, method 可以是 'lr0'、'lalr1' 或 'lr1', 
+    优先从分析表缓存中加载, 缓存不存在或已失效时重新生成并写入缓存,
+    stats 不为 None 时把分析表的来源记录到 stats.caches[method]
+    """
+    _check_method(method)
+    source = 'memory'
+    with cache.lock:
+        if method not in _compiled_tables:
+            arrays = cache.load(method)
+            if arrays is not None:
+                _compiled_tables[method] = LRTable.from_arrays(arrays)
+                source = 'hit'
+            else:
+                _compiled_tables[method] = LRTable.from_dataframe(get_table(method))
+                cache.save(method, _compiled_tables[method].to_arrays())
+                source = 'miss'
+    if stats is not None:
+        stats.caches[method] = source
+    return _compiled_tables[method]
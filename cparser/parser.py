@@ -0,0 +1,46 @@
+"""
+语法分析器对象
+
+功能:
+    持有编译后的分析表, 提供与 ll_parse / lr_parse 相同的分析接口.
+    分析表在构造时加载一次, 之后只读, 每次分析的状态都保存在局部变量中,
+    因此同一个 Parser 对象可以在多个线程中同时使用.
+"""
+from . import ll_parser, lr_parser, ll_table, lr_table
+from .tokens import FilePath
+from clexer.stats import Stats, phase
+from typing import Iterable, Union
+
+
+class Parser:
+    """
+    语法分析器
+    --------
+    输入:
+      method: 分析法, 可以是 'll1'、'lr0'、'lalr1' 或 'lr1', 默认为 'll1'
+      stats: 记录加载分析表的耗时和分析表来源的统计信息 (可选)
+    """
+    def __init__(self, method: str = 'll1', stats: Stats = None):
+        self.method = method
+        with phase(stats, 'table'):
+            if method == 'll1':
+                self.table = ll_table.get_compiled_table(stats)
+            else:
+                self.table = lr_table.get_compiled_table(method, stats)
+
+
+    def parse(self, input: Union[FilePath, Iterable], output: FilePath, trace: str = 'text',
+              tree: bool = False, errors: list = None, max_errors: int = 100, stats: Stats = None):
+        """
+        根据词法分析结果进行语法分析, 将分析序列写入 output,
+        词法分析结果可以是结果文件的路径, 也可以是单词符号记录的可迭代对象,
+        trace 为输出模式, 可以是 'text'、'binary' 或 None (不输出),
+        tree 为 True 时构造并返回具体语法树 SyntaxTree, 否则返回 None,
+        errors 为列表时从语法错误中恢复并收集至多 max_errors 个错误, 只有 LL(1) 分析法支持,
+        stats 不为 None 时把各阶段的耗时和计数记录到 stats 中
+        """
+        if self.method == 'll1':
+            return ll_parser.parse(input, output, self.table, trace, tree, errors, max_errors, stats)
+        if errors is not None:
+            raise ValueError("只有 LL(1) 分析法支持出错恢复, 当前分析法为 %s" % self.method)
+        return lr_parser.parse(input, output, self.method, self.table, trace, tree, stats)
@@ -0,0 +1,46 @@
+"""
+输入符号读取模块
+
+功能:
+    从词法分析结果文件或单词符号记录的可迭代对象中读取语法分析器的输入.
+    单词符号记录的前两个元素依次为符号类型和单词符号文本, 如 clexer.Token(kind, text, line, column).
+
+"""
+from typing import Union
+from os import PathLike
+
+
+FilePath = Union[str, "PathLike[str]"]
+
+def load_tokens(input: FilePath) -> list:
+    """从词法分析结果文件中读取单词符号, 以 (符号类型, 单词符号) 二元组的列表返回"""
+    tokens = []
+    with open(input, 'r') as f:
+        for line in f:
+            token, tp = line.replace('\n', '').split('\t')
+            tokens.append((tp[1:-1], token))
+    return tokens
+
+
+def read_tokens(input):
+    """
+    读取语法分析器的输入:
+        input 为文件路径时读取词法分析结果文件, 
+        否则视为单词符号记录的可迭代对象
+    """
+    if isinstance(input, (str, PathLike)):
+        return load_tokens(input)
+    return input
+
+
+def input_symbols(tokens):
+    """
+    将单词符号记录逐个转换为面临的输入符号: 标识符和整数取其符号类型, 其余取单词符号本身,
+    最后生成文本结束符「#」
+    """
+    for token in tokens:
+        if token[0] in ('IDN', 'INT'):
+            yield token[0]
+        else:
+            yield token[1]
+    yield '#'
@@ -0,0 +1,124 @@
+"""
+语法树模块
+
+功能:
+    语法分析器在推导或规约的同时构造具体语法树 (concrete syntax tree).
+    结点按「数组的结构体」方式存储: 每个结点只是一个编号, 其属性分别存放在四个平行的 array('i') 中,
+    每个结点占用 4 个 int32 即 16 字节, 不为每个结点创建 Python 对象, 可以为百万级单词符号的输入构造语法树.
+
+结点属性:
+    symbol: 结点的符号编号, 即符号在 symbols 中的下标
+    token: 叶结点对应的单词符号在输入中的序号 (从 0 开始), 非终结符结点和未匹配的叶结点为 -1
+    first_child: 第一个子结点的编号, 没有子结点时为 -1
+    next_sibling: 下一个兄弟结点的编号, 没有时为 -1
+
+    空产生式推导出的非终结符结点没有子结点.
+"""
+from array import array
+
+
+# 用于批量填充缺失属性的 -1 数组
+_missing = array('i', [-1] * 64)
+
+
+class SyntaxTree:
+    """
+    具体语法树
+    --------
+    输入:
+      symbols: 符号列表, 与分析表的符号编号一致
+
+    属性:
+      symbol, token, first_child, next_sibling: 结点属性的平行数组
+      root: 根结点的编号, 即文法开始符号对应的结点, 语法树为空时为 -1
+    """
+    def __init__(self, symbols: list):
+        self.symbols = symbols
+        self.symbol = array('i')
+        self.token = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.root = -1
+
+
+    def __len__(self):
+        return len(self.symbol)
+
+
+    def add_node(self, symbol: int, token: int = -1) -> int:
+        """添加一个没有子结点的结点, 返回结点编号"""
+        self.symbol.append(symbol)
+        self.token.append(token)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        return len(self.symbol) - 1
+
+
+    def add_children(self, parent: int, symbols_reversed) -> range:
+        """
+        为 parent 添加子结点 (自顶向下构造时使用), symbols_reversed 为子结点符号的逆序序列,
+        子结点按逆序编号, 返回的编号序列与 symbols_reversed 一一对应, 可以直接压入与符号栈平行的结点栈
+        """
+        begin = len(self.symbol)
+        count = len(symbols_reversed)
+        if count:
+            missing = _missing[:count] if count <= len(_missing) else array('i', [-1] * count)
+            self.symbol.extend(symbols_reversed)
+            self.token.extend(missing)
+            self.first_child.extend(missing)
+            self.next_sibling.append(-1)
+            self.next_sibling.extend(range(begin, begin + count - 1))
+            self.first_child[parent] = begin + count - 1
+        return range(begin, begin + count)
+
+
+    def add_parent(self, symbol: int, children) -> int:
+        """添加一个以 children 为子结点的结点, 返回结点编号 (自底向上构造时使用)"""
+        node = self.add_node(symbol)
+        if children:
+            next_sibling = self.next_sibling
+            for left, right in zip(children, children[1:]):
+                next_sibling[left] = right
+            self.first_child[node] = children[0]
+        return node
+
+
+    def children(self, node: int):
+        """依次生成 node 的子结点"""
+        child = self.first_child[node]
+        next_sibling = self.next_sibling
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+
+    def walk(self):
+        """以先序遍历依次生成 (结点编号, 深度) 二元组, 不使用递归"""
+        if self.root < 0:
+            return
+        first_child, next_sibling = self.first_child, self.next_sibling
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            child = first_child[node]
+            children = []
+            while child >= 0:
+                children.append((child, depth + 1))
+                child = next_sibling[child]
+            stack += reversed(children)
+
+
+    def format(self, tokens: list = None) -> str:
+        """
+        以缩进的文本形式输出语法树, 每行一个结点,
+        给出单词符号记录的列表 tokens 时, 叶结点后附上对应的单词符号文本
+        """
+        lines = []
+        symbols, token = self.symbols, self.token
+        for node, depth in self.walk():
+            line = '  ' * depth + symbols[self.symbol[node]]
+            if tokens is not None and token[node] >= 0:
+                line += '\t' + tokens[token[node]][1]
+            lines.append(line)
+        return '\n'.join(lines) + '\n' if lines else ''
@@ -1,4 +1,4 @@
-from .grammar import get_grammar, get_grammar_begin
+from .grammar import get_grammar, get_grammar_begin, get_productions
 
 
 # 终结符列表
@@ -20,90 +20,217 @@ def get_all_symbols():
     """访问存储所有符号的列表"""
     global _all_symbols
     if not _all_symbols:
+        all_symbols = []
         for left, right in get_grammar().items():
-            if left not in _all_symbols:
-                _all_symbols.append(left)
+            if left not in all_symbols:
+                all_symbols.append(left)
             for symbols in right:
                 for symbol in symbols:
-                    if symbol not in _all_symbols:
-                        _all_symbols.append(symbol)
+                    if symbol not in all_symbols:
+                        all_symbols.append(symbol)
+        _all_symbols = all_symbols
     return _all_symbols
 
 
-def _derivate(symbol: str) -> list:
-    """根据文法字典中的产生式规则进行推导"""
-    if symbol in get_grammar():
-        return get_grammar()[symbol]
-    else:
-        print("错误: 未知符号 %s" % symbol)
+# 可空的非终结符集合
+_nullable = frozenset()
 
+# 非终结符的 FIRST 集合, 不含空串
+_first_sets = {}
 
-def first(expr: list) -> list:
-    """计算表达式的 FIRST 集合"""
+# 非终结符的 FOLLOW 集合
+_follow_sets = {}
 
-    # p 为表达式第一个有意义符号的索引, 
-    # 由于表达式可能由若干个空符号开头, 
-    # 因此需要对其进行修正
-    p = 0
-    while expr[p] == '$':
-        p += 1
-        if p == len(expr):
-            # 意味着表达式为空串
-            return ['$']
-
-    # 表达式的第一个符号为终结符
-    if expr[p] in _terminal:
-        return [expr[p]]
-    
-    _first = []
-    
-    # 表达式为一个非终结符
-    if len(expr[p:]) == 1:
-        next = _derivate(expr[p])
-        for next_symbols in next:
-            _first += first(next_symbols)
-        return _first
-
-    # 表达式由非终结符开头, 且有效长度大于 1
-    for symbol in expr[p:]:
-        temp = first([symbol])
-        if '$' in temp:
-            temp.remove('$')
-            _first += temp
-        else:
-            _first += temp
-            return _first
-    _first.append('$')
-    return _first
+# 构造预测分析表使用的 FOLLOW 集合, 见 get_table_follow_sets
+_table_follow_sets = {}
 
+# 符号序列的 FIRST 集合缓存
+_sequence_first = {}
 
-def follow(expr: str) -> list:
-    """计算表达式的 FOLLOW 集合"""
-    _follow = []
 
-    # 表达式为拓广文法的开始符号
-    if expr == get_grammar_begin():
-        return ['#']
-    
-    # 表达式为其它非终结符
+def _analyse():
+    """
+    以工作表不动点迭代一次性计算所有非终结符的可空性、FIRST 集合和 FOLLOW 集合, 并以 frozenset 缓存
+    """
     grammar_dict = get_grammar()
-    for left, right in grammar_dict.items():
-        for symbols in right:
-            if expr not in symbols:
+    productions = get_productions()
+
+    # 记录每个非终结符出现在哪些产生式的右部, 其 FIRST 集合或可空性改变时, 只需重新考察这些产生式
+    users = {left: [] for left in grammar_dict}
+    for idx, (left, right) in enumerate(productions):
+        for symbol in set(right):
+            if symbol in grammar_dict:
+                users[symbol].append(idx)
+
+    # 步骤1: 计算可空性和 FIRST 集合
+    nullable = set()
+    first_sets = {left: set() for left in grammar_dict}
+    worklist = list(range(len(productions)))
+    queued = set(worklist)
+    while worklist:
+        idx = worklist.pop()
+        queued.discard(idx)
+        left, right = productions[idx]
+        changed = False
+        for symbol in right:
+            if symbol not in grammar_dict:
+                # 产生式右部遇到终结符
+                if symbol not in first_sets[left]:
+                    first_sets[left].add(symbol)
+                    changed = True
+                break
+            if not first_sets[symbol] <= first_sets[left]:
+                first_sets[left] |= first_sets[symbol]
+                changed = True
+            if symbol not in nullable:
+                break
+        else:
+            # 产生式右部全部可空
+            if left not in nullable:
+                nullable.add(left)
+                changed = True
+        if changed:
+            for user in users[left]:
+                if user not in queued:
+                    worklist.append(user)
+                    queued.add(user)
+
+    # 步骤2: 计算 FOLLOW 集合: 对于产生式「A -> αBβ」中 B 的每一次出现,
+    # 把 FIRST(β) 中的终结符加入 FOLLOW(B), 若 β 可空 (含 B 位于右部末尾), 则 FOLLOW(A) 包含于 FOLLOW(B)
+    grammar_begin = get_grammar_begin()
+    follow_sets = {left: set() for left in grammar_dict}
+    follow_sets[grammar_begin].add('#')
+    edges = {left: set() for left in grammar_dict}
+    for left, right in productions:
+        # 从右向左扫描, 维护后缀 β 的 FIRST 集合及其可空性
+        suffix_first = set()
+        suffix_nullable = True
+        for symbol in reversed(right):
+            if symbol not in grammar_dict:
+                suffix_first = {symbol}
+                suffix_nullable = False
                 continue
-            expr_idx = symbols.index(expr)
+            follow_sets[symbol] |= suffix_first
+            if suffix_nullable and left != symbol:
+                edges[left].add(symbol)
+            if symbol in nullable:
+                suffix_first = suffix_first | first_sets[symbol]
+            else:
+                suffix_first = set(first_sets[symbol])
+                suffix_nullable = False
+    _propagate(follow_sets, edges)
 
-            if expr_idx < len(symbols) - 1:
+    # 步骤3: 计算构造预测分析表使用的 FOLLOW 集合,
+    # 与原有的递归实现保持一致: 对于产生式「A -> αBβ」, 只考察 B 在右部的首次出现及其后的一个符号 X,
+    # 把 FIRST(X) 中的终结符加入 FOLLOW(B), 若 X 可空或 B 位于右部末尾, 则 FOLLOW(A) 包含于 FOLLOW(B)
+    table_follow_sets = {left: set() for left in grammar_dict}
+    table_follow_sets[grammar_begin].add('#')
+    edges = {left: set() for left in grammar_dict}
+    for left, right in productions:
+        for expr_idx, expr in enumerate(right):
+            if expr not in grammar_dict or expr == grammar_begin or right.index(expr) != expr_idx:
+                continue
+            if expr_idx < len(right) - 1:
                 # 对于产生式「A -> αBβ」
-                temp = first([symbols[expr_idx + 1]])
-                if '$' in temp:
-                    temp.remove('$')
-                    if left != expr:
-                        _follow += follow(left)
-                _follow += temp
-            else:
+                next = right[expr_idx + 1]
+                if next in grammar_dict:
+                    table_follow_sets[expr] |= first_sets[next]
+                    if next in nullable and left != expr:
+                        edges[left].add(expr)
+                else:
+                    table_follow_sets[expr].add(next)
+            elif left != expr:
                 # 对于产生式「A -> αB」
-                if left != expr:
-                    _follow += follow(left)
-    return _follow  
-    
\ No newline at end of file
+                edges[left].add(expr)
+    _propagate(table_follow_sets, edges)
+
+    global _nullable, _first_sets, _follow_sets, _table_follow_sets
+    _nullable = frozenset(nullable)
+    _first_sets = {left: frozenset(symbols) for left, symbols in first_sets.items()}
+    _follow_sets = {left: frozenset(symbols) for left, symbols in follow_sets.items()}
+    _table_follow_sets = {left: frozenset(symbols) for left, symbols in table_follow_sets.items()}
+
+
+def _propagate(follow_sets: dict, edges: dict):
+    """沿包含关系「FOLLOW(A) 包含于 FOLLOW(B)」(edges[A] 中的每个 B) 以工作表传播 FOLLOW 集合, 直到不动点"""
+    worklist = list(follow_sets)
+    queued = set(worklist)
+    while worklist:
+        left = worklist.pop()
+        queued.discard(left)
+        for expr in edges[left]:
+            if not follow_sets[left] <= follow_sets[expr]:
+                follow_sets[expr] |= follow_sets[left]
+                if expr not in queued:
+                    worklist.append(expr)
+                    queued.add(expr)
+
+
+def get_nullable() -> frozenset:
+    """访问可空的非终结符集合"""
+    if not _first_sets:
+        _analyse()
+    return _nullable
+
+
+def get_first_sets() -> dict:
+    """访问所有非终结符的 FIRST 集合, 集合中不含空串"""
+    if not _first_sets:
+        _analyse()
+    return _first_sets
+
+
+def get_follow_sets() -> dict:
+    """访问所有非终结符的 FOLLOW 集合"""
+    if not _follow_sets:
+        _analyse()
+    return _follow_sets
+
+
+def get_table_follow_sets() -> dict:
+    """
+    访问构造预测分析表使用的 FOLLOW 集合: 沿用原有实现的计算方法, 是真正的 FOLLOW 集合的超集,
+    多出的终结符使一些本应为「error」的表项填为可空的产生式, 推迟发现语法错误的位置.
+    测试样例期望的分析序列依赖这些表项, 因此预测分析表仍由它构造, 出错恢复和冲突分析使用 get_follow_sets
+    """
+    if not _table_follow_sets:
+        _analyse()
+    return _table_follow_sets
+
+
+def first_of_sequence(expr) -> frozenset:
+    """计算符号序列的 FIRST 集合, 序列可空时集合中包含空串「$」, 结果按序列缓存"""
+    expr = tuple(expr)
+    try:
+        return _sequence_first[expr]
+    except KeyError:
+        pass
+
+    first_sets = get_first_sets()
+    nullable = get_nullable()
+    _first = set()
+    for symbol in expr:
+        if symbol == '$':
+            continue
+        if symbol not in first_sets:
+            # 终结符
+            _first.add(symbol)
+            break
+        _first |= first_sets[symbol]
+        if symbol not in nullable:
+            break
+    else:
+        _first.add('$')
+
+    _sequence_first[expr] = frozenset(_first)
+    return _sequence_first[expr]
+
+
+def first(expr: list) -> list:
+    """计算表达式的 FIRST 集合"""
+    return list(first_of_sequence(expr))
+
+
+def follow(expr: str) -> list:
+    """计算表达式的 FOLLOW 集合"""
+    return list(get_follow_sets()[expr])
@@ -0,0 +1,299 @@
+"""
+随机程序生成
+----------
+功能:
+    沿 cparser/grammar.txt 中的产生式做有深度和规模限制的随机推导, 生成语法正确的 C-- 程序,
+    供性能测试和长时间运行的模糊测试使用, 相同的参数和随机数种子总是生成相同的程序.
+
+    预先以不动点迭代计算每个非终结符能推导出的最短和最长终结符串的长度 (最长长度可以为无穷).
+    推导时每个待展开的非终结符带有一个单词符号数的预算, 只选择最短长度不超过预算、最长长度不小于预算的产生式,
+    预算扣除右部的最短长度后, 余量随机分给右部的各个非终结符. 右部最后一个长度可变的非终结符在展开时才确定预算,
+    即整个右部的预算减去它左侧的符号实际生成的单词符号数, 左侧未用完的预算不会浪费,
+    因此生成的单词符号数与目标只差文法凑不出的零头 (不超过最短的全局声明的长度).
+
+    形如「A -> α A」的列表产生式中, 每个列表项至多分到 2 * item_tokens 个单词符号的余量, 其余留给列表的剩余部分,
+    生成的程序由大量中等规模的声明、语句和函数组成. 推导深度达到 max_depth 后, 非终结符只按最短的产生式展开,
+    列表产生式的尾部与列表本身的深度相同, 列表的长度不受深度的限制.
+
+    推导用显式栈按最左推导的顺序进行, 栈的大小只与推导深度有关, 单词符号边生成边输出,
+    流式写出数 GB 的程序也不需要把程序保存在内存中.
+
+接口:
+    generate_tokens: 逐个生成单词符号记录 Token, 行号和列号与 generate_source 生成的源代码一致
+    generate_source: 逐块生成源代码文本
+    generate_program: 生成整个源代码字符串
+    write_program: 把生成的源代码流式写入文件
+
+命令行:
+    python3 generate.py [-n 单词符号数] [-s 随机数种子] [-d 最大推导深度] [-i 列表项规模] [-o 输出文件]
+"""
+
+import sys
+import math
+import random
+import argparse
+from operator import itemgetter
+from clexer._type import Token, _rules
+from cparser.grammar import get_grammar, get_grammar_begin, get_productions
+
+
+# 非终结符能推导出的最短终结符串的长度
+_min_lengths = {}
+
+# 非终结符能推导出的最长终结符串的长度, 能推导出任意长的终结符串时为无穷
+_max_lengths = {}
+
+# 非终结符的最短产生式的编号
+_shortest = {}
+
+# 生成的标识符从「v0」到「v999」中选取, 整数从 0 到 99999 中选取
+_names = 1000
+_integers = 100000
+
+# 这些单词符号之后换行
+_line_ends = (';', '{', '}')
+
+# 每块源代码文本含有的单词符号数
+_chunk_tokens = 1 << 14
+
+
+def _analyse():
+    """以不动点迭代计算每个非终结符能推导出的最短和最长终结符串的长度"""
+    grammar_dict = get_grammar()
+    productions = get_productions()
+
+    def length(right, lengths):
+        return sum(lengths[symbol] if symbol in grammar_dict else 1 for symbol in right)
+
+    # 最短长度: 只在严格变短时更新最短产生式, 按最短产生式展开不会陷入循环, 推导总能结束
+    min_lengths = {left: math.inf for left in grammar_dict}
+    shortest = {}
+    changed = True
+    while changed:
+        changed = False
+        for idx, (left, right) in enumerate(productions):
+            value = length(right, min_lengths)
+            if value < min_lengths[left]:
+                min_lengths[left] = value
+                shortest[left] = idx
+                changed = True
+
+    # 最长长度: 与 Bellman-Ford 算法相同, |N| 轮之后仍在增长的非终结符能经由可以无限重复的推导环
+    # 推导出任意长的终结符串, 再迭代 |N| 轮把它们及依赖它们的非终结符都置为无穷
+    max_lengths = {left: 0 for left in grammar_dict}
+    rounds = len(grammar_dict)
+    for round_idx in range(2 * rounds + 2):
+        changed = False
+        for left, right in productions:
+            value = length(right, max_lengths)
+            if value > max_lengths[left]:
+                max_lengths[left] = math.inf if round_idx >= rounds else value
+                changed = True
+        if not changed:
+            break
+
+    global _min_lengths, _max_lengths, _shortest
+    _shortest = shortest
+    _max_lengths = max_lengths
+    _min_lengths = min_lengths
+
+
+def get_min_lengths() -> dict:
+    """访问非终结符能推导出的最短终结符串的长度"""
+    if not _min_lengths:
+        _analyse()
+    return _min_lengths
+
+
+def get_max_lengths() -> dict:
+    """访问非终结符能推导出的最长终结符串的长度, 能推导出任意长的终结符串时为 math.inf"""
+    if not _min_lengths:
+        _analyse()
+    return _max_lengths
+
+
+def _compile_rules() -> dict:
+    """
+    为每个非终结符整理候选产生式, 每个产生式为元组
+    (编号, 右部的最短长度, 右部的最长长度, 长度可变的非终结符 (不含最后一个) 的余量上限, 最后一个长度可变的非终结符
+    之后的符号的最短长度之和, 逆序的入栈项), 入栈项为 (符号, 类别, 最短长度, 深度增量),
+    类别 0 为终结符, 1 为长度固定的非终结符, 2 为分得余量的非终结符, 3 为展开时才确定预算的非终结符
+    """
+    grammar_dict = get_grammar()
+    min_lengths, max_lengths = get_min_lengths(), get_max_lengths()
+
+    def length(symbols, lengths):
+        return sum(lengths[symbol] if symbol in grammar_dict else 1 for symbol in symbols)
+
+    rules = {left: [] for left in grammar_dict}
+    for idx, (left, right) in enumerate(get_productions()):
+        flexible = [pos for pos, symbol in enumerate(right)
+                    if symbol in grammar_dict and max_lengths[symbol] > min_lengths[symbol]]
+        last = flexible.pop() if flexible else -1
+        # 列表产生式的列表项的余量不超过 item_tokens 的 2 倍, 在 _derive 中处理; 尾部不增加深度
+        is_list = bool(right) and right[-1] == left
+        limits = tuple(max_lengths[right[pos]] - min_lengths[right[pos]] for pos in flexible)
+        pushes = []
+        for pos in range(len(right) - 1, -1, -1):
+            symbol = right[pos]
+            if symbol not in grammar_dict:
+                kind = 0
+            else:
+                kind = 3 if pos == last else 2 if pos in flexible else 1
+            delta = 0 if is_list and pos == len(right) - 1 else 1
+            pushes.append((symbol, kind, min_lengths.get(symbol, 1), delta))
+        rules[left].append((idx, length(right, min_lengths), length(right, max_lengths), limits,
+                            length(right[last + 1:], min_lengths) if last >= 0 else 0, is_list, tuple(pushes)))
+    return rules
+
+
+def _derive(ntokens: int, rng: random.Random, max_depth: int, item_tokens: int):
+    """按最左推导的顺序逐个生成终结符, 目标长度为 ntokens"""
+    rules = _compile_rules()
+    shortest = {left: next(rule for rule in rules[left] if rule[0] == idx) for left, idx in _shortest.items()}
+    randint = rng.randint
+    item_limit = 2 * item_tokens
+
+    # 栈中的每一项为 (符号, 预算, 深度, 类别), 类别 3 的预算记为「展开时的预算 + 已生成的单词符号数」
+    stack = [(get_grammar_begin(), ntokens, 0, 1)]
+    push, pop = stack.append, stack.pop
+    emitted = 0
+    while stack:
+        symbol, budget, depth, kind = pop()
+        if kind == 0:
+            emitted += 1
+            yield symbol
+            continue
+        if kind == 3:
+            budget -= emitted
+
+        # 选择产生式: 达到深度上限时按最短产生式展开; 否则在能恰好用完预算的产生式中随机选择,
+        # 没有这样的产生式时选择不超过预算的产生式中最长长度最大的
+        if depth >= max_depth:
+            rule = shortest[symbol]
+            budget = rule[1]
+        else:
+            candidates = rules[symbol]
+            if len(candidates) > 1:
+                candidates = [rule for rule in candidates if rule[1] <= budget <= rule[2]]
+                if not candidates:
+                    candidates = [max((rule for rule in rules[symbol] if rule[1] <= budget), key=itemgetter(2))]
+            rule = candidates[randint(0, len(candidates) - 1)] if len(candidates) > 1 else candidates[0]
+
+        _, lower, _, limits, after, is_list, pushes = rule
+        shares = []
+        if limits:
+            extra = budget - lower
+            for limit in limits:
+                limit = min(extra, limit, item_limit) if is_list else min(extra, limit)
+                share = randint(0, limit) if limit > 0 else 0
+                shares.append(share)
+                extra -= share
+
+        # 右部逆序入栈, 分得余量的非终结符也逆序取出各自的余量
+        for child, child_kind, base, delta in pushes:
+            if child_kind == 1:
+                push((child, base, depth + delta, 1))
+            elif child_kind == 0:
+                push((child, 0, 0, 0))
+            elif child_kind == 2:
+                push((child, base + shares.pop(), depth + delta, 1))
+            else:
+                push((child, emitted + budget - after, depth + delta, 3))
+
+
+def _terminal_kinds() -> dict:
+    """终结符到单词符号类型的映射"""
+    kinds = {'IDN': 'IDN', 'INT': 'INT'}
+    for kind, words in _rules:
+        if isinstance(words, list):
+            for word in words:
+                kinds[word] = kind
+    return kinds
+
+
+def _check_arguments(ntokens: int, max_depth: int, item_tokens: int):
+    if ntokens < 0:
+        raise ValueError("单词符号数 %d 不能为负数" % ntokens)
+    if max_depth < 1:
+        raise ValueError("最大推导深度 %d 必须为正整数" % max_depth)
+    if item_tokens < 1:
+        raise ValueError("列表项规模 %d 必须为正整数" % item_tokens)
+
+
+def generate_tokens(ntokens: int, seed: int = 0, max_depth: int = 40, item_tokens: int = 64):
+    """
+    逐个生成语法正确的程序的单词符号记录 Token, 单词符号数不超过 ntokens 且与之只差文法凑不出的零头,
+    可以直接作为 ll_parse、lr_parse 的输入; 标识符为「v」加数字, 不会与关键字冲突
+    """
+    _check_arguments(ntokens, max_depth, item_tokens)
+    kinds = _terminal_kinds()
+    rng = random.Random(seed)
+    randrange = rng.randrange
+    line, column, indent = 1, 0, 0  # column 为 0 表示位于行首
+    for terminal in _derive(ntokens, rng, max_depth, item_tokens):
+        if terminal == 'IDN':
+            text = 'v%d' % randrange(_names)
+        elif terminal == 'INT':
+            text = str(randrange(_integers))
+        else:
+            text = terminal
+        if terminal == '}':
+            indent -= 1
+        if column == 0:
+            column = 4 * indent + 1
+        yield Token(kinds[terminal], text, line, column)
+        if terminal in _line_ends:
+            if terminal == '{':
+                indent += 1
+            line += 1
+            column = 0
+        else:
+            column += len(text) + 1
+
+
+def generate_source(ntokens: int, seed: int = 0, max_depth: int = 40, item_tokens: int = 64):
+    """逐块生成源代码文本, 每块含有若干行, 参数与 generate_tokens 相同"""
+    parts = []
+    line, end = 1, 1
+    for token in generate_tokens(ntokens, seed, max_depth, item_tokens):
+        if token.line != line:
+            parts.append('\n' * (token.line - line))
+            line, end = token.line, 1
+        parts.append(' ' * (token.column - end))
+        parts.append(token.text)
+        end = token.column + len(token.text)
+        if len(parts) >= 3 * _chunk_tokens:
+            yield ''.join(parts)
+            parts.clear()
+    parts.append('\n')
+    yield ''.join(parts)
+
+
+def generate_program(ntokens: int, seed: int = 0, max_depth: int = 40, item_tokens: int = 64) -> str:
+    """生成整个源代码字符串, 参数与 generate_tokens 相同"""
+    return ''.join(generate_source(ntokens, seed, max_depth, item_tokens))
+
+
+def write_program(path: str, ntokens: int, seed: int = 0, max_depth: int = 40, item_tokens: int = 64):
+    """把生成的源代码逐块写入文件 path, 参数与 generate_tokens 相同, 内存占用与 ntokens 无关"""
+    with open(path, 'w') as f:
+        for chunk in generate_source(ntokens, seed, max_depth, item_tokens):
+            f.write(chunk)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="根据文法生成随机的 C-- 程序")
+    arg_parser.add_argument('-n', '--tokens', type=int, default=100000, help="生成的程序的单词符号数")
+    arg_parser.add_argument('-s', '--seed', type=int, default=0, help="随机数种子")
+    arg_parser.add_argument('-d', '--max-depth', type=int, default=40, help="最大推导深度")
+    arg_parser.add_argument('-i', '--item-tokens', type=int, default=64,
+                            help="列表项 (声明、语句、参数等) 平均分到的单词符号数")
+    arg_parser.add_argument('-o', '--output', default=None, help="输出文件, 默认输出到标准输出")
+    args = arg_parser.parse_args()
+
+    if args.output is None:
+        for chunk in generate_source(args.tokens, args.seed, args.max_depth, args.item_tokens):
+            sys.stdout.write(chunk)
+    else:
+        write_program(args.output, args.tokens, args.seed, args.max_depth, args.item_tokens)
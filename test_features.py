@@ -0,0 +1,650 @@
+"""
+功能测试
+------
+在 samples 目录下的测试样例上检查词法分析器和语法分析器的各项功能,
+每项检查输出一行 [OK] 或 [Failed], 格式与 test.py 相同, 有检查失败时以状态码 1 退出.
+
+用法:
+    python3 test_features.py
+"""
+import os
+import sys
+import importlib.util
+import random
+import shutil
+import tempfile
+import threading
+import clexer
+import cparser
+import generate
+import batch
+from clexer import scanner, generator
+from clexer._type import _rules
+from clexer.trace import read_trace, _buffer_records
+from cparser import lr_table, ll_table, cache, ll_parser, lr_parser, util, conflicts, codegen
+from cparser.grammar import get_grammar_begin, get_productions
+from cparser.tokens import input_symbols
+
+
+# 测试样例目录
+samples_dir = 'samples'
+
+# 失败的检查数
+failed = 0
+
+# 增量分析检查中每个测试样例上的随机编辑次数
+incremental_edits = 100
+
+# 随机编辑插入的文本
+_edit_texts = ('', ' ', '\n', 'a', '1', '=', '==', ';', '{ }', 'int x ;', 'return', '(')
+
+# 出错恢复模式下各测试样例应报告的语法错误, 未列出的样例没有语法错误
+_expected_errors = {
+    '08': [cparser.ParseError(5, clexer.Token('OP', '=', 1, 11), 'varDef', '=')],
+    '10': [cparser.ParseError(4, clexer.Token('KW', 'void', 2, 1), 'argVarDecl', 'void'),
+           cparser.ParseError(11, clexer.Token('IDN', 'b', 4, 5), 'argVarDecl', 'IDN'),
+           cparser.ParseError(14, clexer.Token('KW', 'return', 5, 5), ';', 'return'),
+           cparser.ParseError(18, clexer.Token('SE', '}', 6, 1), ';', '}')],
+}
+
+
+def report(name: str, ok: bool, detail: str = ''):
+    """输出一项检查的结果"""
+    global failed
+    if ok:
+        print('[\033[32mOK\033[0m]{}'.format(name))
+    else:
+        failed += 1
+        print('[\033[31mFailed\033[0m]{}{}'.format(name, ': ' + detail if detail else ''))
+
+
+def sample_names() -> list:
+    """所有测试样例的名称, 按名称排序"""
+    return sorted(name for name in os.listdir(samples_dir) if os.path.isdir(os.path.join(samples_dir, name)))
+
+
+def sample_source(name: str) -> str:
+    """测试样例的源代码"""
+    with open(os.path.join(samples_dir, name, '{}.txt'.format(name))) as f:
+        return f.read()
+
+
+def sample_valid(name: str) -> bool:
+    """测试样例是否为合法程序, 即期望的 LL(1) 分析序列以「accept」结束"""
+    with open(os.path.join(samples_dir, name, '{}_grammar.txt'.format(name))) as f:
+        return f.read().splitlines()[-1] == 'EOF#EOF\taccept'
+
+
+def ll_output(tokens) -> str:
+    """用 ll_parse 完整地分析单词符号记录的序列, 返回文本格式的分析序列"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file = os.path.join(temp_dir, 'grammar.txt')
+        try:
+            cparser.ll_parse(tokens, temp_file)
+        except NotImplementedError:
+            pass
+        with open(temp_file) as f:
+            return f.read()
+
+
+def incremental_output(parser: cparser.IncrementalParser) -> str:
+    """增量语法分析器当前的分析序列, 文本格式"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file = os.path.join(temp_dir, 'grammar.txt')
+        parser.write(temp_file)
+        with open(temp_file) as f:
+            return f.read()
+
+
+def accepts(table: lr_table.LRTable, source: str) -> bool:
+    """用编译后的 LR 分析表分析字符串形式的源代码, 接受时返回 True"""
+    from cparser import lr_parse
+    try:
+        lr_parse(clexer.tokenize_str(source), None, parsing_table=table, trace=None)
+    except NotImplementedError:
+        return False
+    return True
+
+
+def check_lr1_closure():
+    """
+    LR(1) 闭包的展望符号为 FIRST(βa): β 的第一个符号可空时 (如「varDef -> IDN argVarDef」之后的 argVarDecl),
+    只取 FIRST(β[0]a) 会漏掉展望符号, 曾导致 LR(1) 分析器拒绝「int a;」.
+    直接构造分析表, 不经过分析表缓存; 构造完成后驻留的 LR 项目须已清空
+    """
+    lr_table._generate_table('lr1')
+    table = lr_table.LRTable.from_dataframe(lr_table._parsing_tables['lr1'])
+    for source in ('int a;', 'int a, b = 1;', 'void f ( ) { int a ; return ; }'):
+        report('Test LR(1) closure lookaheads for {!r}'.format(source), accepts(table, source))
+    report('Test LR item intern table is cleared after building a table', not lr_table._interned_items)
+
+
+def check_lr_methods():
+    """LALR(1) 和 LR(1) 分析器须接受每个合法的测试样例, 并拒绝其余的测试样例"""
+    for method, method_name in (('lalr1', 'LALR(1)'), ('lr1', 'LR(1)')):
+        table = lr_table.get_compiled_table(method)
+        for name in sample_names():
+            valid = sample_valid(name)
+            report('Test {} {} {}'.format(method_name, 'accepts' if valid else 'rejects', name),
+                   accepts(table, sample_source(name)) == valid)
+
+
+def check_table_cache():
+    """
+    分析表缓存在临时目录中保存后须能原样加载, 缓存格式版本或文法文件改变后、缓存文件被截断后须视为失效,
+    版本和文法恢复后缓存重新有效
+    """
+    arrays = ll_table.get_compiled_table().to_arrays()
+    saved_dir, saved_grammar, saved_version = cache._cache_dir, cache._grammar_path, cache._CACHE_VERSION
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache._cache_dir = temp_dir
+        cache.save('ll1', arrays)
+        report('Test table cache round-trip', cache.load('ll1') == arrays)
+
+        cache._CACHE_VERSION = saved_version + 1
+        report('Test table cache invalidated by a cache version change', cache.load('ll1') is None)
+        cache._CACHE_VERSION = saved_version
+        report('Test table cache valid again after restoring the cache version', cache.load('ll1') == arrays)
+
+        cache._grammar_path = os.path.join(temp_dir, 'grammar.txt')
+        shutil.copyfile(saved_grammar, cache._grammar_path)
+        report('Test table cache valid for an unchanged copy of the grammar', cache.load('ll1') == arrays)
+        with open(cache._grammar_path, 'a') as f:
+            f.write('\n')
+        report('Test table cache invalidated by a grammar change', cache.load('ll1') is None)
+        cache._grammar_path = saved_grammar
+
+        path = cache._cache_path('ll1')
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-4])
+        report('Test table cache invalidated by a truncated file', cache.load('ll1') is None)
+    finally:
+        cache._cache_dir, cache._grammar_path, cache._CACHE_VERSION = saved_dir, saved_grammar, saved_version
+        shutil.rmtree(temp_dir)
+
+
+def check_chunked_scan():
+    """
+    以极小的文本块 (chunk_size 为 1、2、3) 流式扫描时, 每个 token 都可能跨越文本块的边界,
+    输出须与期望的单词符号序列相同, 单词符号记录 (含行号和列号) 须与一次扫描整个字符串相同
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file = os.path.join(temp_dir, 'lexical.txt')
+        for name in sample_names():
+            input_file = os.path.join(samples_dir, name, '{}.txt'.format(name))
+            with open(os.path.join(samples_dir, name, '{}_lexical.txt'.format(name))) as f:
+                expected = f.read()
+            tokens = list(clexer.tokenize_str(sample_source(name)))
+            for chunk_size in (1, 2, 3):
+                clexer.scan(input_file, temp_file, chunk_size=chunk_size)
+                with open(temp_file) as f:
+                    ok = f.read() == expected
+                ok = ok and list(clexer.tokenize(input_file, chunk_size)) == tokens
+                report('Test lexer with chunk_size={} for {}'.format(chunk_size, name), ok)
+
+
+def _trace_outputs(write, temp_dir: str, fmt: str, magic: bytes) -> tuple:
+    """
+    分别以文本格式和二进制格式调用 write(output, trace) 输出分析序列 (忽略语法错误),
+    返回文本格式的内容和二进制格式读回后按 fmt 格式化的内容
+    """
+    outputs = []
+    for trace in ('text', 'binary'):
+        output = os.path.join(temp_dir, 'trace.' + trace)
+        try:
+            write(output, trace)
+        except NotImplementedError:
+            pass
+        outputs.append(output)
+    with open(outputs[0]) as f:
+        text = f.read()
+    return text, ''.join(fmt % record for record in read_trace(outputs[1], magic))
+
+
+def check_binary_trace():
+    """
+    词法分析、LL(1) 分析和 LR 分析以二进制格式输出的分析序列由 read_trace 读回并按文本格式格式化后,
+    须与文本格式的输出相同. 除测试样例外还检查一个生成的程序, 其记录数超过缓冲区的容量, 需要多次整块写出
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        inputs = [(name, os.path.join(samples_dir, name, '{}.txt'.format(name))) for name in sample_names()]
+        generated = os.path.join(temp_dir, 'generated.txt')
+        generate.write_program(generated, _buffer_records + 1000)
+        inputs.append(('generated', generated))
+
+        for name, input_file in inputs:
+            writers = (
+                ('lexer', scanner._trace_format, scanner._trace_magic,
+                 lambda output, trace: clexer.scan(input_file, output, trace=trace)),
+                ('LL(1) parser', ll_parser._trace_format, ll_parser._trace_magic,
+                 lambda output, trace: cparser.ll_parse(clexer.tokenize(input_file), output, trace=trace)),
+                ('LALR(1) parser', lr_parser._trace_format, lr_parser._trace_magic,
+                 lambda output, trace: cparser.lr_parse(clexer.tokenize(input_file), output, 'lalr1', trace=trace)),
+            )
+            for what, fmt, magic, write in writers:
+                text, decoded = _trace_outputs(write, temp_dir, fmt, magic)
+                report('Test binary {} trace round-trip for {}'.format(what, name), bool(text) and decoded == text)
+
+
+def check_follow_sets():
+    """
+    FOLLOW 集合须与按定义朴素迭代的结果相同: 考察非终结符在产生式右部的每一次出现, 加入其后整个后缀的 FIRST 集合,
+    后缀可空时加入产生式左部的 FOLLOW 集合. 表达式之后只能是「)」「,」「;」
+    """
+    productions = get_productions()
+    expected = {left: set() for left, _ in productions}
+    expected[get_grammar_begin()].add('#')
+    changed = True
+    while changed:
+        changed = False
+        for left, right in productions:
+            for idx, symbol in enumerate(right):
+                if symbol not in expected:
+                    continue
+                suffix_first = util.first_of_sequence(right[idx + 1:])
+                new = (suffix_first - {'$'}) | (expected[left] if '$' in suffix_first else set())
+                if not new <= expected[symbol]:
+                    expected[symbol] |= new
+                    changed = True
+    follow_sets = util.get_follow_sets()
+    report('Test FOLLOW sets match the definition', follow_sets == expected)
+    report("Test FOLLOW(exp) is ')', ',' and ';'", follow_sets['exp'] == {')', ',', ';'})
+
+
+def check_recovery():
+    """
+    出错恢复模式下, 每个测试样例报告的语法错误须与 _expected_errors 相同,
+    且第一个错误须与期望的分析序列最后一条「error」记录的栈顶符号和输入符号一致
+    """
+    for name in sample_names():
+        errors = []
+        cparser.ll_parse(clexer.tokenize(os.path.join(samples_dir, name, '{}.txt'.format(name))), None,
+                         trace=None, errors=errors)
+        expected = _expected_errors.get(name, [])
+        detail = '' if errors == expected else 'got {!r}'.format(errors)
+        if errors and not detail:
+            with open(os.path.join(samples_dir, name, '{}_grammar.txt'.format(name))) as f:
+                last = f.read().splitlines()[-1]
+            if last != '{}#{}\terror'.format(errors[0].expected, errors[0].found):
+                detail = 'first error {!r} does not match {!r}'.format(errors[0], last)
+        report('Test error recovery reports the expected errors for {}'.format(name), not detail, detail)
+
+
+def check_incremental():
+    """
+    在每个测试样例上进行随机编辑 (固定随机数种子), 每次编辑及撤销编辑之后,
+    增量词法分析的单词符号序列须与完整的重新扫描相同, 增量语法分析的分析序列须与 ll_parse 完整的重新分析相同.
+    检查点间隔取 4, 使重新分析跨越多个检查点
+    """
+    rng = random.Random(0)
+    for name in sample_names():
+        source = sample_source(name)
+        lexer = clexer.IncrementalLexer(source)
+        parser = cparser.IncrementalParser(interval=4)
+        parser.parse(lexer.tokens())
+        detail = ''
+        for step in range(incremental_edits):
+            offset = rng.randint(0, len(source))
+            removed = rng.randint(0, min(3, len(source) - offset))
+            inserted = rng.choice(_edit_texts)
+            # 编辑后再撤销, 使源代码保持原样, 每次编辑都在完整的程序上进行
+            edits = ((offset, removed, inserted), (offset, len(inserted), source[offset:offset + removed]))
+            for offset, removed, inserted in edits:
+                parser.update(*lexer.edit(offset, removed, inserted))
+                source = source[:offset] + inserted + source[offset + removed:]
+                tokens = list(clexer.tokenize_str(source))
+                if lexer.tokens() != tokens:
+                    detail = 'tokens differ after edit {} {!r}'.format(step, (offset, removed, inserted))
+                elif incremental_output(parser) != ll_output(tokens):
+                    detail = 'records differ after edit {} {!r}'.format(step, (offset, removed, inserted))
+                if detail:
+                    break
+            if detail:
+                break
+        report('Test incremental edits match a full re-analysis for {}'.format(name), not detail, detail)
+
+
+def _tree_problem(tree: cparser.SyntaxTree, tokens: list) -> str:
+    """
+    检查语法树的形状和叶结点: 根结点为文法开始符号, 每个内部结点与其子结点构成文法的一个产生式,
+    先序遍历中的终结符叶结点依次对应输入的每个单词符号, 且符号与单词符号的输入符号一致.
+    返回发现的第一个问题, 没有问题时返回空字符串
+    """
+    productions = {(left, tuple(right)) for left, right in get_productions()}
+    expected = list(input_symbols(tokens))[:-1]
+    symbols = tree.symbols
+    if tree.root < 0 or symbols[tree.symbol[tree.root]] != get_grammar_begin():
+        return 'root is not {}'.format(get_grammar_begin())
+    leaves = 0
+    for node, _ in tree.walk():
+        symbol = symbols[tree.symbol[node]]
+        children = tuple(symbols[tree.symbol[child]] for child in tree.children(node))
+        if symbol in util.get_grammar():
+            if (symbol, children) not in productions:
+                return 'node {} {} -> {} is not a production'.format(node, symbol, ' '.join(children))
+            continue
+        if children:
+            return 'terminal node {} {} has children'.format(node, symbol)
+        if tree.token[node] != leaves or leaves >= len(expected) or expected[leaves] != symbol:
+            return 'leaf {} {} maps to token {}, expected token {}'.format(node, symbol, tree.token[node], leaves)
+        leaves += 1
+    if leaves != len(expected):
+        return '{} leaves for {} tokens'.format(leaves, len(expected))
+    return ''
+
+
+def check_syntax_tree():
+    """
+    LL(1)、LALR(1) 和 LR(1) 分析器在每个合法的测试样例上构造的语法树须通过 _tree_problem 的检查,
+    且文法没有二义性, 三者的语法树须完全相同
+    """
+    for name in sample_names():
+        if not sample_valid(name):
+            continue
+        tokens = list(clexer.tokenize_str(sample_source(name)))
+        trees = (
+            ('LL(1)', cparser.ll_parse(tokens, None, trace=None, tree=True)),
+            ('LALR(1)', cparser.lr_parse(tokens, None, 'lalr1', trace=None, tree=True)),
+            ('LR(1)', cparser.lr_parse(tokens, None, 'lr1', trace=None, tree=True)),
+        )
+        for method_name, tree in trees:
+            detail = _tree_problem(tree, tokens)
+            report('Test {} syntax tree shape and leaves for {}'.format(method_name, name), not detail, detail)
+        formats = [tree.format(tokens) for _, tree in trees]
+        report('Test LL(1) and LR syntax trees agree for {}'.format(name), formats[1:] == formats[:1] * 2)
+
+
+def _ll_max_stack_depth(tree: cparser.SyntaxTree) -> int:
+    """
+    由 LL(1) 分析构造的语法树推算符号栈的最大深度: 推导和匹配按先序遍历的顺序进行,
+    推导以子结点代替栈顶的非终结符, 匹配弹出栈顶的终结符, 初始的符号栈为「# 文法开始符号」
+    """
+    nterminals = len(tree.symbols) - len(util.get_grammar())
+    depth = peak = 2
+    for node, _ in tree.walk():
+        if tree.symbol[node] >= nterminals:
+            depth += len(list(tree.children(node))) - 1
+            peak = max(peak, depth)
+        else:
+            depth -= 1
+    return peak
+
+
+def _parse_with_stats(method: str, stats: clexer.Stats):
+    """用默认的分析表分析一个小程序, 分析表的来源记录到 stats 中"""
+    tokens = clexer.tokenize_str('int a;')
+    if method == 'll1':
+        cparser.ll_parse(tokens, None, trace=None, stats=stats)
+    else:
+        cparser.lr_parse(tokens, None, method, trace=None, stats=stats)
+
+
+def check_stats():
+    """
+    统计信息的计数须与分析序列一致: 单词符号数为单词符号记录数, 分析步数、匹配或移进数、推导或规约数分别为
+    分析序列中的记录数和「move」「reduction」记录数, LL(1) 的查表次数为推导次数, LR 的查表次数为分析步数与规约次数之和,
+    LL(1) 符号栈的最大深度须与由语法树推算的结果相同.
+    DFA 和分析表的来源在临时缓存目录中依次为 'miss'、'hit', 已在内存中时为 'memory'
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        temp_file = os.path.join(temp_dir, 'trace.txt')
+        for name in sample_names():
+            if not sample_valid(name):
+                continue
+            input_file = os.path.join(samples_dir, name, '{}.txt'.format(name))
+            tokens = list(clexer.tokenize(input_file))
+            stats = clexer.Stats()
+            clexer.scan(input_file, temp_file, stats=stats)
+            report('Test stats token count for {}'.format(name), stats.counters['tokens'] == len(tokens))
+
+            for method, method_name in (('ll1', 'LL(1)'), ('lalr1', 'LALR(1)')):
+                stats = clexer.Stats()
+                if method == 'll1':
+                    tree = cparser.ll_parse(tokens, temp_file, tree=True, stats=stats)
+                else:
+                    cparser.lr_parse(tokens, temp_file, method, stats=stats)
+                with open(temp_file) as f:
+                    actions = [line.rsplit('\t', 1)[1] for line in f.read().splitlines()]
+                reductions = actions.count('reduction')
+                expected = {'steps': len(actions), 'moves': actions.count('move'), 'reductions': reductions,
+                            'errors': 0, 'lookups': reductions if method == 'll1' else len(actions) + reductions}
+                counters = {key: stats.counters.get(key) for key in expected}
+                detail = '' if counters == expected else 'got {!r}, expected {!r}'.format(counters, expected)
+                if not detail and method == 'll1' and stats.counters['max_stack_depth'] != _ll_max_stack_depth(tree):
+                    detail = 'max_stack_depth {} != {}'.format(stats.counters['max_stack_depth'],
+                                                               _ll_max_stack_depth(tree))
+                report('Test {} stats counters for {}'.format(method_name, name), not detail, detail)
+
+    saved_ll, saved_lr = ll_table._compiled_table, dict(lr_table._compiled_tables)
+    saved_dirs = cache._cache_dir, generator._cache_dir
+    temp_dir = tempfile.mkdtemp()
+    try:
+        cache._cache_dir = generator._cache_dir = temp_dir
+        sources = {'ll1': [], 'lalr1': [], 'dfa': []}
+        for _ in range(2):
+            ll_table._compiled_table = None
+            lr_table._compiled_tables.pop('lalr1', None)
+            for method in ('ll1', 'lalr1'):
+                stats = clexer.Stats()
+                _parse_with_stats(method, stats)
+                sources[method].append(stats.caches.get(method))
+            stats = clexer.Stats()
+            generator.build_lexer(_rules, stats=stats)
+            sources['dfa'].append(stats.caches.get('dfa'))
+        for method in ('ll1', 'lalr1'):
+            stats = clexer.Stats()
+            _parse_with_stats(method, stats)
+            sources[method].append(stats.caches.get(method))
+        stats = clexer.Stats()
+        clexer.scan(os.path.join(samples_dir, '00', '00.txt'), None, trace=None, stats=stats)
+        sources['dfa'].append(stats.caches.get('dfa'))
+        for what, got in sources.items():
+            report('Test stats cache sources for {}'.format(what), got == ['miss', 'hit', 'memory'],
+                   'got {!r}'.format(got))
+    finally:
+        ll_table._compiled_table = saved_ll
+        lr_table._compiled_tables.clear()
+        lr_table._compiled_tables.update(saved_lr)
+        cache._cache_dir, generator._cache_dir = saved_dirs
+        shutil.rmtree(temp_dir)
+
+
+# 各分析法的分析表中应有的冲突数
+_expected_conflicts = {'ll1': 0, 'lr0': 91, 'lalr1': 0, 'lr1': 0}
+
+
+def check_conflicts():
+    """
+    冲突分析器报告的冲突数须与 _expected_conflicts 相同 (C-- 文法不是 LR(0) 文法);
+    每个 LR(0) 冲突的动作至少有两个, 保留的动作是其中之一, 且沿最短前缀在转换图上从初始状态出发须到达冲突状态
+    """
+    found = conflicts.find_conflicts(tuple(_expected_conflicts))
+    for method, expected in _expected_conflicts.items():
+        count = sum(1 for conflict in found if conflict.method == method)
+        report('Test {} conflict count is {}'.format(conflicts._names[method], expected), count == expected,
+               'got {}'.format(count))
+
+    _, goto = lr_table._canonical_collection(lookahead=False)
+    detail = ''
+    for conflict in found:
+        if conflict.method != 'lr0':
+            continue
+        state = 0
+        for symbol in conflict.prefix:
+            state = goto[state].get(symbol, -1)
+            if state < 0:
+                break
+        if len(conflict.actions) < 2 or conflict.chosen not in conflict.actions:
+            detail = 'bad actions in {}'.format(conflicts.format_conflict(conflict))
+        elif state != conflict.state:
+            detail = 'prefix leads to state {} in {}'.format(state, conflicts.format_conflict(conflict))
+        if detail:
+            break
+    report('Test LR(0) conflicts have valid actions and shortest prefixes', not detail, detail)
+
+
+def _load_module(path: str, name: str):
+    """从文件 path 导入模块"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_codegen():
+    """
+    codegen 为每种分析法生成的独立语法分析器模块须是最新的, 并且在每个测试样例的词法分析结果文件
+    和一个生成的程序上输出与 ll_parse / lr_parse 完全相同的分析序列 (包括出错时的「error」记录)
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        inputs = [(name, os.path.join(samples_dir, name, '{}_lexical.txt'.format(name))) for name in sample_names()]
+        generated = os.path.join(temp_dir, 'generated.txt')
+        generate.write_program(generated, 2000)
+        inputs.append(('generated', os.path.join(temp_dir, 'generated_lexical.txt')))
+        clexer.scan(generated, inputs[-1][1])
+
+        for method in codegen._methods:
+            path = os.path.join(temp_dir, 'cminus_{}.py'.format(method))
+            codegen.write_module(path, method)
+            report('Test generated {} module is current'.format(codegen._names[method]), codegen.is_current(path))
+            module = _load_module(path, 'cminus_{}'.format(method))
+            if method == 'll1':
+                reference = cparser.ll_parse
+            else:
+                reference = lambda input, output: cparser.lr_parse(input, output, method)
+            for name, input_file in inputs:
+                outputs = []
+                for parse in (module.parse, reference):
+                    output = os.path.join(temp_dir, 'grammar{}.txt'.format(len(outputs)))
+                    try:
+                        parse(input_file, output)
+                    except NotImplementedError:
+                        pass
+                    with open(output) as f:
+                        outputs.append(f.read())
+                report('Test generated {} module trace matches for {}'.format(codegen._names[method], name),
+                       bool(outputs[0]) and outputs[0] == outputs[1])
+
+
+# 多线程检查的线程数和每个线程的重复次数
+thread_count = 8
+thread_rounds = 3
+
+
+def check_threads():
+    """
+    多个线程同时使用同一个 Lexer 和同一个 Parser (LL(1) 和 LALR(1)) 分析所有测试样例,
+    每个线程写入自己的输出文件, 输出须与单线程的分析结果相同.
+    检查期间缩短线程切换的间隔, 使各线程的扫描和分析充分交错
+    """
+    lexer = clexer.Lexer()
+    parsers = {method: cparser.Parser(method) for method in ('ll1', 'lalr1')}
+    inputs = [os.path.join(samples_dir, name, '{}.txt'.format(name)) for name in sample_names()]
+
+    def run(output: str) -> list:
+        results = []
+        for input_file in inputs:
+            for parser in parsers.values():
+                try:
+                    parser.parse(lexer.tokenize(input_file), output)
+                except NotImplementedError:
+                    pass
+                with open(output) as f:
+                    results.append(f.read())
+        return results
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        expected = run(os.path.join(temp_dir, 'expected.txt'))
+        results = [None] * thread_count
+        barrier = threading.Barrier(thread_count)
+
+        def worker(idx: int):
+            output = os.path.join(temp_dir, 'thread{}.txt'.format(idx))
+            barrier.wait()
+            results[idx] = [run(output) for _ in range(thread_rounds)]
+
+        threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(thread_count)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setswitchinterval(interval)
+        bad = [idx for idx, rounds in enumerate(results) if rounds != [expected] * thread_rounds]
+        report('Test shared Lexer and Parser in {} threads'.format(thread_count), not bad,
+               'threads {} differ'.format(bad))
+
+
+def _batch_problem(results: list, sources: list, max_errors: int = None) -> str:
+    """
+    检查 compile_files 的结果: 按输入顺序排列, 测试样例的输出文件与期望的输出相同 (出错恢复时只检查单词符号序列),
+    合法的样例没有错误, 其余样例、词法错误和不存在的文件都报告错误. 返回发现的第一个问题, 没有问题时返回空字符串
+    """
+    if [result.source for result in results] != sources:
+        return 'results out of order: {!r}'.format([result.source for result in results])
+    for result in results:
+        name = os.path.splitext(os.path.basename(result.source))[0]
+        if name in sample_names():
+            for output, suffix in ((result.lexical, 'lexical'), (result.grammar, 'grammar')):
+                if suffix == 'grammar' and max_errors is not None:
+                    continue
+                with open(output) as f, open(os.path.join(samples_dir, name, '{}_{}.txt'.format(name, suffix))) as g:
+                    if f.read() != g.read():
+                        return '{} differs for {}'.format(suffix, name)
+            if sample_valid(name) != (result.error is None):
+                return 'unexpected error {!r} for {}'.format(result.error, name)
+            if max_errors is not None and name in _expected_errors:
+                expected = '发现 {} 个语法错误'.format(len(_expected_errors[name]))
+                if result.error != expected or result.messages.count('语法分析错误') != len(_expected_errors[name]):
+                    return 'got {!r} and {!r} for {}'.format(result.error, result.messages, name)
+        elif name == 'missing':
+            if result.error != '打开文件 {} 失败'.format(result.source):
+                return 'got {!r} for a missing file'.format(result.error)
+        elif result.error is None or not result.error.startswith('发现 1 个词法错误') or \
+                '无法识别的字符' not in result.messages:
+            return 'got {!r} and {!r} for a lexer error'.format(result.error, result.messages)
+    return ''
+
+
+def check_batch():
+    """
+    compile_files 在当前进程中顺序编译 (workers=0) 和在进程池中并行编译时, 结果都须通过 _batch_problem 的检查,
+    包括出错恢复模式; 输入包括所有测试样例、一个含有无法识别字符的合法程序和一个不存在的文件
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        lexer_error = os.path.join(temp_dir, 'lexbad.txt')
+        with open(lexer_error, 'w') as f:
+            f.write('int a = 1 @ ;\n')
+        sources = [os.path.join(samples_dir, name, '{}.txt'.format(name)) for name in sample_names()]
+        sources[1:1] = [lexer_error, os.path.join(temp_dir, 'missing.txt')]
+        for workers in (0, 2):
+            for max_errors in (None, 10):
+                output_dir = os.path.join(temp_dir, 'out{}_{}'.format(workers, max_errors))
+                results = batch.compile_files(sources, output_dir, workers=workers, max_errors=max_errors)
+                detail = _batch_problem(results, sources, max_errors)
+                report('Test batch compile with workers={} max_errors={}'.format(workers, max_errors),
+                       not detail, detail)
+
+
+if __name__ == '__main__':
+    check_lr1_closure()
+    check_follow_sets()
+    check_incremental()
+    check_recovery()
+    check_lr_methods()
+    check_syntax_tree()
+    check_conflicts()
+    check_table_cache()
+    check_stats()
+    check_chunked_scan()
+    check_binary_trace()
+    check_codegen()
+    check_threads()
+    check_batch()
+    sys.exit(1 if failed else 0)